@@ -0,0 +1,80 @@
+'''
+Throughput of event dispatch
+
+Compare thread per event model with the dispatch pool
+and the serial executor.
+
+run: python2 bench/bench_dispatch.py [batches]
+'''
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from dispatchpool import DispatchPool, SerialExecutor
+from event import Event
+
+
+class Counter(object):
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.count = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def process(self, signal, events):
+        # a little work, like actionhandler check conditions
+        for event in events:
+            event.name in "plchandler_van4 == 1"
+        with self.lock:
+            self.count += 1
+            if self.count == self.expected:
+                self.done.set()
+
+
+def batches(n):
+    return [[Event("plchandler", "tag%d" % (i % 16), i & 1)]
+            for i in range(n)]
+
+
+def thread_per_event(counter, events):
+    for batch in events:
+        threading.Thread(
+            target=counter.process, args=("plchandler", batch)).start()
+
+
+def run(name, n, make):
+    counter = Counter(n)
+    events = batches(n)
+    executor = make(counter)
+    start = time.time()
+    if executor is None:
+        thread_per_event(counter, events)
+    else:
+        executor.start()
+        for batch in events:
+            executor.submit("plchandler", batch)
+    counter.done.wait(60)
+    elapsed = time.time() - start
+    if executor is not None:
+        executor.stop()
+    print "%-22s %8d batches %8.3f s %10.0f batches/s" % (
+        name, n, elapsed, n / elapsed)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    run("thread per event", n, lambda c: None)
+    run("pool 4 workers", n,
+        lambda c: DispatchPool(c.process, workers=4, queuesize=256))
+    run("serial (handler)", n,
+        lambda c: SerialExecutor(c.process, queuesize=256))
+    run("serial (tag, 4 lanes)", n,
+        lambda c: SerialExecutor(c.process, lanes=4, key=True,
+                                 queuesize=256))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+Memory and allocation cost of event records
+
+Compare the old dict events (created, then changed in sendevents)
+with the Event record.
+
+run: python2 bench/bench_event.py [events]
+'''
+import gc
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from event import Event
+
+
+def dict_event(i):
+    event = {"tag": "van4", "value": i & 1}
+    event["date"] = datetime.now()
+    event["tag"] = "%s_%s" % ("plchandler", event["tag"])
+    event["value"] = str(event["value"])
+    return event
+
+
+def record_event(i):
+    return Event("plchandler", "van4", i & 1)
+
+
+def size(event):
+    '''
+    size of container and of objects only this event own
+    '''
+    if isinstance(event, dict):
+        return (sys.getsizeof(event) + sys.getsizeof(event["date"]) +
+                sys.getsizeof(event["tag"]))
+    return (sys.getsizeof(event) + sys.getsizeof(event.time) +
+            sys.getsizeof(event.name))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, make in (("dict", dict_event), ("Event", record_event)):
+        gc.collect()
+        elapsed = timeit.timeit(lambda: make(1), number=n)
+        events = [make(i) for i in range(255)]
+        print "%-6s %6.2f us/event %5d bytes/event %7d bytes/255 cache" % (
+            name, elapsed / n * 1e6, size(events[0]),
+            sum(size(e) for e in events))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+'''
+Render time of listTags page
+
+Compare rendering of the whole template on every request
+with the cached table, where only values are put in.
+
+run: python2 bench/bench_listtags.py
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from jinja2 import Environment, PackageLoader
+from tagstore import TagDict, TagStore
+from tagtable import tagtable
+from templates import get_template
+
+OLD_TEMPLATE = '''
+{% for handler in tags %}<thead><tr><th>{{ handler }}</th></tr></thead>
+<tbody>{% for tag in tags[handler] %}<tr><td>{{ tag }}</td><td>
+{% if tags[handler][tag] == '1' or tags[handler][tag] == '0' %}
+<div class="switch"><input id="{{ handler }}_{{ tag }}" type="checkbox"
+{% if tags[handler][tag] == '1' %} checked="checked"{% endif %}></div>
+{% else %}{{ tags[handler][tag] }}{% endif %}</td></tr>
+{% endfor %}</tbody>{% endfor %}
+'''
+
+
+old_template = Environment(
+    loader=PackageLoader('www', 'templates')).from_string(OLD_TEMPLATE)
+
+
+def old_render(tags):
+    od = {}
+    last_handler = ""
+    for tag in sorted(tags):
+        current_handler = tag.split('_')[0]
+        if current_handler != last_handler:
+            last_handler = current_handler
+        tag_name = tag.split('_')[1]
+        od.setdefault(last_handler, {})[tag_name] = str(tags[tag])
+    return str(old_template.render(tags=od))
+
+
+def store(count):
+    store = TagStore()
+    for h in range(10):
+        tags = TagDict("handler%d" % h)
+        for i in range(count // 10):
+            tags["tag%d" % i] = i % 3
+        store.attach(tags)
+    return store, tags
+
+
+def main():
+    print "tags   old ms/request  cached ms/request  changed ms/request"
+    for count in (1000, 10000):
+        tagstore, tags = store(count)
+        snapshot = tagstore.snapshot()
+        number = 20
+        old = timeit.timeit(lambda: old_render(snapshot), number=number)
+        table = tagtable(get_template('listtags_template.html'),
+                         title=u'Tag list', description='here')
+        table.render(snapshot)
+        cached = timeit.timeit(lambda: table.render(snapshot), number=number)
+
+        def changed():
+            tags["tag0"] = tags["tag0"] + 1
+            table.render(tagstore.snapshot())
+        changed = timeit.timeit(changed, number=number)
+        print "%5d  %14.2f  %17.3f  %18.2f" % (
+            count, old / number * 1000, cached / number * 1000,
+            changed / number * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Poll cycle of PLC with read plans
+
+Compare the old address map (min..max span cut in packetSize
+chunks) with readplanner: reads, bytes on wire and time of one
+cycle on serial line. Time is bytes at baud rate (11 bits for
+7E2 char) and turnaround of PLC for every read.
+
+run: python2 bench/bench_readplanner.py [options]
+  --config pysmhs/config/tags_config.txt
+  --framer ascii   --baud 9600   --turnaround 5 (ms)
+  --packet 50      packetSize of old map and max count of read
+'''
+import optparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from config.configobj import ConfigObj
+from readplanner import KINDS, plan, planbytes
+
+BITS = 11
+
+
+def oldmap(addresses, packetsize):
+    '''
+    plchandler._generate_address_map before readplanner
+    '''
+    maxaddress, minaddress = max(addresses), min(addresses)
+    c, d = divmod(maxaddress - minaddress + 1, packetsize)
+    reads = [(minaddress + packetsize * x, packetsize) for x in range(c)]
+    if d > 0:
+        reads.append((maxaddress - d + 1, d))
+    return tuple(reads)
+
+
+def cycle(reads, kind, options):
+    size = planbytes(reads, kind, options.framer)
+    ms = (size * BITS * 1000.0 / options.baud +
+          len(reads) * options.turnaround)
+    return len(reads), size, ms
+
+
+def scenarios(options):
+    '''
+    name, {(type, kind): addresses}
+    '''
+    config = ConfigObj(options.config)
+    tags = {}
+    for t in config:
+        for x in config[t]:
+            kind = config[t][x].get("kind", KINDS[t])
+            tags.setdefault((t, kind), []).append(
+                int(config[t][x]["address"]))
+    polled = dict((k, a) for k, a in tags.items()
+                  if k[0] in ("output", "input", "inputc"))
+    yield "sample config", polled
+    # memory tags polled too, coil and register far apart
+    yield "sample + memory", tags
+    rnd = random.Random(1)
+    yield "sparse 100 coils, 40 registers", {
+        ("output", "coils"): rnd.sample(range(4000), 100),
+        ("inputc", "registers"): rnd.sample(range(1000, 3000), 40)}
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--config", default=os.path.join(
+        os.path.dirname(__file__), "..", "pysmhs", "config",
+        "tags_config.txt"))
+    parser.add_option("--framer", default="ascii")
+    parser.add_option("--baud", type="int", default=9600)
+    parser.add_option("--turnaround", type="float", default=5)
+    parser.add_option("--packet", type="int", default=50)
+    options, _ = parser.parse_args()
+    print "%-32s %-9s %15s %15s" % ("", "", "old map", "read planner")
+    print "%-32s %-9s %15s %15s" % ("", "type", "reads bytes ms",
+                                    "reads bytes ms")
+    for name, types in scenarios(options):
+        totals = [0, 0, 0], [0, 0, 0]
+        for (t, kind), addresses in sorted(types.items()):
+            old = cycle(oldmap(addresses, options.packet), kind, options)
+            new = cycle(plan(addresses, kind, maxcount=options.packet,
+                             framer=options.framer), kind, options)
+            for total, result in zip(totals, (old, new)):
+                for i in range(3):
+                    total[i] += result[i]
+            print "%-32s %-9s %4d %5d %4.0f %4d %5d %4.0f" % (
+                name, t, old[0], old[1], old[2], new[0], new[1], new[2])
+            name = ""
+        print "%-32s %-9s %4d %5d %4.0f %4d %5d %4.0f" % (
+            "", "cycle", totals[0][0], totals[0][1], totals[0][2],
+            totals[1][0], totals[1][1], totals[1][2])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+/*
+ * Cost of one tag update in the browser runtime
+ *
+ * Compare the old full walk of svg (bench/legacy_smhs.js) with the
+ * incremental runtime (pysmhs/www/smhs.js) that draws only elements
+ * bound to changed tags. Browser is replaced by a small DOM stub,
+ * svg index is made by pysmhs/svgindex.py like on the server.
+ *
+ * run: node bench/bench_svgruntime.js [options]
+ *   --copies 1,4,16   drawing of home.svg repeated, with own tags
+ *   --changes 1       tags changed between two frames
+ *   --updates 2000    updates measured
+ *   env PYTHON - python2 with pysmhs dependencies (python2 by default)
+ */
+var fs = require("fs");
+var os = require("os");
+var path = require("path");
+var vm = require("vm");
+var childProcess = require("child_process");
+
+var ROOT = path.join(__dirname, "..");
+var SVG = path.join(ROOT, "pysmhs", "www", "home.svg");
+var INKSCAPE = "http://www.inkscape.org/namespaces/inkscape";
+
+// counter of DOM writes, both runtimes write through the stub
+var writes = 0;
+
+function Text(value){
+	this.nodeType = 3;
+	this.nodeName = "#text";
+	this._value = value;
+	this.childNodes = [];
+	this.firstChild = null;
+}
+Object.defineProperty(Text.prototype, "nodeValue", {
+	get: function(){ return this._value; },
+	set: function(value){ writes++; this._value = value; }
+});
+
+function Element(doc, name){
+	this.nodeType = 1;
+	this.ownerDocument = doc;
+	this.qname = name;
+	this.nodeName = name.indexOf(":")<0 ? name : name.split(":")[1];
+	this.attributes = {};
+	this.childNodes = [];
+}
+Object.defineProperty(Element.prototype, "firstChild", {
+	get: function(){ return this.childNodes.length ? this.childNodes[0] : null; }
+});
+Element.prototype.key = function(ns, name){
+	return (ns || "") + " " + name;
+};
+Element.prototype.getAttribute = function(name){
+	var value = this.attributes[this.ownerDocument.qualify(name)];
+	return value===undefined ? null : value;
+};
+Element.prototype.getAttributeNS = function(ns, name){
+	var value = this.attributes[this.key(ns, name)];
+	return value===undefined ? null : value;
+};
+Element.prototype.setAttributeNS = function(ns, name, value){
+	writes++;
+	this.attributes[this.key(ns, name)] = String(value);
+	if (name=="id" && !ns) this.ownerDocument.ids[value] = this;
+};
+Element.prototype.appendChild = function(node){
+	this.childNodes.push(node);
+	if (node.nodeType==1 && node.getAttribute("id")!=null){
+		this.ownerDocument.ids[node.getAttribute("id")] = node;
+	}
+	return node;
+};
+
+function Document(){
+	this.ids = {};
+	this.namespaces = {xml: "http://www.w3.org/XML/1998/namespace"};
+	this.documentElement = null;
+}
+// qualified name of attribute to key of attributes
+Document.prototype.qualify = function(name){
+	var i = name.indexOf(":");
+	if (i<0) return " " + name;
+	return (this.namespaces[name.slice(0, i)] || name.slice(0, i)) + " " + name.slice(i + 1);
+};
+Document.prototype.getElementById = function(id){
+	return this.ids.hasOwnProperty(id) ? this.ids[id] : null;
+};
+Document.prototype.createTextNode = function(value){
+	return new Text(value);
+};
+
+function unescapeXml(s){
+	return s.replace(/&(#x[0-9a-fA-F]+|#\d+|\w+);/g, function(m, e){
+		if (e[0]=="#"){
+			return String.fromCharCode(e[1]=="x" ? parseInt(e.slice(2), 16) : parseInt(e.slice(1), 10));
+		}
+		return {quot: '"', apos: "'", amp: "&", lt: "<", gt: ">"}[e] || m;
+	});
+}
+
+function escapeXml(s){
+	return s.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/"/g, "&quot;");
+}
+
+// enough of XML for inkscape files: elements, attributes, text
+function parseSvg(text){
+	var doc = new Document();
+	var stack = [];
+	var token = /<!--[\s\S]*?-->|<\?[\s\S]*?\?>|<!\[CDATA\[([\s\S]*?)\]\]>|<!DOCTYPE[^>]*>|<\/[^>]+>|<([\w:.-]+)((?:\s+[\w:.-]+\s*=\s*(?:"[^"]*"|'[^']*'))*)\s*(\/?)>|([^<]+)/g;
+	var attribute = /([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')/g;
+	var m;
+	while ((m = token.exec(text))!=null){
+		var parent = stack.length ? stack[stack.length - 1] : null;
+		if (m[2]){
+			var element = new Element(doc, m[2]);
+			var attrs = [];
+			var a;
+			attribute.lastIndex = 0;
+			while ((a = attribute.exec(m[3]))!=null){
+				var value = unescapeXml(a[2]!==undefined ? a[2] : a[3]);
+				if (a[1].indexOf("xmlns:")==0) doc.namespaces[a[1].slice(6)] = value;
+				attrs.push([a[1], value]);
+			}
+			for (var i=0;i<attrs.length;i++){
+				element.attributes[doc.qualify(attrs[i][0])] = attrs[i][1];
+			}
+			if (parent) parent.appendChild(element);
+			else doc.documentElement = element;
+			if (!m[4]) stack.push(element);
+		}else if (m[0].indexOf("</")==0){
+			stack.pop();
+		}else if (parent && (m[5] || m[1]!==undefined)){
+			parent.childNodes.push(new Text(unescapeXml(m[5] || m[1])));
+		}
+	}
+	return doc;
+}
+
+function serialize(doc, node){
+	if (node.nodeType==3) return escapeXml(node.nodeValue);
+	var prefixes = {};
+	for (var p in doc.namespaces) prefixes[doc.namespaces[p]] = p;
+	var out = ["<" + node.qname];
+	for (var key in node.attributes){
+		var parts = key.split(" ");
+		var name = parts[0] ? (prefixes[parts[0]] || parts[0]) + ":" + parts[1] : parts[1];
+		out.push(" " + name + '="' + escapeXml(node.attributes[key]) + '"');
+	}
+	out.push(">");
+	for (var i=0;i<node.childNodes.length;i++){
+		out.push(serialize(doc, node.childNodes[i]));
+	}
+	out.push("</" + node.qname + ">");
+	return out.join("");
+}
+
+function cloneNode(doc, node, suffix, rename){
+	if (node.nodeType==3) return new Text(node.nodeValue);
+	var copy = new Element(doc, node.qname);
+	for (var key in node.attributes){
+		var value = node.attributes[key];
+		if (key==" id") value += suffix;
+		else if (key==INKSCAPE + " label") value = rename(value);
+		copy.attributes[key] = value;
+	}
+	for (var i=0;i<node.childNodes.length;i++){
+		copy.appendChild(cloneNode(doc, node.childNodes[i], suffix, rename));
+	}
+	return copy;
+}
+
+function buildIndex(file){
+	var python = process.env.PYTHON || "python2";
+	var script = "import sys, json; sys.path.insert(0, sys.argv[1]); " +
+		"from svgindex import build; sys.stdout.write(json.dumps(build(sys.argv[2])))";
+	return JSON.parse(childProcess.execFileSync(python,
+		["-c", script, path.join(ROOT, "pysmhs"), file]).toString());
+}
+
+// home.svg with labeled groups repeated, copy k bind tags with suffix ck
+function makeSvg(copies){
+	var text = fs.readFileSync(SVG, "utf8");
+	if (copies==1) return text;
+	var doc = parseSvg(text);
+	var root = doc.documentElement;
+	var names = Object.keys(buildIndex(SVG).tags).sort(function(a, b){ return b.length - a.length; });
+	var tagRe = new RegExp("\\b(" + names.join("|") + ")\\b", "g");
+	var layers = root.childNodes.filter(function(n){
+		return n.nodeType==1 && n.nodeName=="g" && n.getAttributeNS(INKSCAPE, "label");
+	});
+	for (var k=2;k<=copies;k++){
+		for (var i=0;i<layers.length;i++){
+			root.appendChild(cloneNode(doc, layers[i], "-c" + k, function(label){
+				return label.replace(tagRe, "$1c" + k);
+			}));
+		}
+	}
+	return serialize(doc, root);
+}
+
+function context(file, globals){
+	var sandbox = {
+		window: {},
+		document: null,
+		getData: function(){},
+		setTimeout: function(){},
+		alert: function(){},
+		console: console
+	};
+	for (var name in globals) sandbox[name] = globals[name];
+	vm.createContext(sandbox);
+	vm.runInContext(fs.readFileSync(file, "utf8"), sandbox, {filename: file});
+	return sandbox;
+}
+
+function initialValues(index){
+	var values = {};
+	for (var name in index.tags) values[name] = "0";
+	return values;
+}
+
+// next value of tag, switches toggle, text is new every time
+function changeValue(values, name, n){
+	if (name.indexOf("date")>=0) values[name] = "2014-01-01 00:00:" + n;
+	else values[name] = values[name]=="1" ? "0" : "1";
+	return values[name];
+}
+
+function measure(options, update){
+	var n = options.updates;
+	// warm up JIT
+	for (var i=0;i<Math.min(n, 200);i++) update(i);
+	writes = 0;
+	var start = process.hrtime();
+	for (var i=0;i<n;i++) update(i);
+	var t = process.hrtime(start);
+	var us = (t[0] * 1e6 + t[1] / 1e3) / n;
+	return {us: us, writes: writes / n};
+}
+
+function bench(copies, options){
+	var file = path.join(os.tmpdir(), "pysmhs-bench-" + process.pid + ".svg");
+	var text = makeSvg(copies);
+	fs.writeFileSync(file, text);
+	var index;
+	try {
+		index = buildIndex(file);
+	} finally {
+		fs.unlinkSync(file);
+	}
+	var names = Object.keys(index.tags).sort();
+
+	// old: full walk of svg when tags are dirty
+	var oldDoc = parseSvg(text);
+	var legacy = context(path.join(__dirname, "legacy_smhs.js"), {});
+	var oldValues = initialValues(index);
+	legacy.tags = {tags: oldValues};
+	legacy.goThroughNodes(oldDoc.documentElement, null);
+	legacy.scripted = true;
+	var old = measure(options, function(i){
+		for (var c=0;c<options.changes;c++){
+			changeValue(oldValues, names[(i * options.changes + c) % names.length], i);
+		}
+		legacy.goThroughNodes(oldDoc.documentElement, null);
+	});
+
+	// new: update of changed tags, drawn in one frame
+	var newDoc = parseSvg(text);
+	var frames = [];
+	var runtime = context(path.join(ROOT, "pysmhs", "www", "smhs.js"), {
+		window: {requestAnimationFrame: function(f){ frames.push(f); }},
+		document: {getElementById: function(){
+			return {getSVGDocument: function(){ return newDoc; }};
+		}}
+	});
+	var newValues = initialValues(index);
+	runtime.receiveIndex(JSON.stringify(index));
+	runtime.receiveJson(JSON.stringify({version: 1, full: true, tags: newValues}));
+	while (frames.length) frames.shift()();
+	var incremental = measure(options, function(i){
+		for (var c=0;c<options.changes;c++){
+			var name = names[(i * options.changes + c) % names.length];
+			runtime.updateTag(name, changeValue(newValues, name, i));
+		}
+		while (frames.length) frames.shift()();
+	});
+	same(index, oldDoc, newDoc);
+	return {tags: names.length, bindings: index.bindings.length, old: old, incremental: incremental};
+}
+
+// both runtimes have to leave the same drawing
+function same(index, oldDoc, newDoc){
+	for (var i=0;i<index.bindings.length;i++){
+		var id = index.bindings[i].id;
+		var a = oldDoc.getElementById(id), b = newDoc.getElementById(id);
+		var keys = [" style", " height"];
+		for (var k=0;k<keys.length;k++){
+			if (a.attributes[keys[k]]!==b.attributes[keys[k]]){
+				throw new Error("runtimes differ at " + id + keys[k]);
+			}
+		}
+		if (text(a)!==text(b)) throw new Error("runtimes differ at text of " + id);
+	}
+}
+
+function text(node){
+	while (node.firstChild!=null && node.firstChild.nodeType==1) node = node.firstChild;
+	return node.firstChild ? node.firstChild.nodeValue : null;
+}
+
+function main(){
+	var options = {copies: "1,4,16", changes: 1, updates: 2000};
+	var argv = process.argv.slice(2);
+	for (var i=0;i<argv.length;i+=2){
+		var name = argv[i].replace(/^--/, "");
+		options[name] = name=="copies" ? argv[i + 1] : parseInt(argv[i + 1], 10);
+	}
+	console.log("copies  tags  bindings  full walk us/update writes  incremental us/update writes  speedup");
+	options.copies.split(",").forEach(function(copies){
+		var r = bench(parseInt(copies, 10), options);
+		console.log([pad(copies, 6), pad(r.tags, 4), pad(r.bindings, 8),
+			pad(r.old.us.toFixed(1), 19), pad(r.old.writes.toFixed(1), 6),
+			pad(r.incremental.us.toFixed(1), 21), pad(r.incremental.writes.toFixed(1), 6),
+			pad((r.old.us / r.incremental.us).toFixed(0) + "x", 7)].join("  "));
+	});
+}
+
+function pad(value, width){
+	value = String(value);
+	while (value.length<width) value = " " + value;
+	return value;
+}
+
+main();
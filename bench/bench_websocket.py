@@ -0,0 +1,197 @@
+'''
+Load test of the websocket endpoint
+
+Server run in child process with the websocket resource,
+a stand-in handler change tags at given rate, value of tag is
+the time of change. Clients (wall panels) are added step by step,
+every client subscribe to all tags and set one tag every few seconds.
+For every step print latency of changes and acks and CPU of server.
+
+run: python2 bench/bench_websocket.py [maxclients] [events/s] [seconds]
+'''
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from twisted.internet import reactor, task
+from twisted.internet.protocol import Protocol, ClientFactory
+from websocket import FrameParser, encode_frame, OP_TEXT
+
+PORT = 8097
+TAGS = 200
+
+
+def server(rate):
+    from twisted.web import server as web
+    from twisted.web.resource import Resource
+    from tagregistry import TagRegistry
+    from tagstore import TagDict, TagStore
+    from webpush import eventstream
+    from websocket import websocket
+
+    class standin(object):
+        signal = "plchandler"
+
+        def __init__(self):
+            self._tags = TagDict(self.signal)
+            for i in range(TAGS):
+                self._tags["tag%d" % i] = 0
+            self.store = TagStore()
+            self.store.attach(self._tags)
+            self.registry = TagRegistry()
+            self.registry.addhandler(self.signal, self)
+
+        @property
+        def tags(self):
+            return self.store.snapshot()
+
+        def hastag(self, tag):
+            return tag in self._tags
+
+        def settags(self, tags):
+            for name, value in tags.items():
+                self.registry.set(self.registry.id(name), value)
+            return dict((name, "ok") for name in tags)
+
+        def _settag(self, tag, value):
+            if self._tags.get(tag) != value:
+                self._tags[tag] = value
+                stream.update()
+
+    parent = standin()
+    stream = eventstream(parent.store)
+    root = Resource()
+    root.putChild("ws", websocket(parent, stream))
+    tick = [0]
+
+    def change():
+        tick[0] += 1
+        parent._settag("tag%d" % (tick[0] % TAGS), repr(time.time()))
+    task.LoopingCall(change).start(1.0 / rate)
+    reactor.listenTCP(PORT, web.Site(root))
+    reactor.run()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class panel(Protocol):
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.parser = FrameParser(masked=False)
+        self.handshake = ""
+        self.sent = {}
+        self.nextid = 0
+
+    def connectionMade(self):
+        self.transport.write(
+            "GET /ws HTTP/1.1\r\nHost: localhost\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n")
+
+    def send(self, data):
+        self.transport.write(encode_frame(
+            OP_TEXT, json.dumps(data), os.urandom(4)))
+
+    def dataReceived(self, data):
+        if self.handshake is not None:
+            self.handshake += data
+            if "\r\n\r\n" not in self.handshake:
+                return
+            data = self.handshake.split("\r\n\r\n", 1)[1]
+            self.handshake = None
+            self.send({"op": "subscribe"})
+            self.setter = task.LoopingCall(self.set)
+            self.setter.start(5 * random.random() + 2.5, now=False)
+        now = time.time()
+        for opcode, payload in self.parser.feed(data):
+            message = json.loads(payload)
+            if message["op"] == "tags" and not message["full"]:
+                for value in message["tags"].values():
+                    if "." in value:
+                        self.stats["events"].append(now - float(value))
+            elif message["op"] == "ack":
+                self.stats["acks"].append(now - self.sent.pop(message["id"]))
+
+    def set(self):
+        self.nextid += 1
+        self.sent[self.nextid] = time.time()
+        self.send({"op": "set", "id": self.nextid,
+                   "tags": {"plchandler_tag%d" % random.randrange(TAGS): 1}})
+
+
+class panels(ClientFactory):
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def buildProtocol(self, addr):
+        return panel(self.stats)
+
+
+def cputime(pid):
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / float(
+            os.sysconf("SC_CLK_TCK"))
+    except (IOError, OSError):
+        return float("nan")
+
+
+def main():
+    maxclients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    child = subprocess.Popen([sys.executable, __file__, "--server",
+                              str(rate)])
+    stats = {"events": [], "acks": []}
+    factory = panels(stats)
+    state = {"clients": 0, "step": 25}
+    print "clients changes/s  change p50/p99 ms  ack p50/p99 ms  server cpu %"
+
+    def step():
+        target = min(state["step"], maxclients)
+        while state["clients"] < target:
+            reactor.connectTCP("127.0.0.1", PORT, factory)
+            state["clients"] += 1
+        stats["events"], stats["acks"] = [], []
+        cpu, start = cputime(child.pid), time.time()
+        reactor.callLater(seconds, report, cpu, start)
+
+    def report(cpu, start):
+        elapsed = time.time() - start
+        events, acks = stats["events"], stats["acks"]
+        print "%7d  %8d  %7.1f %7.1f  %6.1f %7.1f  %12.1f" % (
+            state["clients"], len(events) / elapsed,
+            percentile(events, 0.5) * 1000, percentile(events, 0.99) * 1000,
+            percentile(acks, 0.5) * 1000, percentile(acks, 0.99) * 1000,
+            (cputime(child.pid) - cpu) / elapsed * 100)
+        if state["clients"] >= maxclients:
+            reactor.stop()
+            return
+        state["step"] *= 2
+        step()
+
+    reactor.callLater(1, step)
+    try:
+        reactor.run()
+    finally:
+        child.terminate()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == "--server":
+        server(float(sys.argv[2]))
+    else:
+        main()
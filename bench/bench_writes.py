@@ -0,0 +1,177 @@
+'''
+Scene writes on a simulated serial link
+
+SMHSProtocol polls the sample tags config on a simulated link:
+every request is framed by the real framer and answered by a
+pymodbus slave after the time its frames take on the wire at the
+baud rate (11 bits per char) plus turnaround of PLC. Time is
+simulated, so the run takes a moment.
+A scene sets a run of outputs and registers every few seconds,
+compare single writes (FC5/FC6), multiple writes (FC15/FC16)
+and a PLC that refuse multiple writes.
+
+run: python2 bench/bench_writes.py [options]
+  --framer ascii   --baud 9600   --turnaround 5 (ms)
+  --coils 8        outputs set by scene, from 1298
+  --registers 2    registers set by scene, from 4598
+  --scenes 30      --every 2 (s)
+'''
+import logging
+import optparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "pysmhs"))
+from twisted.internet import defer, task
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext
+from pymodbus.factory import ClientDecoder
+from pymodbus.pdu import ModbusExceptions
+from pymodbus.transaction import ModbusAsciiFramer, ModbusRtuFramer
+from config.configobj import ConfigObj
+import plchandler
+from pollscheduler import RATES, pollgroup, pollscheduler
+from readplanner import KINDS, plan
+from writequeue import writequeue
+
+BITS = 11
+FRAMERS = {"ascii": ModbusAsciiFramer, "rtu": ModbusRtuFramer}
+
+
+class link(plchandler.SMHSProtocol):
+
+    '''
+    SMHSProtocol with requests answered by slave over simulated line
+    '''
+
+    def __init__(self, clock, options, *args, **kwargs):
+        self.clock = clock
+        self.options = options
+        self.busy = {"poll": 0.0, "write": 0.0}
+        self.frames = {"poll": 0, "write": 0}
+        size = 10000
+        self.slave = ModbusSlaveContext(
+            co=ModbusSequentialDataBlock(0, [0] * size),
+            hr=ModbusSequentialDataBlock(0, [0] * size),
+            di=ModbusSequentialDataBlock(0, [0] * size),
+            ir=ModbusSequentialDataBlock(0, [0] * size), zero_mode=True)
+        framer = FRAMERS[options.framer](ClientDecoder(), client=None)
+        plchandler.SMHSProtocol.__init__(self, framer, *args, **kwargs)
+
+    def execute(self, request):
+        request.transaction_id = 0
+        request.unit_id = 1
+        if self.options.refuse and request.function_code in (15, 16):
+            response = request.doException(ModbusExceptions.IllegalFunction)
+        else:
+            response = request.execute(self.slave)
+        response.unit_id = 1
+        size = (len(self.framer.buildPacket(request)) +
+                len(self.framer.buildPacket(response)))
+        delay = (size * BITS / float(self.options.baud) +
+                 self.options.turnaround / 1000.0)
+        # reads and polling tag keep the line busy without scenes
+        kind = "poll" if (request.function_code in (1, 2, 3, 4) or
+                          getattr(request, "address", None) == 2057) \
+            else "write"
+        self.busy[kind] += delay
+        self.frames[kind] += 1
+        d = defer.Deferred()
+        self.clock.callLater(delay, d.callback, response)
+        return d
+
+
+class scenes(writequeue):
+
+    '''
+    writequeue that know when all writes of scene are answered
+    '''
+
+    def __init__(self, clock):
+        writequeue.__init__(self, clock.seconds)
+        self.start = None
+        self.times = []
+
+    def done(self, times, ok=True):
+        writequeue.done(self, times, ok)
+        if not self.pending and self.start is not None:
+            self.times.append(self.clock() - self.start)
+            self.start = None
+
+
+def groups(options):
+    config = ConfigObj(options.config)
+    result = []
+    for t in ("inputc", "input", "output"):
+        if t in config:
+            kinds = {}
+            for x in config[t]:
+                kind = config[t][x].get("kind", KINDS[t])
+                kinds.setdefault(kind, []).append(config[t][x]["address"])
+            for kind, addresses in sorted(kinds.items()):
+                result.append(pollgroup(t, kind, plan(
+                    addresses, kind, framer=options.framer), *RATES[t]))
+    return result
+
+
+def run(options, single):
+    clock = task.Clock()
+    plchandler.reactor = clock
+    pool = scenes(clock)
+    if single:
+        pool.single.update(("coils", "registers"))
+    proto = link(clock, options, pollscheduler(groups(options)),
+                 logging.getLogger("bench"), lambda values, t: 0, pool,
+                 heartbeat=0.2)
+    rnd = random.Random(1)
+
+    def scene(n):
+        pool.start = clock.seconds()
+        value = n & 1
+        for i in range(options.coils):
+            pool.put(1298 + i, value)
+        for i in range(options.registers):
+            pool.put(4598 + i, rnd.randrange(1000), "registers")
+        proto.wakeup()
+    for n in range(options.scenes):
+        clock.callLater(3 + options.every * (n + rnd.random()), scene, n)
+    end = 3 + options.every * (options.scenes + 1)
+    while clock.seconds() < end:
+        clock.advance(0.001)
+    times = sorted(pool.times)
+    return {"frames": proto.frames["write"] / float(options.scenes),
+            "bus": proto.busy["write"] / options.scenes * 1000,
+            "avg": sum(times) / len(times) * 1000,
+            "max": times[-1] * 1000,
+            "polls": proto.frames["poll"] / float(end - 3)}
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--config", default=os.path.join(
+        os.path.dirname(__file__), "..", "pysmhs", "config",
+        "tags_config.txt"))
+    parser.add_option("--framer", default="ascii")
+    parser.add_option("--baud", type="int", default=9600)
+    parser.add_option("--turnaround", type="float", default=5)
+    parser.add_option("--coils", type="int", default=8)
+    parser.add_option("--registers", type="int", default=2)
+    parser.add_option("--scenes", type="int", default=30)
+    parser.add_option("--every", type="float", default=2)
+    options, _ = parser.parse_args()
+    logging.getLogger("bench").addHandler(logging.NullHandler())
+    print ("%-22s %13s %15s %17s %8s" % (
+        "", "write frames", "write bus ms", "scene done ms", "polls/s"))
+    print ("%-22s %13s %15s %8s %8s %8s" % (
+        "", "per scene", "per scene", "avg", "max", ""))
+    for name, refuse, single in (("single writes", False, True),
+                                 ("multiple writes", False, False),
+                                 ("PLC refuse multiple", True, False)):
+        options.refuse = refuse
+        r = run(options, single)
+        print "%-22s %13.1f %15.1f %8.1f %8.1f %8.1f" % (
+            name, r["frames"], r["bus"], r["avg"], r["max"], r["polls"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+'''
+Load test of webhandler
+
+Server is started in child process: corehandler with webhandler
+and stand-in PLC (bench/standinplc.py). Clients are browsers:
+pollers ask getJson with since= every interval like smhs.js,
+setters POST a batch of tags every few seconds.
+For every number of clients print latency, requests per second
+and CPU of server per request.
+
+run: python2 bench/loadtest.py [options]
+  --clients 10,50,100,200  steps of pollers
+  --setters 5              % of clients that also set tags
+  --interval 1             seconds between polls of one client
+  --seconds 10             duration of step
+  --tags 200 --rate 10     tags of PLC and changes per second
+  --close                  new connection for every request
+'''
+import json
+import optparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, "..", "pysmhs"))
+from twisted.internet import reactor, task
+from twisted.internet.defer import succeed
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import IBodyProducer
+from zope.interface import implementer
+from bench_websocket import cputime, percentile
+
+PORT = 8098
+
+CONFIG = '''[corehandler]
+    [[params]]
+        configfile = %(dir)s/core.txt
+        loglevel = error
+        logfile = %(dir)s/smhs.log
+[standinplc]
+    parent = "corehandler"
+    [[params]]
+        tags = %(tags)d
+        rate = %(rate)f
+        loglevel = error
+        logfile = %(dir)s/smhs.log
+[webhandler]
+    parent = "corehandler"
+    [[params]]
+        port = %(port)d
+        wwwPath = %(www)s
+        cachePath = %(dir)s/cache
+        loglevel = error
+        logfile = %(dir)s/smhs.log
+'''
+
+
+def server(directory):
+    sys.path.insert(0, BENCH)
+    from corehandler import corehandler
+    core = corehandler(None, {"configfile": directory + "/core.txt",
+                              "loglevel": "error",
+                              "logfile": directory + "/smhs.log"})
+    core.start()
+
+
+class stats(object):
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.latency = {"poll": [], "set": []}
+        self.errors = 0
+
+    def record(self, kind, start):
+        self.latency[kind].append(time.time() - start)
+
+
+@implementer(IBodyProducer)
+class body(object):
+
+    '''
+    Body written right with headers, so it is not delayed
+    by Nagle and delayed ACK like with FileBodyProducer
+    '''
+
+    def __init__(self, data):
+        self.data = data
+        self.length = len(data)
+
+    def startProducing(self, consumer):
+        consumer.write(self.data)
+        return succeed(None)
+
+    def pauseProducing(self):
+        pass
+
+    def stopProducing(self):
+        pass
+
+
+class browser(object):
+
+    '''
+    One browser, poll getJson every interval, and set tags
+    if it is setter
+    '''
+
+    def __init__(self, agent, stats, interval, tags, setter):
+        self.agent = agent
+        self.stats = stats
+        self.interval = interval
+        self.tags = tags
+        self.setter = setter
+        self.version = 0
+        self.running = False
+
+    def start(self):
+        self.running = True
+        reactor.callLater(random.random() * self.interval, self.poll)
+        if self.setter:
+            reactor.callLater(random.random() * 5, self.set)
+
+    def url(self, query):
+        return "http://127.0.0.1:%d/get%s" % (PORT, query)
+
+    def poll(self):
+        if not self.running:
+            return
+        start = time.time()
+        d = self.agent.request(
+            "GET", self.url("?action=getJson&since=%d" % self.version))
+        d.addCallback(readBody)
+        d.addCallback(self.polled, start)
+        d.addErrback(self.failed)
+        d.addCallback(lambda _: reactor.callLater(
+            max(0, self.interval - (time.time() - start)), self.poll))
+
+    def polled(self, body, start):
+        self.stats.record("poll", start)
+        self.version = json.loads(body)["version"]
+
+    def set(self):
+        if not self.running:
+            return
+        tags = dict(("standinplc_tag%d" % random.randrange(self.tags),
+                     random.randrange(2)) for i in range(3))
+        start = time.time()
+        d = self.agent.request(
+            "POST", self.url(""),
+            Headers({"Content-Type": ["application/json"]}),
+            body(json.dumps({"tags": tags})))
+        d.addCallback(readBody)
+        d.addCallback(lambda _: self.stats.record("set", start))
+        d.addErrback(self.failed)
+        d.addCallback(lambda _: reactor.callLater(
+            2.5 + random.random() * 5, self.set))
+
+    def failed(self, failure):
+        self.stats.errors += 1
+
+
+def ready(attempt=0):
+    '''
+    wait until server answer
+    '''
+    agent = Agent(reactor)
+    d = agent.request("GET", "http://127.0.0.1:%d/get?action=getJson" % PORT)
+    d.addCallback(readBody)
+
+    def retry(_):
+        if attempt > 50:
+            raise RuntimeError("server is not started")
+        return task.deferLater(reactor, 0.2, ready, attempt + 1)
+    d.addErrback(retry)
+    return d
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--clients", default="10,50,100,200")
+    parser.add_option("--setters", type="float", default=5)
+    parser.add_option("--interval", type="float", default=1)
+    parser.add_option("--seconds", type="float", default=10)
+    parser.add_option("--tags", type="int", default=200)
+    parser.add_option("--rate", type="float", default=10)
+    parser.add_option("--close", action="store_true", default=False)
+    options, _ = parser.parse_args()
+    directory = tempfile.mkdtemp(prefix="pysmhs-load")
+    with open(os.path.join(directory, "core.txt"), "w") as f:
+        f.write(CONFIG % {"dir": directory, "tags": options.tags,
+                          "rate": options.rate, "port": PORT,
+                          "www": os.path.join(BENCH, "..", "pysmhs", "www")})
+    child = subprocess.Popen([sys.executable, __file__, "--server",
+                              directory])
+    pool = HTTPConnectionPool(reactor, persistent=not options.close)
+    pool.maxPersistentPerHost = 10000
+    agent = Agent(reactor, pool=pool)
+    results = stats()
+    browsers = []
+    steps = [int(n) for n in options.clients.split(",")]
+    print ("clients  req/s  poll p50/p99 ms  set p50/p99 ms  errors  "
+           "server cpu ms/req  client cpu %")
+
+    def step():
+        if not steps:
+            return reactor.stop()
+        count = steps.pop(0)
+        while len(browsers) < count:
+            b = browser(agent, results, options.interval, options.tags,
+                        random.random() * 100 < options.setters)
+            b.start()
+            browsers.append(b)
+        # let new clients get their first full json
+        reactor.callLater(options.interval, measure, count)
+
+    def measure(count):
+        results.clear()
+        state = (time.time(), cputime(child.pid), time.clock())
+        reactor.callLater(options.seconds, report, count, state)
+
+    def report(count, state):
+        start, cpu, clock = state
+        elapsed = time.time() - start
+        polls, sets = results.latency["poll"], results.latency["set"]
+        requests = len(polls) + len(sets)
+        servercpu = cputime(child.pid) - cpu
+        print "%7d  %5d  %6.1f %7.1f  %6.1f %6.1f  %6d  %17.2f  %12.1f" % (
+            count, requests / elapsed,
+            percentile(polls, 0.5) * 1000, percentile(polls, 0.99) * 1000,
+            percentile(sets, 0.5) * 1000, percentile(sets, 0.99) * 1000,
+            results.errors, servercpu / max(requests, 1) * 1000,
+            (time.clock() - clock) / elapsed * 100)
+        step()
+
+    def failed(failure):
+        print failure.getErrorMessage()
+        reactor.stop()
+
+    ready().addCallbacks(lambda _: step(), failed)
+    try:
+        reactor.run()
+    finally:
+        for b in browsers:
+            b.running = False
+        child.terminate()
+        child.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == "--server":
+        server(sys.argv[2])
+    else:
+        main()
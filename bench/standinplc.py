@@ -0,0 +1,47 @@
+'''
+Stand-in PLC handler for benchmarks
+
+Has "tags" tags (200 by default) and change "rate" of them
+per second, set tags come back after "delay" seconds
+like from polling of real PLC
+'''
+import random
+from abstracthandler import AbstractHandler, REACTOR
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+
+class standinplc(AbstractHandler):
+
+    dispatch = REACTOR
+
+    def __init__(self, parent=None, params={}):
+        AbstractHandler.__init__(self, parent, params)
+        self.rate = float(params.get("rate", 10))
+        self.delay = float(params.get("delay", 0.05))
+        self.changer = LoopingCall(self.change)
+
+    def loadtags(self):
+        for i in range(int(self.params.get("tags", 200))):
+            self._tags["tag%d" % i] = 0
+
+    def hastag(self, tag):
+        return tag in self._tags
+
+    def _settag(self, tag, value):
+        reactor.callLater(self.delay, AbstractHandler._settag,
+                          self, tag, int(value))
+
+    def change(self):
+        tag = random.choice(self._tags.keys())
+        AbstractHandler._settag(self, tag, 1 - self._tags[tag])
+
+    def start(self):
+        AbstractHandler.start(self)
+        if self.rate > 0:
+            self.changer.start(1 / self.rate)
+
+    def stop(self):
+        AbstractHandler.stop(self)
+        if self.changer.running:
+            self.changer.stop()
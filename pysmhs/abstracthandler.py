@@ -3,12 +3,44 @@ Created on Jul 17, 2012
 
 @author: pavel
 '''
-from pydispatch import dispatcher
-import threading
 import logging
 import logging.handlers
+import threading
 from config.configobj import ConfigObj
-from datetime import datetime
+from dispatchpool import executor, coalesce
+from event import Event
+from tagstore import TagDict
+from eventbus import bus, Any
+from twisted.internet import reactor
+from twisted.python import threadable
+
+REACTOR = "reactor"
+EXECUTOR = "executor"
+THREADPOOL = "threadpool"
+
+_batch = threading.local()
+
+
+class batch(object):
+
+    '''
+    Hold events of all handlers set in this thread
+    until the end of block, then every handler send its events
+    in one batch, last value of tag only if handler has lastvalue
+    '''
+
+    def __enter__(self):
+        self.outer = getattr(_batch, "handlers", None) is None
+        if self.outer:
+            _batch.handlers = []
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.outer:
+            handlers, _batch.handlers = _batch.handlers, None
+            for handler in handlers:
+                handler.flushevents()
+        return False
 
 
 class AbstractHandler(object):
@@ -16,8 +48,20 @@ class AbstractHandler(object):
     '''
     Abstractss class for all
     handlers
+
+    dispatch say how process is called:
+    reactor - right in the reactor thread, for cheap handlers
+    executor - in the handler own executor (see dispatchpool)
+    threadpool - in the thread pool of the event bus
+
+    coalesce param batch events of sendevents:
+    tick - all events of one reactor iteration go in one batch
+    N - all events in N ms go in one batch
+    with lastvalue = 1 only last value of every tag is sent
     '''
 
+    dispatch = EXECUTOR
+
     def __init__(self, parent=None, params={}):
         if "configfile" in params:
             self.config = ConfigObj(
@@ -26,8 +70,12 @@ class AbstractHandler(object):
         self.params = params
         self.stopped = True
         self.parent = parent
-        self._tags = {}
+        self.registry = None
+        self.store = None
+        self._tags = TagDict(self.signal)
         self.events = []
+        self._eventslock = threading.Lock()
+        self._flushcall = False
         loglevel = params.get('loglevel', 'debug').upper()
         filename = params.get('logfile', 'smhs.log')
         logfiles_num = int(params.get('logfiles_num', 5))
@@ -42,16 +90,29 @@ class AbstractHandler(object):
         self.logger.addHandler(handler)
         self.logger.debug("Have params - " + str(self.params))
         self.logger.debug("Have parent - " + str(self.parent))
+        self.dispatch = params.get("dispatch", self.dispatch)
+        assert self.dispatch in (REACTOR, EXECUTOR, THREADPOOL), \
+            "unknown dispatch %s" % self.dispatch
+        self.dispatchpool = executor(
+            self.process, params,
+            name=self.__class__.__name__, logger=self.logger)
+        window = params.get("coalesce", "0")
+        if window == "tick":
+            self.coalesce = 0
+        elif float(window) > 0:
+            self.coalesce = float(window) / 1000
+        else:
+            self.coalesce = None
+        self.lastvalue = str(params.get("lastvalue", "0")) == "1"
         self.loadtags()
 
     def __handler(self, signal, events):
         '''
-        method accept events from dispacher
+        method accept events from event bus
         @param signal:
         @param events:
         '''
-        t1 = threading.Thread(target=self.process, args=(signal, events))
-        t1.start()
+        self.dispatchpool.submit(signal, events)
 
     def process(self, signal, events):
         '''
@@ -60,44 +121,165 @@ class AbstractHandler(object):
         '''
         pass
 
+    def subscriptions(self):
+        '''
+        Return list of tags (or globs) handler want to get
+        events of, None for all tags, [] if handler don't use events
+        Override if handler know its tags,
+        param subscribe in config take precedence
+        '''
+        return None
+
     def sendevents(self):
         '''
         send all events
+        or in coalesce mode, send them at the end of window
+        inside batch, send them at the end of batch
         '''
-        if self.events:
-            for event in self.events:
-                event["date"] = datetime.now()
-                event["tag"] =\
-                    "%s_%s" % (self.__class__.__name__, event["tag"])
-                event["value"] = str(event["value"])
-            dispatcher.send(signal=self.signal, events=self.events)
-            self.events = []
+        held = getattr(_batch, "handlers", None)
+        if held is not None:
+            if self not in held:
+                held.append(self)
+            return
+        if self.coalesce is None:
+            self.flushevents()
+            return
+        with self._eventslock:
+            if self._flushcall or not self.events:
+                return
+            self._flushcall = True
+        if threadable.isInIOThread():
+            reactor.callLater(self.coalesce, self.flushevents)
+        else:
+            reactor.callFromThread(
+                reactor.callLater, self.coalesce, self.flushevents)
+
+    def flushevents(self):
+        '''
+        send events collected so far in one batch
+        '''
+        with self._eventslock:
+            events, self.events = self.events, []
+            self._flushcall = False
+        if events:
+            if self.lastvalue:
+                events = coalesce(events)
+            bus.publish(self.signal, events)
 
     def settag(self, tag, value):
         '''
         set tag to value
-        if parent call his method
+        qualified tag is set through the registry,
+        if there is no registry through parent,
         else call private method
         '''
         self.logger.info("settag " + tag)
-        if self.parent:
-            l = tag.split("_")
-            if len(l) == 2:
-                if l == self.__class__.__name__:
-                    self._settag(l[1], value)
-                else:
-                    try:
-                        self.parent.settag(tag, value)
-                    except:
-                        self.logger.error(
-                            "Can't set tag %s with value %s" % (
-                                tag, value),
-                            exc_info=1)
-            else:
+        if self.registry is not None:
+            try:
+                tagid = self.registry.id(tag)
+            except KeyError:
                 self._settag(tag, value)
+                return
+            try:
+                self.registry.set(tagid, value)
+            except:
+                self.logger.error(
+                    "Can't set tag %s with value %s" % (tag, value),
+                    exc_info=1)
+        elif self.parent and "_" in tag:
+            try:
+                self.parent.settag(tag, value)
+            except:
+                self.logger.error(
+                    "Can't set tag %s with value %s" % (tag, value),
+                    exc_info=1)
         else:
             self._settag(tag, value)
 
+    def settags(self, tags):
+        '''
+        set many qualified tags at once
+        all tags and values are checked first, if some is unknown
+        or has bad value nothing is set,
+        store see all values in one version and every handler send
+        its events in one batch
+        return dict tag -> "ok" or error
+        without registry and parent tags are set one by one
+        '''
+        if self.registry is None and self.parent is not None:
+            return self.parent.settags(tags)
+        if self.registry is None:
+            results = {}
+            with batch():
+                for name, value in tags.items():
+                    try:
+                        self.settag(name, value)
+                        results[name] = "ok"
+                    except Exception as e:
+                        self.logger.error(
+                            "Can't set tag %s with value %s" % (name, value),
+                            exc_info=1)
+                        results[name] = "error: %s" % e
+            return results
+        self.logger.info("settags %s" % ", ".join(tags))
+        results = {}
+        ids = {}
+        values = {}
+        for name, value in tags.items():
+            try:
+                tagid = self.registry.id(name)
+                handler, tag = self.registry.owner(tagid)
+            except KeyError:
+                results[name] = "unknown tag"
+                continue
+            if not handler.hastag(tag):
+                results[name] = "unknown tag"
+                continue
+            if not handler.writable(tag):
+                results[name] = "read only"
+                continue
+            try:
+                values[name] = handler.checkvalue(tag, value)
+            except ValueError as e:
+                results[name] = "bad value: %s" % e
+                continue
+            ids[name] = tagid
+        if results:
+            for name in ids:
+                results[name] = "not set"
+            return results
+        with batch(), self.store.transaction():
+            for name, value in values.items():
+                try:
+                    self.registry.set(ids[name], value)
+                    results[name] = "ok"
+                except Exception as e:
+                    self.logger.error(
+                        "Can't set tag %s with value %s" % (name, value),
+                        exc_info=1)
+                    results[name] = "error: %s" % e
+        return results
+
+    def hastag(self, tag):
+        '''
+        True if handler has tag
+        '''
+        return tag in self._tags
+
+    def writable(self, tag):
+        '''
+        True if tag can be set
+        '''
+        return True
+
+    def checkvalue(self, tag, value):
+        '''
+        return value tag will be set to,
+        raise ValueError if tag can't have it
+        Override if handler take only some values
+        '''
+        return value
+
     def _settag(self, tag, value):
         '''
         Private method for settag
@@ -106,26 +288,27 @@ class AbstractHandler(object):
         '''
         if self._tags[tag] != value:
             self._tags[tag] = value
-            self.events.append({"tag": tag, "value": value})
+            with self._eventslock:
+                self.events.append(Event(self.signal, tag, value))
             self.sendevents()
 
     def gettag(self, tag):
         '''
         get tag value
-        if parent call his method
+        qualified tag is taken from the registry,
+        if there is no registry from parent,
         else call private method
 
         '''
         self.logger.info("gettag " + tag)
-        if self.parent:
-            l = tag.split("_")
-            if len(l) == 2:
-                if l[0] == __name__:
-                    return self._gettag(l[1])
-                else:
-                    return self.parent.gettag(tag)
-            else:
+        if self.registry is not None:
+            try:
+                tagid = self.registry.id(tag)
+            except KeyError:
                 return self._gettag(tag)
+            return self.registry.get(tagid)
+        elif self.parent and "_" in tag:
+            return self.parent.gettag(tag)
         else:
             return self._gettag(tag)
 
@@ -144,6 +327,13 @@ class AbstractHandler(object):
             return {}
         return self._tags
 
+    @property
+    def stats(self):
+        '''
+        counters of the dispatch pool
+        '''
+        return self.dispatchpool.stats()
+
     def loadtags(self):
         '''
         Load tags from config
@@ -156,8 +346,14 @@ class AbstractHandler(object):
         '''
         self.stopped = True
         self.logger.info("Stop handler")
-        dispatcher.disconnect(self.__handler, signal=self.params.get(
-            "listensignals", dispatcher.Any))
+        if self.store is not None:
+            self.store.detach(self._tags)
+        if self.dispatch == EXECUTOR:
+            bus.unsubscribe(self.__handler)
+            self.dispatchpool.stop()
+        else:
+            bus.unsubscribe(self.process)
+        self.logger.debug("Dispatch stats - %s" % self.stats)
 
     def start(self):
         '''
@@ -165,5 +361,17 @@ class AbstractHandler(object):
         '''
         self.stopped = False
         self.logger.info("Start handler")
-        dispatcher.connect(self.__handler, signal=self.params.get(
-            "signals", dispatcher.Any))
+        if self.store is not None:
+            self.store.attach(self._tags)
+        signal = self.params.get("signals", Any)
+        tags = self.params.get("subscribe", self.subscriptions())
+        if isinstance(tags, basestring):
+            tags = [tags]
+        if self.dispatch == EXECUTOR:
+            self.dispatchpool.start()
+            bus.subscribe(self.__handler, signal, tags, self.signal,
+                          logger=self.logger)
+        else:
+            bus.subscribe(self.process, signal, tags, self.signal,
+                          threaded=self.dispatch == THREADPOOL,
+                          logger=self.logger)
@@ -2,9 +2,13 @@
 Action Handler
 '''
 from abstracthandler import AbstractHandler
+import re
 import time
 
 
+gettag_re = re.compile(r"gettag\(\s*['\"]([^'\"]+)['\"]\s*\)")
+
+
 class actionhandler(AbstractHandler):
 
     def __init__(self, parent=None, params={}):
@@ -17,28 +21,37 @@ class actionhandler(AbstractHandler):
     def process(self, signal, events):
         for event in events:
             self.logger.debug(event)
-            self.temp_tags[event['tag']] = event['value']
-            for tag, params in self.config.items():
-                if 'condition' in params:
-                    params = params.copy()
-                    cond = params.pop('condition')
-                    if event['tag'] in cond:
-                        self.logger.debug("check cond %s" % cond)
-                        try:
-                            self.logger.debug("eval %s" % eval(cond))
-                            if eval(cond):
-                                self._settag(tag, '1')
-                        except Exception, e:
-                            self.logger.error(
-                                "Error(%s) while eval(%s)" % (e, cond))
+            self.temp_tags[event.name] = event.value
+            for tag, cond in self.conditions.get(event.name, ()):
+                self.logger.debug("check cond %s" % cond)
+                try:
+                    result = eval(self.codes[cond])
+                    self.logger.debug("eval %s" % result)
+                    if result:
+                        self._settag(tag, '1')
+                except Exception, e:
+                    self.logger.error(
+                        "Error(%s) while eval(%s)" % (e, cond))
         self.temp_tags = {}
         self.logger.debug('End of process')
 
+    def subscriptions(self):
+        return sorted(self.conditions)
+
     def gettag(self, tag):
         if tag in self.temp_tags:
             return int(self.temp_tags[tag])
         return AbstractHandler.gettag(self, tag)
 
+    def gettagid(self, tagid):
+        '''
+        gettag by registry id, used by compiled conditions
+        '''
+        name = self.registry.name(tagid)
+        if name in self.temp_tags:
+            return int(self.temp_tags[name])
+        return self.registry.get(tagid)
+
     def _settag(self, tag, value):
         AbstractHandler._settag(self, tag, value)
         if str(value) == '1':
@@ -64,8 +77,30 @@ class actionhandler(AbstractHandler):
         self._settag(tag, '0')
 
     def loadtags(self):
+        # index of conditions by tags they use
+        self.conditions = {}
+        self.codes = {}
         for tag in self.config:
             self._tags[tag] = '0'
+            cond = self.config[tag].get('condition')
+            if cond:
+                self.codes[cond] = compile(cond, tag, 'eval')
+                for name in set(gettag_re.findall(cond)):
+                    self.conditions.setdefault(name, []).append((tag, cond))
+
+    def _bindconditions(self):
+        '''
+        compile conditions with tag names replaced by registry ids
+        '''
+        def bind(match):
+            return "gettagid(%d)" % self.registry.id(match.group(1))
+        for name, conditions in self.conditions.items():
+            for tag, cond in conditions:
+                try:
+                    self.codes[cond] = compile(
+                        gettag_re.sub(bind, cond), tag, 'eval')
+                except KeyError:
+                    self.logger.debug("Can't bind %s" % cond)
 
     def switcher(self, params):
         for tag in params:
@@ -81,6 +116,11 @@ class actionhandler(AbstractHandler):
         else:
             self.settag(tag, '0')
 
+    def start(self):
+        if self.registry is not None:
+            self._bindconditions()
+        AbstractHandler.start(self)
+
     def sleep(self, params):
         self.logger.debug('before timeout')
         time.sleep(float(params.get('timeout', 1)))
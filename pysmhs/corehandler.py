@@ -2,6 +2,9 @@
 Core handler
 '''
 from abstracthandler import AbstractHandler
+from eventbus import bus
+from tagregistry import TagRegistry
+from tagstore import TagStore
 from twisted.internet import reactor
 
 
@@ -14,11 +17,20 @@ class corehandler(AbstractHandler):
         assert "configfile" in params, "no param configfile"
         self.listeners = {}
         AbstractHandler.__init__(self, parent, params)
+        self.registry = TagRegistry()
+        self.registry.addhandler(__name__, self)
+        self.store = TagStore()
+        self.store.attach(self._tags)
         params = self.config[__name__]["params"]
+        bus.threads = int(params.get("threads", 4))
         self.logger.info('Init core server')
         # if self.config[__name__].get("run", "1") == "1":
         #     self.start()
 
+    def subscriptions(self):
+        # events of others are not used
+        return []
+
     def loadtags(self):
         for tag in self.config:
             self._settag(tag, self.config[tag].get("run", "1"))
@@ -31,6 +43,9 @@ class corehandler(AbstractHandler):
             handler = eval(
                 "_temp." + classname + "(parent, params)")
             self.listeners[classname] = handler
+            handler.registry = self.registry
+            handler.store = self.store
+            self.registry.addhandler(classname, handler)
             # except ImportError, e:
             #     print e
 
@@ -54,21 +69,15 @@ class corehandler(AbstractHandler):
             self.listeners[classname].start()
 
     def _settag(self, tag, value):
+        '''
+        set own tag, other tags are set through the registry
+        '''
         self.logger.debug("Setting tag %s to %s" % (tag, value))
-        l = tag.split("_")
-        # try:
-        if len(l) == 2:
-            if l[0] == __name__:
-                if self._tags[l[1]] != value:
-                    self._set_listeners(l[1], value)
-                    AbstractHandler._settag(self, l[1], value)
-            else:
-                self.listeners[l[0]].settag(l[1], value)
-        else:
+        if tag not in self._tags:
             self._tags[tag] = value
-        # except:
-        #     self.logger.error(
-        #         "Can't settag", exc_info=1)
+        elif self._tags[tag] != value:
+            self._set_listeners(tag, value)
+            AbstractHandler._settag(self, tag, value)
 
     def _set_listeners(self, tag, value):
         if tag in self.listeners:
@@ -77,27 +86,28 @@ class corehandler(AbstractHandler):
             else:
                 self.listeners[tag].stop()
 
-    def _gettag(self, tag):
-        l = tag.split("_")
-        if len(l) == 2:
-            if l[0] == __name__:
-                return self._tags[l[1]]
-            else:
-                return self.listeners[l[0]].gettag(l[1])
-        else:
-            return self._tags[tag]
-
     @property
     def tags(self):
-        tagslist = {}
-        for listener in self.listeners.values():
-            for tag in listener.tags:
-                tagslist[
-                    "%s_%s" %
-                    (listener.__class__.__name__, tag)] = listener.tags[tag]
-        for tag in self._tags:
-            tagslist["%s_%s" % (__name__, tag)] = self._tags[tag]
-        return tagslist
+        '''
+        read only snapshot of tags of all running handlers
+        '''
+        return self.store.snapshot()
+
+    def changes(self, since):
+        '''
+        tags changed after version since, see TagStore.changes
+        '''
+        return self.store.changes(since)
+
+    @property
+    def stats(self):
+        '''
+        dispatch counters of all handlers
+        '''
+        stats = {__name__: self.dispatchpool.stats()}
+        for name, listener in self.listeners.items():
+            stats[name] = listener.stats
+        return stats
 
     def stop(self):
         AbstractHandler.stop(self)
@@ -113,4 +123,5 @@ class corehandler(AbstractHandler):
         for listener in self.listeners:
             if self._tags[listener] == '1':
                 self.listeners[listener].start()
+        bus.buildindex(self.tags)
         reactor.run(installSignalHandlers=0)
@@ -1,7 +1,7 @@
 '''
 Date handler
 '''
-from abstracthandler import AbstractHandler
+from abstracthandler import AbstractHandler, REACTOR
 from datetime import datetime, time
 from twisted.internet.task import LoopingCall
 from dateutil.parser import parse
@@ -12,8 +12,14 @@ from xml.dom import minidom
 
 class datehandler(AbstractHandler):
 
+    dispatch = REACTOR
+
     midnight = time(00, 00, 00)
 
+    def subscriptions(self):
+        # events of others are not used
+        return []
+
     def updatedate(self):
         now = datetime.now().replace(microsecond=0)
         self._tags['date'] = now.strftime("%d.%m.%Y %H:%M:%S")
@@ -0,0 +1,253 @@
+'''
+Dispatch pool
+
+Bounded pool of worker threads that feeds event batches
+to a handler process method
+'''
+import threading
+import time
+from collections import deque
+from twisted.python import threadable
+
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+COALESCE = "coalesce"
+POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+def coalesce(events):
+    '''
+    merge list of events, keep only last value of every tag
+    in the order of the last change
+    '''
+    last = {}
+    for i, event in enumerate(events):
+        last[event.name] = i
+    return [event for i, event in enumerate(events)
+            if last[event.name] == i]
+
+
+class DispatchPool(object):
+
+    '''
+    Pool of worker threads with bounded queue
+
+    When queue is full submit behaves as policy say:
+    block - wait until worker take something from queue
+            (workers of the pool itself never wait, the reactor
+            thread don't wait too, it coalesce and count it)
+    drop-oldest - throw away the oldest batch in queue
+    coalesce - merge batch into the newest batch in queue
+    '''
+
+    def __init__(self, target, workers=4, queuesize=256, policy=BLOCK,
+                 name="DispatchPool", logger=None):
+        assert policy in POLICIES, "unknown policy %s" % policy
+        assert workers > 0 and queuesize > 0
+        self.target = target
+        self.workers = workers
+        self.queuesize = queuesize
+        self.policy = policy
+        self.name = name
+        self.logger = logger
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.maxdepth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        '''
+        return counters to size the pool
+        '''
+        with self._cond:
+            processed = self.processed
+            return {"workers": self.workers,
+                    "queuesize": self.queuesize,
+                    "policy": self.policy,
+                    "depth": len(self._queue),
+                    "maxdepth": self.maxdepth,
+                    "submitted": self.submitted,
+                    "processed": processed,
+                    "dropped": self.dropped,
+                    "coalesced": self.coalesced,
+                    "latency_avg": (self.latency_total / processed
+                                    if processed else 0.0),
+                    "latency_max": self.latency_max}
+
+    def submit(self, signal, events):
+        '''
+        put batch of events to the queue
+        '''
+        with self._cond:
+            self.submitted += 1
+            if len(self._queue) >= self.queuesize:
+                policy = self.policy
+                # web and PLC stop while reactor wait
+                if policy == BLOCK and threadable.isInIOThread():
+                    policy = COALESCE
+                if policy == BLOCK:
+                    # worker of this pool can't wait for itself
+                    current = threading.current_thread()
+                    while (self._running and
+                           len(self._queue) >= self.queuesize and
+                           current not in self._threads):
+                        self._cond.wait()
+                elif policy == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    _signal, queued, queuedtime = self._queue.pop()
+                    self._queue.append(
+                        (_signal, coalesce(queued + list(events)),
+                         queuedtime))
+                    self.coalesced += 1
+                    return
+            self._queue.append((signal, events, time.time()))
+            self.maxdepth = max(self.maxdepth, len(self._queue))
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                signal, events, queuedtime = self._queue.popleft()
+                latency = time.time() - queuedtime
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self._cond.notify_all()
+            try:
+                self.target(signal, events)
+            except:
+                if self.logger:
+                    self.logger.error(
+                        "Error while process events %s" % (events,),
+                        exc_info=1)
+            with self._cond:
+                self.processed += 1
+
+    def start(self):
+        '''
+        Start workers
+        '''
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._worker, name="%s-%d" % (self.name, i))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        '''
+        Stop workers, they finish events that already in queue
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._threads = []
+
+
+class SerialExecutor(object):
+
+    '''
+    Executor that keep order of event batches
+
+    Every lane is a pool with one worker, so batches in the lane
+    are processed one by one in FIFO order.
+    Without key all batches go to one lane.
+    With key=True events split by tag, so events of one tag
+    always go to the same lane and keep order, while
+    different tags are processed in parallel
+    '''
+
+    def __init__(self, target, lanes=1, key=False, queuesize=256,
+                 policy=BLOCK, name="SerialExecutor", logger=None):
+        self.key = key
+        self.lanes = [
+            DispatchPool(target, workers=1, queuesize=queuesize,
+                         policy=policy, name="%s-%d" % (name, i),
+                         logger=logger)
+            for i in range(lanes if key else 1)]
+
+    @property
+    def depth(self):
+        return sum(lane.depth for lane in self.lanes)
+
+    def stats(self):
+        '''
+        return counters of all lanes together
+        '''
+        lanes = [lane.stats() for lane in self.lanes]
+        stats = {"workers": len(lanes),
+                 "queuesize": lanes[0]["queuesize"],
+                 "policy": lanes[0]["policy"],
+                 "latency_max": max(s["latency_max"] for s in lanes)}
+        for counter in ("depth", "maxdepth", "submitted", "processed",
+                        "dropped", "coalesced"):
+            stats[counter] = sum(s[counter] for s in lanes)
+        latency = sum(s["latency_avg"] * s["processed"] for s in lanes)
+        stats["latency_avg"] = (latency / stats["processed"]
+                                if stats["processed"] else 0.0)
+        return stats
+
+    def submit(self, signal, events):
+        '''
+        put batch of events to the lane
+        '''
+        if len(self.lanes) == 1:
+            self.lanes[0].submit(signal, events)
+            return
+        batches = {}
+        for event in events:
+            lane = hash(event.name) % len(self.lanes)
+            batches.setdefault(lane, []).append(event)
+        for lane, batch in batches.items():
+            self.lanes[lane].submit(signal, batch)
+
+    def start(self):
+        for lane in self.lanes:
+            lane.start()
+
+    def stop(self):
+        for lane in self.lanes:
+            lane.stop()
+
+
+def executor(target, params, name="DispatchPool", logger=None):
+    '''
+    build executor for handler from its params
+
+    ordering = none - pool of workers, no order
+    ordering = handler - all batches in FIFO order
+    ordering = tag - FIFO order per tag, workers lanes
+    '''
+    workers = int(params.get("workers", 4))
+    queuesize = int(params.get("queuesize", 256))
+    policy = params.get("queuepolicy", BLOCK)
+    ordering = params.get("ordering", "handler")
+    assert ordering in ("none", "handler", "tag"), \
+        "unknown ordering %s" % ordering
+    if ordering == "none":
+        return DispatchPool(target, workers=workers, queuesize=queuesize,
+                            policy=policy, name=name, logger=logger)
+    return SerialExecutor(target, lanes=workers, key=ordering == "tag",
+                          queuesize=queuesize, policy=policy, name=name,
+                          logger=logger)
@@ -0,0 +1,38 @@
+'''
+Event record
+
+Event of tag change, created once by handler and never changed
+'''
+import itertools
+import time
+from collections import namedtuple
+from datetime import datetime
+
+
+_seq = itertools.count(1)
+
+
+class Event(namedtuple("Event", "handler tag name value time seq")):
+
+    '''
+    Immutable event record
+
+    handler - name of handler that send event
+    tag - name of tag inside handler
+    name - qualified tag name, like plchandler_van4
+    value - new value of tag, as string
+    time - when tag was changed, seconds since epoch
+    seq - global sequence number, order of events,
+        EventRing keep its own position next to event
+    '''
+
+    __slots__ = ()
+
+    def __new__(cls, handler, tag, value):
+        return super(Event, cls).__new__(
+            cls, handler, tag, "%s_%s" % (handler, tag), str(value),
+            time.time(), next(_seq))
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.time)
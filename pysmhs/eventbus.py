@@ -0,0 +1,159 @@
+'''
+Event bus
+
+In-process event bus, that deliver events on the reactor thread.
+Cheap subscribers are called right in the reactor,
+blocking subscribers go to the bus thread pool.
+Subscribers declare tags (or globs like plchandler_vkc*) they want,
+and get only events of these tags
+'''
+from fnmatch import fnmatchcase
+from twisted.internet import reactor as _reactor
+from twisted.internet import threads
+from twisted.python import threadable
+from twisted.python.threadpool import ThreadPool
+
+
+class _Any(object):
+
+    def __repr__(self):
+        return "Any"
+
+
+Any = _Any()
+
+
+class Subscription(object):
+
+    def __init__(self, callback, signal, tags, sender, threaded, logger):
+        self.callback = callback
+        self.signal = signal
+        self.sender = sender
+        self.threaded = threaded
+        self.logger = logger
+        self.tags = set()
+        self.patterns = []
+        if tags is None:
+            self.patterns.append("*")
+        else:
+            for tag in tags:
+                if any(c in tag for c in "*?["):
+                    self.patterns.append(tag)
+                else:
+                    self.tags.add(tag)
+
+    def match(self, tag):
+        if tag in self.tags:
+            return True
+        for pattern in self.patterns:
+            if fnmatchcase(tag, pattern):
+                return True
+        return False
+
+
+class EventBus(object):
+
+    '''
+    Event bus on the twisted reactor
+
+    publish can be called from any thread, events are always
+    delivered from the reactor thread
+    '''
+
+    def __init__(self, reactor=None, threads=4):
+        self.reactor = reactor or _reactor
+        self.threads = threads
+        self.threadpool = None
+        self._subscriptions = []
+        self._index = {}
+
+    def subscribe(self, callback, signal=Any, tags=None, sender=None,
+                  threaded=False, logger=None):
+        '''
+        subscribe callback(signal, events) to the signal
+        tags - list of tag names or globs, None for all tags
+        sender - signal of subscriber, it don't get own events
+        if threaded callback is called in the bus thread pool
+        '''
+        self._subscriptions.append(Subscription(
+            callback, signal, tags, sender, threaded, logger))
+        self._index = {}
+
+    def unsubscribe(self, callback):
+        self._subscriptions = [s for s in self._subscriptions
+                               if s.callback != callback]
+        self._index = {}
+
+    def subscribers(self, tag):
+        '''
+        return subscriptions of the tag, from the index
+        '''
+        try:
+            return self._index[tag]
+        except KeyError:
+            subscriptions = self._index[tag] = tuple(
+                s for s in self._subscriptions if s.match(tag))
+            return subscriptions
+
+    def buildindex(self, tags):
+        '''
+        precompute tag to subscribers index for known tags
+        '''
+        for tag in tags:
+            self.subscribers(tag)
+
+    def publish(self, signal, events):
+        '''
+        send events to subscribers on the next reactor iteration
+        '''
+        if threadable.isInIOThread():
+            self.reactor.callLater(0, self._deliver, signal, events)
+        else:
+            self.reactor.callFromThread(self._deliver, signal, events)
+
+    def _deliver(self, signal, events):
+        batches = {}
+        order = []
+        for event in events:
+            for subscription in self.subscribers(event.name):
+                if subscription not in batches:
+                    if (subscription.sender == signal or
+                            (subscription.signal is not Any and
+                             subscription.signal != signal)):
+                        continue
+                    batches[subscription] = []
+                    order.append(subscription)
+                batches[subscription].append(event)
+        for subscription in order:
+            events = batches[subscription]
+            if subscription.threaded:
+                d = threads.deferToThreadPool(
+                    self.reactor, self._getthreadpool(),
+                    subscription.callback, signal, events)
+                d.addErrback(self._error, subscription, events)
+            else:
+                try:
+                    subscription.callback(signal, events)
+                except:
+                    if subscription.logger:
+                        subscription.logger.error(
+                            "Error while process events %s" % (events,),
+                            exc_info=1)
+
+    def _error(self, failure, subscription, events):
+        if subscription.logger:
+            subscription.logger.error(
+                "Error while process events %s: %s" % (
+                    events, failure.getTraceback()))
+
+    def _getthreadpool(self):
+        if self.threadpool is None:
+            self.threadpool = ThreadPool(
+                minthreads=0, maxthreads=self.threads, name="EventBus")
+            self.threadpool.start()
+            self.reactor.addSystemEventTrigger(
+                "during", "shutdown", self.threadpool.stop)
+        return self.threadpool
+
+
+bus = EventBus()
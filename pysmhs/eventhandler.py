@@ -4,8 +4,8 @@ Created on Jan 24, 2012
 @author: pavel
 '''
 
-from pydispatch import dispatcher
-import threading
+from dispatchpool import executor
+from eventbus import bus, Any
 
 
 class EventHandler(object):
@@ -16,19 +16,20 @@ class EventHandler(object):
     '''
 
     def __init__(self, params, polling):
-        dispatcher.connect(self.handler, signal=params.setdefault(
-            "signals", dispatcher.Any))
+        bus.subscribe(self.handler, params.setdefault("signals", Any))
         self.params = params
         self.polling = polling
+        self.dispatchpool = executor(
+            self.proccess, params, name=self.__class__.__name__)
+        self.dispatchpool.start()
 
     def handler(self, signal, events):
         '''
-        method accept events from dispacher
+        method accept events from event bus
         @param signal:
         @param events:
         '''
-        t1 = threading.Thread(target=self.proccess, args=(signal, events))
-        t1.start()
+        self.dispatchpool.submit(signal, events)
 
     def proccess(self, signal, events):
         '''
@@ -44,4 +45,6 @@ class EventHandler(object):
         In this method handler have to close all resource
         and stop all threads
         '''
+        bus.unsubscribe(self.handler)
+        self.dispatchpool.stop()
         print "stop EventHandler " + str(self)
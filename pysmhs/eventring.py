@@ -0,0 +1,92 @@
+'''
+Event ring buffer
+
+Last events of all handlers in fixed size ring,
+every event get its own position in the ring
+'''
+from itertools import islice
+
+
+class EventRing(object):
+
+    '''
+    Fixed capacity ring of events
+
+    Only one writer (reactor thread) append events, every appended
+    event is kept as (seq, event) with seq of the ring, so seq
+    in the ring is strictly monotonic without gaps, seq of event
+    itself is not changed.
+    Readers from any thread don't lock: slot overwritten while
+    reading is found by its seq and skipped.
+    '''
+
+    def __init__(self, size=255):
+        if size < 1:
+            raise ValueError("size of event ring have to be positive")
+        self.size = size
+        self._slots = [None] * size
+        # seq of the newest event, 0 when ring is empty
+        self.last = 0
+
+    @property
+    def first(self):
+        '''
+        seq of the oldest event in the ring
+        '''
+        return max(1, self.last - self.size + 1)
+
+    def append(self, event):
+        '''
+        add event, return (seq, event) with seq of the ring
+        '''
+        seq = self.last + 1
+        item = (seq, event)
+        self._slots[seq % self.size] = item
+        self.last = seq
+        return item
+
+    def extend(self, events):
+        return [self.append(event) for event in events]
+
+    def lost(self, seq):
+        '''
+        True if events after seq are no more in the ring,
+        or seq is from the future (ring was restarted)
+        '''
+        return seq > self.last or seq < self.first - 1
+
+    def after(self, seq, limit=None):
+        '''
+        (seq, event) with seq greater than seq, the oldest first
+        '''
+        return list(islice(self.iterafter(seq), limit))
+
+    def iterafter(self, seq):
+        '''
+        lazy after(), events appended while iterating are not given
+        '''
+        last = self.last
+        slots, size = self._slots, self.size
+        for s in xrange(max(seq + 1, last - size + 1, 1), last + 1):
+            item = slots[s % size]
+            if item is not None and item[0] == s:
+                yield item
+
+    def iterbefore(self, seq=None):
+        '''
+        (seq, event) with seq less than seq (all by default),
+        the newest first
+        '''
+        last = self.last
+        start = last if seq is None else min(seq - 1, last)
+        slots, size = self._slots, self.size
+        for s in xrange(start, max(last - size, 0), -1):
+            item = slots[s % size]
+            if item is not None and item[0] == s:
+                yield item
+
+    def __iter__(self):
+        return self.iterafter(0)
+
+    def __len__(self):
+        return min(self.last, self.size)
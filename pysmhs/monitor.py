@@ -0,0 +1,178 @@
+'''
+Event monitor
+
+Recent events from the event ring, filtered and paginated by seq,
+streamed to client as JSON lines or HTML while they are read
+'''
+import json
+from fnmatch import fnmatchcase
+from urllib import urlencode
+from twisted.internet.task import cooperate, TaskStopped
+from twisted.python.failure import Failure
+from twisted.web import resource, server
+from templates import get_template
+
+
+MAXLIMIT = 1000
+CHUNKSIZE = 8192
+
+
+def event_json(seq, event):
+    '''
+    event as json, seq - position of event in the ring
+    '''
+    return {"name": event.name, "value": event.value,
+            "seq": seq, "time": event.time}
+
+
+def eventfilter(handlers=None, tags=None, start=None, end=None):
+    '''
+    return predicate of events
+    handlers - names of handlers, tags - qualified names or globs,
+    start, end - time range, seconds since epoch
+    '''
+    handlers = set(handlers or ())
+    exact = set(t for t in tags or () if not any(c in t for c in "*?["))
+    patterns = [t for t in tags or () if t not in exact]
+
+    def match(event):
+        if handlers and event.handler not in handlers:
+            return False
+        if (exact or patterns) and event.name not in exact and not any(
+                fnmatchcase(event.name, p) for p in patterns):
+            return False
+        if start is not None and event.time < start:
+            return False
+        if end is not None and event.time > end:
+            return False
+        return True
+    return match
+
+
+class page(object):
+
+    '''
+    One page of matching (seq, event), read lazily from the ring
+
+    oldest, newest - seq of events given, known after iteration
+    more - there are more matching events in that direction
+    '''
+
+    def __init__(self, events, match, limit):
+        self.events = events
+        self.match = match
+        self.limit = limit
+        self.count = 0
+        self.oldest = self.newest = None
+        self.more = False
+
+    def __iter__(self):
+        for seq, event in self.events:
+            if not self.match(event):
+                continue
+            if self.count == self.limit:
+                self.more = True
+                return
+            self.count += 1
+            if self.oldest is None or seq < self.oldest:
+                self.oldest = seq
+            if self.newest is None or seq > self.newest:
+                self.newest = seq
+            yield seq, event
+
+
+class monitor(resource.Resource):
+
+    '''
+    Monitor of events
+
+    /mon - last events as HTML, the newest first
+    /mon?format=json - the same as JSON lines, one event per line
+        and summary line {"oldest", "newest", "more", "last"} at the end
+    filters: handler=, tag= (glob, both can repeat),
+        from=, to= (seconds since epoch), limit= (100 by default)
+    pages: before=N - older events, the newest first,
+        after=N - newer events, the oldest first
+    '''
+
+    isLeaf = True
+
+    def __init__(self, events, logger=None):
+        self.events = events
+        self.logger = logger
+        self.monitor_template = get_template('monitor_template.html')
+        resource.Resource.__init__(self)
+
+    def query(self, request):
+        args = request.args
+
+        def number(name, kind):
+            value = args.get(name, [""])[0]
+            return kind(value) if value else None
+        limit = number("limit", int)
+        limit = min(max(limit, 1), MAXLIMIT) if limit else 100
+        match = eventfilter(args.get("handler"), args.get("tag"),
+                            number("from", float), number("to", float))
+        after, before = number("after", int), number("before", int)
+        if after is not None:
+            events = self.events.iterafter(after)
+        else:
+            events = self.events.iterbefore(before)
+        params = [(name, value) for name in ("handler", "tag", "from", "to")
+                  for value in args.get(name, []) if value]
+        params.append(("limit", limit))
+        return page(events, match, limit), params
+
+    def render_GET(self, request):
+        try:
+            events, params = self.query(request)
+        except ValueError as e:
+            request.setResponseCode(400)
+            return "bad query: %s" % e
+        request.setHeader("Cache-Control", "no-cache")
+        if request.args.get("format", [""])[0] == "json":
+            request.setHeader("Content-Type", "application/x-ndjson")
+            chunks = self.jsonlines(events)
+        else:
+            request.setHeader("Content-Type", "text/html; charset=utf-8")
+            chunks = self.monitor_template.generate(
+                title=u'Monitor', page=events, query=urlencode(params),
+                params=dict(params))
+        task = cooperate(self.write(request, chunks))
+        # client gone, stop reading events for it
+        request.notifyFinish().addErrback(lambda _: task.stop())
+        task.whenDone().addBoth(self.done, request)
+        return server.NOT_DONE_YET
+
+    def done(self, result, request):
+        if isinstance(result, Failure):
+            if result.check(TaskStopped):
+                return
+            if self.logger:
+                self.logger.error("Error while stream events: %s" %
+                                  result.getErrorMessage())
+        request.finish()
+
+    def jsonlines(self, events):
+        for seq, event in events:
+            yield json.dumps(event_json(seq, event)) + "\n"
+        yield json.dumps({"oldest": events.oldest, "newest": events.newest,
+                          "more": events.more,
+                          "last": self.events.last}) + "\n"
+
+    def write(self, request, chunks):
+        '''
+        write chunks to request, give reactor back after every block
+        '''
+        block, size = [], 0
+        for chunk in chunks:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode("utf-8")
+            block.append(chunk)
+            size += len(chunk)
+            if size >= CHUNKSIZE:
+                request.write("".join(block))
+                block, size = [], 0
+                yield None
+        if block:
+            request.write("".join(block))
@@ -1,145 +1,243 @@
 from twisted.internet import serialport, reactor
-from twisted.internet import defer
-from twisted.internet.protocol import ClientFactory
+from twisted.internet.protocol import ReconnectingClientFactory
+from twisted.python import threadable
 from pymodbus.factory import ClientDecoder
 from pymodbus.client.async import ModbusClientProtocol
 from serial import PARITY_NONE, PARITY_EVEN, PARITY_ODD
 from serial import STOPBITS_ONE, STOPBITS_TWO
 from serial import FIVEBITS, SIXBITS, SEVENBITS, EIGHTBITS
-from pymodbus.transaction import ModbusAsciiFramer as ModbusFramer
-from abstracthandler import AbstractHandler
+from pymodbus.transaction import ModbusAsciiFramer, ModbusRtuFramer
+from pymodbus.transaction import ModbusSocketFramer
+from abstracthandler import AbstractHandler, REACTOR
+from event import Event
+from pollscheduler import PRIORITY, RATES, pollgroup, pollscheduler
+from readplanner import KINDS, LIMITS, plan, planbytes
+from writequeue import writequeue
+
+# transport by mode of [[[port]]]: framer and name of framing
+# for readplanner
+FRAMERS = {"ascii": (ModbusAsciiFramer, "ascii"),
+           "rtu": (ModbusRtuFramer, "rtu"),
+           "tcp": (ModbusSocketFramer, "socket")}
+PARITIES = {"N": PARITY_NONE, "E": PARITY_EVEN, "O": PARITY_ODD}
+BYTESIZES = {5: FIVEBITS, 6: SIXBITS, 7: SEVENBITS, 8: EIGHTBITS}
+STOPBITS = {1: STOPBITS_ONE, 2: STOPBITS_TWO}
+
+
+def make_framer(mode):
+    framer = FRAMERS[mode][0]
+    try:
+        return framer(ClientDecoder(), client=None)
+    except TypeError:
+        # pymodbus before 1.3 has no client argument
+        return framer(ClientDecoder())
 
 
 class SMHSProtocol(ModbusClientProtocol):
 
-    def __init__(self, framer, pol_list, logger, reader, writepool):
+    '''
+    One transaction at a time: queued writes first,
+    then polling tag, then the next read of the group
+    that pollscheduler choose
+    '''
+
+    def __init__(self, framer, scheduler, logger, reader, writepool,
+                 heartbeat=0, unit=0):
         ''' Initializes our custom protocol
 
         :param framer: The decoder to use to process messages
-        :param endpoint: The endpoint to send results to
+        :param scheduler: pollscheduler of groups of tags
+        :param heartbeat: interval of write of polling tag
+        :param unit: station address of PLC
         '''
         ModbusClientProtocol.__init__(self, framer)
-        self.pol_list = pol_list
+        self.unit = unit
+        self.scheduler = scheduler
         self.logger = logger
         self.reader = reader
         self.writepool = writepool
+        self.heartbeat = heartbeat
+        self.lastheartbeat = 0
+        # group being read, its reads left and count of changes
+        self.group = None
+        self.pending = []
+        self.changed = 0
+        self.idle = None
+        self.running = True
         self.logger.debug("Begining the processing loop")
-        reactor.callLater(3, self.start_new_cycle)
+        self.starting = reactor.callLater(3, self.start_new_cycle)
 
-    # def connectionLost(self, reason):
-    #     self.logger.debug("Connection to ModBus lost")
+    def connectionLost(self, reason):
+        self.logger.debug("Connection to ModBus lost")
+        self.running = False
+        for call in (self.starting, self.idle):
+            if call is not None and call.active():
+                call.cancel()
+        ModbusClientProtocol.connectionLost(self, reason)
 
-    # def connectionMade(self):
-    #     self.logger.debug("Connected to ModBus")
+    def execute(self, request):
+        request.unit_id = self.unit
+        return ModbusClientProtocol.execute(self, request)
 
     def start_new_cycle(self):
-        d = defer.Deferred()
-        d.addCallback(self.write_counter_threshold)
-        d.callback('start new cycle')
-
-    def write_counter_threshold(self, response):
-        # reg = (4598, 1)
-        # d = self.read_holding_registers(*reg)
-        d = self.write_register(4598, 250)
-        # d.addCallbacks(self.read_holding_registers(*reg))
-        # d.addCallbacks(self.threshold_readed)
-        d.addCallback(self.write_polling_tag)
+        self.transaction_done(self.write_counter_threshold())
+
+    def write_counter_threshold(self):
+        return self.write_register(4598, 250)
 
     def threshold_readed(self, response):
         self.logger.debug('counter threshold = %d' % response.getRegister(0))
 
-    def fetch_holding_registers(self, response):
-        address_map = self.pol_list["inputc"]
-        d = None
-        for register in address_map:
-            if not d:
-                d = self.fetch_holding_register(response, register=register)
-            else:
-                d.addCallback(self.fetch_holding_register, register=register)
-            d.addCallback(self.register_readed, register=register)
-        if not d:
-            self.fetch_coils(response)
-        else:
-            d.addCallback(self.fetch_coils)
+    def transaction_done(self, d):
+        d.addErrback(self.transaction_failed)
+        d.addCallback(self.next)
 
-    def fetch_holding_register(self, response, register):
-        return self.read_holding_registers(*register)
+    def transaction_failed(self, failure):
+        self.logger.error("Modbus transaction failed: %s" %
+                          failure.getErrorMessage())
 
-    def register_readed(self, response, register):
+    def wakeup(self):
+        '''
+        write is queued, don't wait for next read
+        '''
+        if self.idle is not None and self.idle.active():
+            self.idle.cancel()
+            self.next()
+
+    def next(self, _=None):
+        self.idle = None
+        if not self.running:
+            return
+        try:
+            self.next_request()
+        except Exception:
+            # one bad request must not stop polling
+            self.logger.error("Can't make request to PLC", exc_info=1)
+            self.idle = reactor.callLater(1, self.next)
+
+    def next_request(self):
+        '''
+        start the next transaction or wait for the next read
+        '''
+        now = reactor.seconds()
+        if self.writepool:
+            return self.transaction_done(self.write_tags())
+        if self.group is None:
+            group, delay = self.scheduler.next(now)
+            if group is None:
+                self.idle = reactor.callLater(
+                    delay if delay is not None else 1, self.next)
+                return
+            self.group, self.pending, self.changed = group, list(
+                group.reads), 0
+            if now - self.lastheartbeat >= self.heartbeat:
+                self.lastheartbeat = now
+                return self.transaction_done(self.write_polling_tag())
+        if self.pending:
+            register = self.pending.pop(0)
+            if self.group.kind == "coils":
+                d = self.read_coils(*register)
+                d.addCallback(self.coil_readed, register, self.group.name)
+            else:
+                d = self.read_holding_registers(*register)
+                d.addCallback(
+                    self.register_readed, register, self.group.name)
+            return self.transaction_done(d)
+        self.scheduler.done(self.group, self.changed, now)
+        self.group = None
+        self.next()
+
+    def register_readed(self, response, register, t):
         val = {}
         for i in range(0, register[1]):
             val[register[0] + i] = response.getRegister(i)
-        self.reader(val, "inputc")
-
-    def fetch_coil(self, response, register):
-        return self.read_coils(*register)
+        self.changed += self.reader(val, t)
 
-    def fetch_coils(self, response):
-        address_map = self.pol_list["output"]
-        d = None
-        for register in address_map:
-            if not d:
-                d = self.fetch_coil(response, register)
-            else:
-                d.addCallback(self.fetch_coil, register=register)
-            d.addCallback(self.coil_readed, register=register)
-        if not d:
-            self.write_tags(response)
-        else:
-            d.addCallback(self.write_tags)
-
-    def coil_readed(self, response, register):
+    def coil_readed(self, response, register, t):
         val = {}
         for i in range(0, register[1]):
             val[register[0] + i] = response.getBit(i)
-            #print str(val[register[0] + i]) + ":" +  str(response.getBit(i))
-        self.reader(val, "output")
-
-    def write_tags(self, response):
-        d = None
-        if len(self.writepool):
-            self.logger.debug("writepool len = %d" % len(self.writepool))
-            for x in self.writepool.keys():
-                val = int(self.writepool.pop(x))
-                self.logger.debug(
-                    "writting tag %s to %d" % (x, val))
-                if val:
-                    val = 0xFF00
-                else:
-                    val = 0x0000
-                if not d:
-                    d = self.write_tag(response, x, val)
-                else:
-                    d.addCallback(self.write_tag, addr=x, value=val)
-        if not d:
-            self.write_polling_tag(response)
+        self.changed += self.reader(val, t)
+
+    def write_tags(self):
+        '''
+        write run of consecutive coils or registers of writepool,
+        Write Multiple Coils/Registers when there are more than one
+        '''
+        self.logger.debug("writepool len = %d" % len(self.writepool))
+        kind, start, values, times = self.writepool.take()
+        self.logger.debug("writting %s %d..%d to %s" % (
+            kind, start, start + len(values) - 1, values))
+        # values are checked by checkvalue
+        if kind == "coils":
+            values = [bool(v) for v in values]
+            if len(values) == 1:
+                d = self.write_coil(start, 0xFF00 if values[0] else 0x0000)
+            else:
+                d = self.write_coils(start, values)
         else:
-            d.addCallback(self.write_polling_tag)
+            if len(values) == 1:
+                d = self.write_register(start, values[0])
+            else:
+                d = self.write_registers(start, values)
+        d.addCallbacks(self.tags_written, self.tags_failed,
+                       callbackArgs=(kind, start, values, times),
+                       errbackArgs=(times,))
+        return d
+
+    def tags_written(self, response, kind, start, values, times):
+        # exception response has function code with high bit
+        if not response.function_code & 0x80:
+            self.writepool.done(times)
+            # read back written values with the next read
+            self.scheduler.written(kind, start, len(values),
+                                   reactor.seconds())
+        elif len(values) > 1:
+            # PLC don't know multiple write, write them one by one
+            self.logger.warning(
+                "PLC refused write of multiple %s: %s, write them "
+                "one by one" % (kind, response))
+            self.writepool.single.add(kind)
+            self.writepool.putback(kind, start, values, times)
+        else:
+            self.writepool.done(times, ok=False)
+            self.logger.error("PLC refused write: %s" % response)
+
+    def tags_failed(self, failure, times):
+        self.writepool.done(times, ok=False)
+        return failure
 
-    def write_tag(self, response, addr, value):
-        return self.write_coil(addr, value)
+    def write_polling_tag(self):
+        return self.write_coil(2057, 0xFF00)
 
-    def write_polling_tag(self, response):
-        d = self.write_coil(2057, 0xFF00)
-        d.addCallback(self.fetch_holding_registers)
 
+class SMHSFactory(ReconnectingClientFactory):
 
-class SMHSFactory(ClientFactory):
+    '''
+    Protocol with new framer for every connection,
+    tcp connection is made again when lost
+    '''
 
     protocol = SMHSProtocol
 
-    def __init__(self, framer, pol_list, logger, reader, writepool):
-        self.framer = framer
-        self.pol_list = pol_list
+    def __init__(self, mode, scheduler, logger, reader, writepool,
+                 heartbeat=0, unit=0):
+        self.mode = mode
+        self.scheduler = scheduler
         self.logger = logger
         self.reader = reader
         self.writepool = writepool
+        self.heartbeat = heartbeat
+        self.unit = unit
+        self.client = None
 
     def buildProtocol(self, _):
+        self.resetDelay()
         proto = self.protocol(
-            self.framer,
-            self.pol_list, self.logger, self.reader, self.writepool)
+            make_framer(self.mode), self.scheduler, self.logger,
+            self.reader, self.writepool, self.heartbeat, self.unit)
         proto.factory = self
+        self.client = proto
         return proto
 
 
@@ -153,20 +251,48 @@ class SerialModbusClient(serialport.SerialPort):
 
 class plchandler(AbstractHandler):
 
+    dispatch = REACTOR
+
     def __init__(self, parent=None, params={}):
         AbstractHandler.__init__(self, parent, params)
         self.logger.info("Init async_plchandler")
         serverconfig = params["server"]
+        self.serverconfig = serverconfig
         self.serial_port = params["port"]
+        self.mode = self.serial_port.get("mode", "ascii")
+        if self.mode not in FRAMERS:
+            raise ValueError("unknown mode of port %s" % self.mode)
         self.pollint = serverconfig["pollingTimeout"]
         self.packetSize = int(serverconfig["packetSize"])
+        self.maxgap = serverconfig.get("maxGap")
+        self.heartbeat = float(serverconfig.get("heartbeat", 0.2))
+        # (min, max) poll interval of groups, pollingTimeout is
+        # the least interval of all
+        self.rates = {}
+        for t, rate in RATES.items():
+            rate = serverconfig.get(t, rate)
+            if not isinstance(rate, (list, tuple)):
+                rate = (rate, rate)
+            self.rates[t] = (max(float(rate[0]), float(self.pollint)),
+                             max(float(rate[1]), float(self.pollint)))
+        self.factory = None
         self.tagslist = {}
-        self.writepool = {}
+        self.writepool = writequeue(reactor.seconds)
         self._inputctags = {}
         self._inputtag_threshold = int(serverconfig["counter_threshold"])
+        # coils or registers, kind = of tag or by type of tag
+        self.tagkinds = {}
+        self.tagtypes = {}
         #fill tagslist with tags from all types
         for tagtype in self.config:
             self.tagslist.update(self.config[tagtype])
+            for x in self.config[tagtype]:
+                self.tagtypes[x] = tagtype
+                kind = self.config[tagtype][x].get(
+                    "kind", KINDS.get(tagtype, "coils"))
+                if kind not in LIMITS:
+                    raise ValueError("unknown kind %s of tag %s" % (kind, x))
+                self.tagkinds[x] = kind
         #fill address list
         self.full_address_list = {}
         for x in self.tagslist:
@@ -175,31 +301,77 @@ class plchandler(AbstractHandler):
                 self.full_address_list[int(address)] = x
         self.logger.debug("Full address list - %s" % self.full_address_list)
 
+    @property
+    def stats(self):
+        '''
+        counters of the dispatch pool and of writes to PLC
+        '''
+        stats = AbstractHandler.stats.fget(self)
+        stats["writes"] = self.writepool.stats()
+        return stats
+
+    def hastag(self, tag):
+        return tag in self.tagslist and "address" in self.tagslist[tag]
+
+    def subscriptions(self):
+        # events of others are not used
+        return []
+
+    def writable(self, tag):
+        # counters of PLC are only read
+        return self.tagtypes[tag] != "inputc"
+
+    def checkvalue(self, tag, value):
+        '''
+        coils are written as 0 or 1, registers as 0..65535
+        '''
+        try:
+            value = int(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("%r is not a number" % (value,))
+        if self.tagkinds[tag] == "coils":
+            return 1 if value else 0
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError("%d is out of register range" % value)
+        return value
+
     def _settag(self, name, value):
         self.logger.debug("set tag %s to %s" % (name, value))
-        self.writepool[int(self.tagslist[name]["address"])] = value
+        if not self.writable(name):
+            raise ValueError("tag %s is read only" % name)
+        value = self.checkvalue(name, value)
+        address = int(self.tagslist[name]["address"])
+        # write queue and transport are used only from the reactor,
+        # actions set tags from executor threads
+        if threadable.isInIOThread():
+            self._write(address, value, self.tagkinds[name])
+        else:
+            reactor.callFromThread(
+                self._write, address, value, self.tagkinds[name])
+
+    def _write(self, address, value, kind):
+        self.writepool.put(address, value, kind)
+        if self.factory is not None and self.factory.client is not None:
+            self.factory.client.wakeup()
 
-    def _generate_address_map(self, addressList):
+    def _generate_address_map(self, addressList, tagtype, kind):
         '''
         generate addressMap based on the addressList
-        addressMap is dictionary with key = startaddress to read
-        and value = number of bits need to read
+        addressMap is tuple of (startaddress, number of bits or
+        registers to read), see readplanner
         '''
-        keylist = addressList.keys()
-        maxAddress = int(max(keylist))
-        minAddress = int(min(keylist))
-        s = maxAddress - minAddress + 1
-        c, d = divmod(s, self.packetSize)
-        l = maxAddress - d + 1
-        addressMap = []
-        for x in range(0, c):
-            curAddress = minAddress + self.packetSize * x
-            addressMap.append((curAddress, self.packetSize,))
-        if (d > 0):
-            addressMap.append((l, d,))
-        return tuple(addressMap)
+        framer = FRAMERS[self.mode][1]
+        addressMap = plan(addressList, kind, maxgap=self.maxgap,
+                          maxcount=self.packetSize, framer=framer)
+        self.logger.debug("Read plan of %s %s - %s, %d bytes per cycle" % (
+            tagtype, kind, addressMap, planbytes(addressMap, kind, framer)))
+        return addressMap
 
     def reader(self, register, t):
+        '''
+        take values read from PLC, return count of changes
+        '''
+        count = len(self.events)
         for addr in register:
             if addr in self.full_address_list:
                 tagname = self.full_address_list[addr]
@@ -208,7 +380,9 @@ class plchandler(AbstractHandler):
                     self.__addinputctag(tagname, tagstate)
                 else:
                     self.__addtag(tagname, tagstate)
+        count = len(self.events) - count
         self.sendevents()
+        return count
 
     def __addtag(self, tag, value, addevent=True):
         '''
@@ -222,7 +396,7 @@ class plchandler(AbstractHandler):
                 self._tags[tag] = value
                 if addevent:
                     # self.events[tag] = value
-                    self.events.append({"tag": tag, "value": value})
+                    self.events.append(Event(self.signal, tag, value))
         else:
             self._tags[tag] = value
 
@@ -237,33 +411,51 @@ class plchandler(AbstractHandler):
             if lastval != value:
                 if value > lastval:
                     for x in range(lastval + 1, value + 1):
-                        self.events.append({"tag": tag, "value": x & 1})
+                        self.events.append(Event(self.signal, tag, x & 1))
                 else:
                     dif = self._inputtag_threshold - lastval + value
                     for x in range(lastval + 1, lastval + dif + 1):
-                        self.events.append({"tag": tag, "value": x & 1})
+                        self.events.append(Event(self.signal, tag, x & 1))
 
         self._inputctags[tag] = value
         self._tags[tag] = value & 1
 
     def start(self):
         AbstractHandler.start(self)
-        framer = ModbusFramer(ClientDecoder())
-        pol_list = {}
-        for t in self.config.keys():
-            if t in ["output", "input", "inputc"]:
-                address_list = {}
-                for x in self.config[t]:
-                    address = self.tagslist[x]["address"]
-                    address_list[address] = x
-                pol_list[t] = self._generate_address_map(address_list)
-        factory = SMHSFactory(
-            framer, pol_list, self.logger, self.reader, self.writepool)
-        SerialModbusClient(
-            factory, "/dev/plc",
-            reactor, baudrate=9600,
-            parity=PARITY_EVEN, bytesize=SEVENBITS,
-            stopbits=STOPBITS_TWO, timeout=0)
+        groups = []
+        for t in PRIORITY:
+            # memory tags are written by handler, they are read
+            # only when rate of memory is set
+            if t not in self.config or (
+                    t == "memory" and t not in self.serverconfig):
+                continue
+            # coils and registers of type are read by own groups
+            address_lists = {}
+            for x in self.config[t]:
+                address = self.tagslist[x]["address"]
+                address_lists.setdefault(self.tagkinds[x], {})[address] = x
+            for kind in sorted(address_lists):
+                groups.append(pollgroup(t, kind, self._generate_address_map(
+                    address_lists[kind], t, kind), *self.rates[t]))
+        self.logger.debug("Poll groups - %s" % groups)
+        port = self.serial_port
+        self.factory = SMHSFactory(
+            self.mode, pollscheduler(groups), self.logger, self.reader,
+            self.writepool, self.heartbeat,
+            int(port.get("station_address", 0)))
+        if self.mode == "tcp":
+            reactor.connectTCP(port["host"], int(port.get("tcp_port", 502)),
+                               self.factory)
+        else:
+            SerialModbusClient(
+                self.factory, port.get("name", "/dev/plc"), reactor,
+                baudrate=int(port.get("speed", 9600)),
+                parity=PARITIES[port.get("parity", "E")],
+                bytesize=BYTESIZES[int(port.get("data_length", 7))],
+                stopbits=STOPBITS[int(port.get("stop_bits", 2))],
+                timeout=0)
 
     def stop(self):
+        if self.factory is not None:
+            self.factory.stopTrying()
         AbstractHandler.stop(self)
@@ -0,0 +1,94 @@
+'''
+Poll scheduler of PLC
+
+Tags of one type (inputc, input, output, memory) are one group
+with its own poll interval. Interval is short while values of group
+change and grows while they don't, between min and max of group.
+Group due first is read first, priority decide between groups
+due at the same time. Group with written addresses is due at once.
+'''
+
+# groups by priority, counters of buttons first
+PRIORITY = ("inputc", "input", "output", "memory")
+# default (min, max) poll interval of group, seconds
+RATES = {"inputc": (0, 0.5), "input": (0, 0.5),
+         "output": (0.1, 2), "memory": (1, 10)}
+# interval grow by this while values don't change
+GROW = 1.5
+# first step of growth from 0
+STEP = 0.05
+
+
+class pollgroup(object):
+
+    '''
+    Tags of one type
+
+    reads - tuple of (start, count), see readplanner
+    kind - coils or registers
+    '''
+
+    def __init__(self, name, kind, reads, mininterval=0, maxinterval=0):
+        self.name = name
+        self.kind = kind
+        self.reads = reads
+        self.mininterval = float(mininterval)
+        self.maxinterval = max(float(maxinterval), self.mininterval)
+        self.interval = self.mininterval
+        self.due = 0
+        self.priority = (PRIORITY.index(name) if name in PRIORITY
+                         else len(PRIORITY))
+
+    def done(self, changed, now):
+        '''
+        group was read at now, changed - count of changed values
+        '''
+        if changed:
+            self.interval = self.mininterval
+        else:
+            self.interval = min(self.maxinterval,
+                                max(self.interval * GROW, STEP,
+                                    self.mininterval))
+        self.due = now + self.interval
+
+    def covers(self, kind, start, count):
+        '''
+        True if some of count addresses from start are read by group
+        '''
+        return kind == self.kind and any(
+            a < start + count and start < a + n for a, n in self.reads)
+
+    def __repr__(self):
+        return "<pollgroup %s every %.2fs>" % (self.name, self.interval)
+
+
+class pollscheduler(object):
+
+    '''
+    Choose group to read
+
+    next(now) - (group, 0) of group to read now,
+    or (None, delay) when no group is due
+    written(kind, start, count, now) - groups with written addresses
+    are read back as soon as possible
+    '''
+
+    def __init__(self, groups):
+        self.groups = sorted(groups, key=lambda g: g.priority)
+
+    def next(self, now):
+        if not self.groups:
+            return None, None
+        group = min(self.groups, key=lambda g: (g.due, g.priority))
+        if group.due <= now:
+            return group, 0
+        return None, group.due - now
+
+    def done(self, group, changed, now):
+        group.done(changed, now)
+
+    def written(self, kind, start, count, now):
+        for group in self.groups:
+            if group.covers(kind, start, count):
+                group.interval = group.mininterval
+                group.due = min(group.due, now)
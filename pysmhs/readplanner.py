@@ -0,0 +1,87 @@
+'''
+Modbus read planner
+
+Addresses of tags are joined into reads (start, count).
+Near addresses are read by one request when unused coils or
+registers between them cost less than one more request,
+reads are split at limits of function code.
+'''
+
+# max count of one read by function code (read coils/holding registers)
+LIMITS = {"coils": 2000, "registers": 125}
+# what is read for type of tags in tags config, tag can
+# set its own by kind = coils or registers
+KINDS = {"output": "coils", "input": "coils",
+         "inputc": "registers", "memory": "coils"}
+# bytes of request pdu: function, address, count
+REQUEST_PDU = 5
+
+
+def framesize(pdu, framer="ascii"):
+    '''
+    bytes on wire of frame with pdu bytes
+    ascii - ':' + hex of (slave, pdu, lrc) + CRLF
+    rtu - slave, pdu, crc
+    socket - mbap header and pdu
+    '''
+    if framer == "ascii":
+        return 1 + 2 * (1 + pdu + 1) + 2
+    if framer == "rtu":
+        return 1 + pdu + 2
+    if framer == "socket":
+        return 7 + pdu
+    raise ValueError("unknown framer %s" % framer)
+
+
+def databytes(kind, count):
+    if kind == "coils":
+        return (count + 7) // 8
+    return count * 2
+
+
+def readsize(kind, count, framer="ascii"):
+    '''
+    bytes on wire of one read, request and response
+    '''
+    return (framesize(REQUEST_PDU, framer) +
+            framesize(2 + databytes(kind, count), framer))
+
+
+def plan(addresses, kind, maxgap=None, maxcount=None, framer="ascii"):
+    '''
+    tuple of reads (start, count) to read all addresses
+
+    maxgap - max count of unused addresses read to join two reads,
+    by default they are joined when it is less bytes on wire
+    maxcount - max count of one read, limit of function code at most
+    '''
+    limit = LIMITS[kind]
+    if maxcount:
+        limit = min(limit, int(maxcount))
+    reads = []
+    start = end = None
+    for address in sorted(set(int(a) for a in addresses)):
+        if start is not None and address - start < limit:
+            gap = address - end - 1
+            if maxgap is None:
+                join = (readsize(kind, address - start + 1, framer) <=
+                        readsize(kind, end - start + 1, framer) +
+                        readsize(kind, 1, framer))
+            else:
+                join = gap <= int(maxgap)
+            if join:
+                end = address
+                continue
+        if start is not None:
+            reads.append((start, end - start + 1))
+        start = end = address
+    if start is not None:
+        reads.append((start, end - start + 1))
+    return tuple(reads)
+
+
+def planbytes(reads, kind, framer="ascii"):
+    '''
+    bytes on wire to make all reads once
+    '''
+    return sum(readsize(kind, count, framer) for _, count in reads)
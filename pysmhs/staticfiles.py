@@ -0,0 +1,269 @@
+'''
+Static files
+
+Files of www with precompressed variants cached on disk,
+content hash validators and long cache lifetime for urls
+with the hash (?v=...)
+'''
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import stat as statmode
+import tempfile
+from cStringIO import StringIO
+from twisted.web import http
+from twisted.web.static import File, getTypeAndEncoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = (".html", ".htm", ".js", ".css", ".svg", ".json", ".txt")
+# smaller files don't win from compression
+MINSIZE = 1024
+FOREVER = "public, max-age=31536000"
+REVALIDATE = "no-cache"
+
+ref_re = re.compile(r'''((?:src|href)\s*=\s*["'])([^"'?#:]+)(["'])''')
+
+
+def accepted(header):
+    '''
+    encodings from Accept-Encoding, without q=0 ones
+    '''
+    encodings = set()
+    for item in (header or "").split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            encodings.add(name)
+    return encodings
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data)
+    out = StringIO()
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=9,
+                       mtime=0) as f:
+        f.write(data)
+    return out.getvalue()
+
+
+class asset(object):
+
+    '''
+    One file of www
+
+    digest - hash of content, identity - path of content to send
+    (rewritten html is kept in cache), variants - encoding -> path
+    deps - files that html refer to
+    '''
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.stat = stat
+        self.digest = None
+        self.identity = path
+        self.variants = {}
+        self.deps = []
+
+
+class assetcache(object):
+
+    '''
+    Hashes and compressed variants of files under root
+
+    Variants are named by hash in cachedir and made when content
+    change, files found in cachedir are never trusted.
+    cachedir have to be owned by user and not writable by others,
+    new private temp dir by default
+    prefix - url of root, used in fingerprinted urls
+    '''
+
+    def __init__(self, root, cachedir=None, prefix="/www/"):
+        self.root = os.path.abspath(root)
+        # temp dir is removed by close()
+        self.temporary = cachedir is None
+        if cachedir is None:
+            cachedir = tempfile.mkdtemp(prefix="pysmhs-www-")
+        elif not os.path.isdir(cachedir):
+            os.makedirs(cachedir, 0700)
+        self.cachedir = os.path.abspath(cachedir)
+        self.prefix = prefix
+        self.encodings = ["br", "gzip"] if brotli else ["gzip"]
+        self.assets = {}
+        self.check(self.cachedir)
+
+    def check(self, path):
+        '''
+        raise ValueError if others can put files in dir
+        '''
+        st = os.lstat(path)
+        if (not statmode.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+                st.st_mode & (statmode.S_IWGRP | statmode.S_IWOTH)):
+            raise ValueError("cache dir %s have to be owned by user and "
+                             "not writable by others" % path)
+
+    def close(self):
+        if self.temporary:
+            shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def warm(self):
+        '''
+        hash and compress all files, so first clients don't wait
+        '''
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                self.get(os.path.join(dirpath, name))
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        current = self.assets.get(path)
+        if current is None or not self.fresh(current, stat):
+            current = self.build(path, stat)
+            self.assets[path] = current
+        return current
+
+    def fresh(self, current, stat):
+        if (current.stat.st_mtime, current.stat.st_size) != (
+                stat.st_mtime, stat.st_size):
+            return False
+        for dep, digest in current.deps:
+            try:
+                if self.get(dep).digest != digest:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def build(self, path, stat):
+        current = asset(path, stat)
+        with open(path, "rb") as f:
+            data = f.read()
+        ext = os.path.splitext(path)[1].lower()
+        if ext in (".html", ".htm"):
+            data = self.rewrite(current, data)
+        current.digest = hashlib.sha1(data).hexdigest()[:16]
+        if current.deps:
+            current.identity = self.store(current.digest + ext, data)
+        if ext in COMPRESSIBLE and len(data) >= MINSIZE:
+            for encoding in self.encodings:
+                name = "%s%s.%s" % (current.digest, ext,
+                                    "br" if encoding == "br" else "gz")
+                packed = compress(data, encoding)
+                # not worth to send
+                if len(packed) > len(data) * 0.9:
+                    continue
+                current.variants[encoding] = self.store(name, packed)
+        return current
+
+    def store(self, name, data):
+        '''
+        write file of cache, file that is already there is replaced
+        '''
+        target = os.path.join(self.cachedir, name)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.cachedir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.rename(tmp, target)
+        return target
+
+    def rewrite(self, current, data):
+        '''
+        add ?v=hash to local src and href of html
+        '''
+        base = os.path.dirname(current.path)
+
+        def fingerprint(match):
+            ref = match.group(2)
+            if ref.startswith(self.prefix):
+                target = os.path.join(self.root, ref[len(self.prefix):])
+            elif ref.startswith("/"):
+                return match.group(0)
+            else:
+                target = os.path.join(base, ref)
+            target = os.path.abspath(target)
+            # pages are not fingerprinted, they can refer to each other
+            if (not target.startswith(self.root + os.sep) or
+                    target.lower().endswith((".html", ".htm")) or
+                    not os.path.isfile(target)):
+                return match.group(0)
+            digest = self.get(target).digest
+            current.deps.append((target, digest))
+            return "%s%s?v=%s%s" % (match.group(1), ref, digest,
+                                    match.group(3))
+        return ref_re.sub(fingerprint, data)
+
+    def url(self, path):
+        '''
+        fingerprinted url of file, path is relative to root
+        '''
+        try:
+            digest = self.get(os.path.join(self.root, path)).digest
+        except OSError:
+            return self.prefix + path
+        return "%s%s?v=%s" % (self.prefix, path, digest)
+
+
+class staticfiles(File):
+
+    '''
+    File resource that send compressed variant if client accept it,
+    with ETag of content hash. Url with ?v=hash is cached by client
+    for a year, other urls are revalidated every time.
+    Range requests are served by File from the chosen variant.
+    '''
+
+    cache = None
+
+    def createSimilarFile(self, path):
+        f = File.createSimilarFile(self, path)
+        f.cache = self.cache
+        return f
+
+    def render_GET(self, request):
+        self.restat(False)
+        if self.cache is None or not self.isfile():
+            return File.render_GET(self, request)
+        try:
+            current = self.cache.get(self.path)
+        except (IOError, OSError):
+            return File.render_GET(self, request)
+        encoding = None
+        if current.variants:
+            request.setHeader("Vary", "Accept-Encoding")
+            encodings = accepted(request.getHeader("Accept-Encoding"))
+            for name in self.cache.encodings:
+                if name in encodings and name in current.variants:
+                    encoding = name
+                    break
+        if request.args.get("v", [None])[0] == current.digest:
+            request.setHeader("Cache-Control", FOREVER)
+        else:
+            request.setHeader("Cache-Control", REVALIDATE)
+        etag = current.digest + ("-" + encoding if encoding else "")
+        if request.setETag('"%s"' % etag) == http.CACHED:
+            return ""
+        path = current.variants[encoding] if encoding else current.identity
+        if path == self.path:
+            return File.render_GET(self, request)
+        variant = File(path, self.defaultType)
+        variant.type = getTypeAndEncoding(
+            self.basename(), self.contentTypes, self.contentEncodings,
+            self.defaultType)[0]
+        variant.encoding = encoding
+        return variant.render_GET(request)
@@ -0,0 +1,162 @@
+'''
+SVG binding index
+
+Bindings of home.svg are json in inkscape:label of elements.
+They are parsed once on server into index of
+tag -> elements and actions, so client don't walk svg
+and touch only elements of changed tags.
+'''
+import json
+import re
+import xml.etree.ElementTree as ET
+
+
+INKSCAPE_LABEL = "{http://www.inkscape.org/namespaces/inkscape}label"
+SVG_G = "{http://www.w3.org/2000/svg}g"
+
+mapref_re = re.compile(r"'(%\w+)'")
+
+
+def parse_label(label):
+    '''
+    list of bindings of label, [] if label is not json
+    '''
+    if not label or not label.lstrip().startswith("{"):
+        return []
+    try:
+        bindings = json.loads("[" + label + "]")
+    except ValueError:
+        return []
+    return [b for b in bindings if isinstance(b, dict)]
+
+
+def mapvalue(mapping, name):
+    '''
+    %NAME is taken from clone map, other names are as is
+    '''
+    if name and name.startswith("%"):
+        return mapping.get(name[1:])
+    return name
+
+
+class builder(object):
+
+    '''
+    Walk svg like smhs.js did: only elements with label,
+    into groups with label, clone map is shared by all
+    elements after the clone
+    '''
+
+    def __init__(self):
+        self.mapping = {}
+        self.bindings = []
+        self.events = []
+        self.tags = {}
+        self.skipped = 0
+
+    def walk(self, parent):
+        for element in parent:
+            label = element.get(INKSCAPE_LABEL)
+            if not label:
+                continue
+            for binding in parse_label(label):
+                self.add(element, binding)
+            if element.tag == SVG_G:
+                self.walk(element)
+
+    def bind(self, element, tag, binding):
+        if tag is None or not element.get("id"):
+            self.skipped += 1
+            return
+        binding["id"] = element.get("id")
+        binding["tag"] = tag
+        self.tags.setdefault(tag, []).append(len(self.bindings))
+        self.bindings.append(binding)
+
+    def event(self, element, evt, code):
+        if not element.get("id"):
+            self.skipped += 1
+            return
+        self.events.append({"id": element.get("id"), "evt": evt,
+                            "code": code})
+
+    def add(self, element, binding):
+        attr = binding.get("attr")
+        if attr == "color":
+            rules = {}
+            for rule in binding.get("list", []):
+                tag = mapvalue(self.mapping, rule.get("tag"))
+                rules.setdefault(tag, []).append(
+                    [str(rule.get("data")), rule.get("param")])
+            for tag, colors in sorted(rules.items()):
+                self.bind(element, tag, {"attr": "color", "rules": colors})
+        elif attr == "clone":
+            for item in binding.get("map", []):
+                name, _, value = item.partition("=")
+                self.mapping[name.lstrip("%")] = value
+        elif attr == "script":
+            for item in binding.get("list", []):
+                code = mapref_re.sub(
+                    lambda m: "'%s'" % mapvalue(self.mapping, m.group(1)),
+                    item.get("param", ""))
+                self.event(element, item.get("evt", "click"), code)
+        elif attr == "get":
+            # text is in the first tspan
+            target = element[0] if len(element) else element
+            self.bind(target if target.get("id") else element,
+                      mapvalue(self.mapping, binding.get("tag")),
+                      {"attr": "get"})
+        elif attr == "set":
+            if binding.get("type") == "Variable":
+                value = "top.getTag('%s')" % binding.get("src")
+            else:
+                value = "'%s'" % binding.get("src")
+            self.event(element, "click", "top.setTag('%s',%s)" % (
+                binding.get("tag"), value))
+        elif attr == "bar":
+            try:
+                height = float(element.get("height"))
+            except (TypeError, ValueError):
+                height = 0
+            self.bind(element, mapvalue(self.mapping, binding.get("tag")),
+                      {"attr": "bar", "min": float(binding.get("min", 0)),
+                       "max": float(binding.get("max", 100)),
+                       "height": height})
+
+
+def build(path):
+    '''
+    index of svg file
+    {"tags": {tag: [binding numbers]},
+     "bindings": [{"id", "tag", "attr": "color", "rules": [[data, fill]]},
+                  {"id", "tag", "attr": "get"},
+                  {"id", "tag", "attr": "bar", "min", "max", "height"}],
+     "events": [{"id", "evt", "code"}]}
+    '''
+    b = builder()
+    b.walk(ET.parse(path).getroot())
+    return {"tags": b.tags, "bindings": b.bindings, "events": b.events,
+            "skipped": b.skipped}
+
+
+class svgindex(object):
+
+    '''
+    Json of index, made again only when content of svg change
+    '''
+
+    def __init__(self, assets, path):
+        self.assets = assets
+        self.path = path
+        self.cache = (None, None)
+
+    def get(self):
+        '''
+        return (digest of svg, json of index)
+        '''
+        digest = self.assets.get(self.path).digest
+        if self.cache[0] != digest:
+            index = build(self.path)
+            index["svg"] = digest
+            self.cache = (digest, json.dumps(index, sort_keys=True))
+        return self.cache
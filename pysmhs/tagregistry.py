@@ -0,0 +1,109 @@
+'''
+Tag registry
+
+Central registry of all qualified tags (like plchandler_van4).
+Every tag is interned to integer id, that point directly
+to the tags of owning handler
+'''
+import threading
+
+
+class TagRegistry(object):
+
+    '''
+    Registry of qualified tags
+
+    id(name) - integer id of tag, parse name only once
+    get(id) - value of tag, from tags of handler
+    set(id, value) - set tag through handler
+    '''
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._slots = []
+        self._handlers = {}
+        self._prefixes = []
+        self._lock = threading.Lock()
+
+    def addhandler(self, name, handler, setter=None):
+        '''
+        add handler and all its known tags
+        setter(tag, value) is used to set tags, handler._settag
+        by default
+        '''
+        with self._lock:
+            self._handlers[name] = (handler, setter or handler._settag)
+            # longest first, so handler names with _ are found right
+            self._prefixes = sorted(
+                ((n + "_", n) for n in self._handlers),
+                key=lambda p: len(p[0]), reverse=True)
+        for tag in list(handler._tags):
+            self.register(name, tag)
+
+    def register(self, handlername, tag):
+        '''
+        intern tag of handler, return its id
+        '''
+        name = "%s_%s" % (handlername, tag)
+        with self._lock:
+            if name in self._ids:
+                return self._ids[name]
+            handler, setter = self._handlers[handlername]
+            tagid = len(self._names)
+            self._names.append(name)
+            self._slots.append((handler._tags, tag, setter, handler))
+            self._ids[name] = tagid
+            return tagid
+
+    def id(self, name):
+        '''
+        return id of qualified tag name
+        raise KeyError if there is no such handler,
+        or handler has no such tag
+        '''
+        try:
+            return self._ids[name]
+        except KeyError:
+            handlername, tag = self.split(name)
+            if self._handlers[handlername][0].hastag(tag):
+                return self.register(handlername, tag)
+            raise KeyError(name)
+
+    def split(self, name):
+        '''
+        return (handler name, tag) of qualified tag name,
+        by the longest name of known handler
+        raise KeyError if there is no such handler
+        '''
+        for prefix, handlername in self._prefixes:
+            if name.startswith(prefix):
+                return handlername, name[len(prefix):]
+        raise KeyError(name)
+
+    def name(self, tagid):
+        return self._names[tagid]
+
+    def get(self, tagid):
+        tags, tag, _, _ = self._slots[tagid]
+        return tags[tag]
+
+    def set(self, tagid, value):
+        _, tag, setter, _ = self._slots[tagid]
+        setter(tag, value)
+
+    def owner(self, tagid):
+        '''
+        return (handler, tag) of tag id
+        '''
+        _, tag, _, handler = self._slots[tagid]
+        return handler, tag
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    def names(self):
+        return list(self._names)
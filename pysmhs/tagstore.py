@@ -0,0 +1,178 @@
+'''
+Tag store
+
+Aggregated view of tags of all running handlers,
+updated only with changed tags, every change has version
+'''
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def text(value):
+    '''
+    value of tag as unicode, byte strings are utf-8
+    '''
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    return unicode(value)
+
+
+class TagDict(dict):
+
+    '''
+    Tags of handler, that report every change to the store
+    '''
+
+    def __init__(self, handlername):
+        dict.__init__(self)
+        self.prefix = handlername + "_"
+        self.store = None
+
+    def __setitem__(self, tag, value):
+        store = self.store
+        if store is not None and (tag not in self or self[tag] != value):
+            dict.__setitem__(self, tag, value)
+            store.update(self.prefix + tag, value)
+        else:
+            dict.__setitem__(self, tag, value)
+
+
+class TagSnapshot(dict):
+
+    '''
+    Read only dict of all tags with version of the store,
+    layout - version of the set of tag names
+    '''
+
+    def __init__(self, tags, version, layout=0):
+        dict.__init__(self, tags)
+        self.version = version
+        self.layout = layout
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("TagSnapshot is read only")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+
+class TagStore(object):
+
+    '''
+    Store of qualified tags of all handlers
+
+    Handlers tags (TagDict) are attached to the store,
+    and update it on every change.
+    snapshot() return the same TagSnapshot until something change
+    changes(since) return only tags changed after version since
+    transaction() - all updates in block get one version, readers
+    see all of them or none
+    '''
+
+    def __init__(self):
+        self._tags = {}
+        # tag name -> version of last change, the oldest first
+        self._changed = OrderedDict()
+        self.version = 0
+        # changed only when tags are added or removed
+        self.layout = 0
+        # changes before this version can't be given as delta
+        self.floor = 0
+        self._snapshot = TagSnapshot({}, 0)
+        self._lock = threading.RLock()
+        # depth of transactions and if version was already changed
+        self._depth = 0
+        self._bumped = False
+
+    def _bump(self):
+        if not self._bumped:
+            self.version += 1
+            self._bumped = self._depth > 0
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._bumped = False
+
+    def _touch(self, name):
+        self._changed.pop(name, None)
+        self._changed[name] = self.version
+
+    def attach(self, tags):
+        '''
+        add all tags of handler and follow its changes
+        '''
+        with self._lock:
+            self._bump()
+            self.layout += 1
+            for tag, value in dict.items(tags):
+                self._tags[tags.prefix + tag] = value
+                self._touch(tags.prefix + tag)
+            tags.store = self
+
+    def detach(self, tags):
+        '''
+        remove tags of stopped handler
+        '''
+        with self._lock:
+            tags.store = None
+            for tag in dict.keys(tags):
+                self._tags.pop(tags.prefix + tag, None)
+                self._changed.pop(tags.prefix + tag, None)
+            self._bump()
+            self.layout += 1
+            # deleted tags are not in changes, send full snapshot
+            self.floor = self.version
+
+    def update(self, name, value):
+        with self._lock:
+            if name not in self._tags:
+                self.layout += 1
+            self._tags[name] = value
+            self._bump()
+            self._touch(name)
+
+    def tagversion(self, name):
+        '''
+        version of the last change of tag
+        '''
+        return self._changed[name]
+
+    def changes(self, since):
+        '''
+        return (version, full, tags)
+        tags - dict of tags changed after version since,
+        or all tags with full=True, when client is too far behind
+        '''
+        with self._lock:
+            if since <= 0 or since < self.floor or since > self.version:
+                return self.version, True, dict(self._tags)
+            limit = max(len(self._tags) // 2, 64)
+            tags = {}
+            for name in reversed(self._changed):
+                if self._changed[name] <= since:
+                    break
+                if len(tags) >= limit:
+                    return self.version, True, dict(self._tags)
+                tags[name] = self._tags[name]
+            return self.version, False, tags
+
+    def snapshot(self):
+        '''
+        return read only dict of all tags
+        '''
+        with self._lock:
+            if self._depth:
+                # version is not final inside transaction
+                return TagSnapshot(self._tags, self.version, self.layout)
+            if self._snapshot.version != self.version:
+                self._snapshot = TagSnapshot(self._tags, self.version,
+                                             self.layout)
+            return self._snapshot
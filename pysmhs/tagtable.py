@@ -0,0 +1,97 @@
+'''
+Tag list page
+
+Table of all tags grouped by handler. Template is rendered
+only when tags are added or removed, on every request only
+values are put into the rendered table.
+'''
+from cgi import escape
+from tagstore import text
+
+
+SLOT = u"\x00"
+SWITCH = '<div class="switch"><input id="%s" type="checkbox"%s></div>'
+
+
+def cell(tagid, value):
+    '''
+    html of value of tag, 0 and 1 are shown as switch,
+    tagid - escaped name of tag
+    '''
+    if value == "1":
+        return SWITCH % (tagid, ' checked="checked"')
+    if value == "0":
+        return SWITCH % (tagid, "")
+    return escape(value)
+
+
+def group(names, split=None):
+    '''
+    sorted list of (handler, [(tag, name)])
+    split(name) - (handler, tag) of name, see TagRegistry.split,
+    name is split at the first _ when there is no split
+    or it doesn't know the name
+    '''
+    rows = []
+    for name in names:
+        handler = None
+        if split is not None:
+            try:
+                handler, tag = split(name)
+            except KeyError:
+                pass
+        if handler is None:
+            handler, _, tag = name.partition("_")
+        rows.append((handler, tag, name))
+    grouped = []
+    for handler, tag, name in sorted(rows):
+        if not grouped or grouped[-1][0] != handler:
+            grouped.append((handler, []))
+        grouped[-1][1].append((tag, name))
+    return grouped
+
+
+class tagtable(object):
+
+    '''
+    Cached tag list
+
+    render(tags) - html of TagSnapshot, the skeleton is kept
+    for layout of snapshot, the page for its version
+    registry - TagRegistry, to group tags by their handlers
+    '''
+
+    def __init__(self, template, registry=None, **context):
+        self.template = template
+        self.registry = registry
+        self.context = context
+        self.layout = None
+        self.names = []
+        self.ids = []
+        self.parts = []
+        self.page = (None, None)
+
+    def build(self, tags):
+        split = self.registry.split if self.registry is not None else None
+        grouped = group(tags, split)
+        html = self.template.render(tags=grouped, slot=SLOT, **self.context)
+        self.names = [name for _, rows in grouped for _, name in rows]
+        self.ids = [escape(name, True) for name in self.names]
+        self.parts = [part.encode("utf-8") for part in html.split(SLOT)]
+        assert len(self.parts) == len(self.names) + 1, \
+            "template have to show slot once for every tag"
+        self.layout = tags.layout
+
+    def render(self, tags):
+        if self.page[0] == tags.version:
+            return self.page[1]
+        if self.layout != tags.layout:
+            self.build(tags)
+        parts, ids = self.parts, self.ids
+        out = [parts[0]]
+        for i, name in enumerate(self.names):
+            out.append(cell(ids[i], text(tags[name])).encode("utf-8"))
+            out.append(parts[i + 1])
+        body = "".join(out)
+        self.page = (tags.version, body)
+        return body
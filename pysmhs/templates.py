@@ -0,0 +1,20 @@
+'''
+Jinja templates of web resources
+
+One environment for all resources, so templates are compiled once.
+asset(path) give url of file of www, webhandler replace it
+with fingerprinted urls
+'''
+import os
+from jinja2 import Environment, FileSystemLoader
+
+
+# by path of module, so it's found as www and as pysmhs.www
+env = Environment(loader=FileSystemLoader(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'www',
+                 'templates')))
+env.globals["asset"] = lambda path: "/www/" + path
+
+
+def get_template(name):
+    return env.get_template(name)
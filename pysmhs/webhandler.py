@@ -2,61 +2,106 @@
 '''
 Web server handler
 '''
-from abstracthandler import AbstractHandler
-from twisted.web import server, resource
+from abstracthandler import AbstractHandler, REACTOR
+from twisted.web import server, resource, http
 from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.python import threadable
 from twisted.web.resource import Resource
-from twisted.web.static import File
-import cgi
-import threading
-from jinja2 import Environment, PackageLoader
-from collections import OrderedDict
-from itertools import islice
-from uuid import uuid4
+import json
+import os
+import time
+from eventring import EventRing
+from monitor import monitor
+from staticfiles import assetcache, staticfiles
+from svgindex import svgindex
+from tagstore import text
+from tagtable import tagtable
+from templates import env, get_template
+from webpush import eventstream
+from websocket import checktags, websocket
+
+# versions of the store start from 0 in every process,
+# etags of old process must not match
+ETAG_NONCE = "%x" % int(time.time() * 1000)
 
 
 class webhandler(AbstractHandler):
 
     '''Web server handler'''
 
+    dispatch = REACTOR
+
     port = None
-    lock = threading.Lock()
+    heartbeat = None
+    pusher = None
 
     def __init__(self, parent=None, params={}):
-        self.cachemax = 255
-        self.eventcache = OrderedDict()
+        self.eventcache = EventRing(int(params.get("eventcache", 255)))
         self.params = params
         AbstractHandler.__init__(self, parent, params)
         self.logger.info("Init web handler")
-        resource = File(params["wwwPath"])
+        self.assets = assetcache(params["wwwPath"],
+                                 cachedir=params.get("cachePath"))
+        # handler can be started again, cache is removed on exit
+        reactor.addSystemEventTrigger("after", "shutdown", self.assets.close)
+        env.globals["asset"] = self.assets.url
+        resource = staticfiles(params["wwwPath"])
+        resource.cache = self.assets
         root = Resource()
         root.putChild("www", resource)
-        root.putChild("get", smhs_web(parent))
-        #root.putChild("mon", monitor(self.eventcache))
+        self.svgindex = svgindex(self.assets, os.path.join(
+            params["wwwPath"], params.get("svgFile", "home.svg")))
+        root.putChild("get", smhs_web(parent, self.svgindex))
+        root.putChild("mon", monitor(self.eventcache, logger=self.logger))
+        self.stream = eventstream(
+            polltimeout=float(params.get("polltimeout", 25)),
+            heartbeat=float(params.get("heartbeat", 15)))
+        root.putChild("events", self.stream)
+        root.putChild("ws", websocket(parent, self.stream,
+                                      logger=self.logger))
         self.site = server.Site(root)
 
     def loadtags(self):
         pass
 
     def process(self, signal, events):
-        with self.lock:
-            for event in events:
-                if len(self.eventcache) == self.cachemax:
-                    self.eventcache.popitem(last=False)
-                self.addevent(event)
+        # ring and clients are written only from the reactor
+        if threadable.isInIOThread():
+            self.addevents(events)
+        else:
+            reactor.callFromThread(self.addevents, events)
 
-    def addevent(self, event):
-        token = uuid4().bytes.encode("base64")
-        self.eventcache[token] = event
+    def addevents(self, events):
+        self.eventcache.extend(events)
+        self.stream.update()
 
     def start(self):
         AbstractHandler.start(self)
+        self.assets.warm()
+        try:
+            self.svgindex.get()
+        except (IOError, OSError, SyntaxError):
+            self.logger.error("Can't index svg %s" % self.svgindex.path,
+                              exc_info=1)
+        self.stream.store = self.store
         self.port = reactor.listenTCP(int(self.params["port"]), self.site)
+        self.heartbeat = LoopingCall(self.stream.heartbeat)
+        self.heartbeat.start(1, now=False)
+        # tags can be changed without event (date, first read of PLC),
+        # store is checked for them too
+        self.pusher = LoopingCall(self.stream.update)
+        self.pusher.start(float(self.params.get("pushinterval", 0.2)),
+                          now=False)
 
     def stop(self):
         AbstractHandler.stop(self)
         if self.port:
             self.port.stopListening()
+        if self.heartbeat and self.heartbeat.running:
+            self.heartbeat.stop()
+        if self.pusher and self.pusher.running:
+            self.pusher.stop()
 
 
 class smhs_web(resource.Resource):
@@ -65,42 +110,81 @@ class smhs_web(resource.Resource):
     actionStopServer = "stopServer"
     action_list_tags = "listTags"
     action_set_tag = "setTag"
+    action_get_stats = "getStats"
+    action_get_svg_index = "getSvgIndex"
 
-    def __init__(self, parent):
-        env = Environment(loader=PackageLoader('www', 'templates'))
-        self.listtags_template = env.get_template('listtags_template.html')
+    def __init__(self, parent, svgindex=None):
+        self.listtags = tagtable(get_template('listtags_template.html'),
+                                 registry=getattr(parent, "registry", None),
+                                 title=u'Tag list', description='here')
         self.parent = parent
+        self.svgindex = svgindex
+        # (version, body) of the last full json
+        self.jsoncache = (None, None)
         resource.Resource.__init__(self)
 
+    def get_json(self, request):
+        '''
+        json with all tags or with tags changed since version
+        {"version": 10, "full": true, "tags": {"plchandler_van4": "1"}}
+        '''
+        request.setHeader("Content-Type", "application/json")
+        request.setHeader("Cache-Control", "no-cache")
+        try:
+            since = int(request.args["since"][0])
+        except (KeyError, ValueError):
+            since = 0
+        if since:
+            version, full, tags = self.parent.changes(since)
+            etag = '"%s-%d-%d"' % (ETAG_NONCE, since, version)
+        else:
+            tags = self.parent.tags
+            version, full = tags.version, True
+            etag = '"%s-%d"' % (ETAG_NONCE, version)
+        if request.setETag(etag) == http.CACHED:
+            return ""
+        if full and self.jsoncache[0] == version:
+            return self.jsoncache[1]
+        body = json.dumps({"version": version, "full": full,
+                           "tags": dict((name, text(value))
+                                        for name, value in tags.items())})
+        if full:
+            self.jsoncache = (version, body)
+        return body
+
+    def get_svg_index(self, request):
+        '''
+        bindings of svg, see svgindex.build
+        '''
+        request.setHeader("Content-Type", "application/json")
+        request.setHeader("Cache-Control", "no-cache")
+        digest, body = self.svgindex.get()
+        if request.setETag('"%s"' % digest) == http.CACHED:
+            return ""
+        return body
+
     def render_GET(self, request):
         if ("action" in request.args):
             if (request.args["action"][0] == self.action_get_json):
-                html = "{ \"tags\":{"
-                coils = self.parent.tags
-                for x in coils:
-                    html += "\"" + x + "\":\"" + str(coils[x]) + "\","
-                html += "} }"
-                return html
+                return self.get_json(request)
             elif (request.args["action"][0] == self.action_list_tags):
-                tags = self.parent.tags
-                od = {}
-                last_handler = ""
-                for tag in sorted(tags):
-                    current_handler = tag.split('_')[0]
-                    if current_handler != last_handler:
-                        last_handler = current_handler
-                    tag_name = tag.split('_')[1]
-                    od.setdefault(last_handler, {})[tag_name] = str(tags[tag])
-                return str(self.listtags_template.render(title=u'Tag list',
-                                                         description='here',
-                                                         tags=od))
+                return self.listtags.render(self.parent.tags)
+            elif (request.args["action"][0] == self.action_get_svg_index):
+                return self.get_svg_index(request)
+            elif (request.args["action"][0] == self.action_get_stats):
+                request.setHeader("Content-Type", "application/json")
+                return json.dumps(self.parent.stats)
             elif (request.args["action"][0] == self.action_set_tag):
                 l = request.args
                 del l['action']
+                results = self.parent.settags(
+                    dict((tag, int(l[tag][0])) for tag in l))
                 html = ''
                 for tag in l:
-                    self.parent.settag(tag, int(l[tag][0]))
-                    html += "setting %s to %s" % (tag, l[tag][0])
+                    if results[tag] == "ok":
+                        html += "setting %s to %s" % (tag, l[tag][0])
+                    else:
+                        html += "can't set %s: %s" % (tag, results[tag])
                 return html
             else:
                 if (request.args["action"][0] == self.actionStopServer):
@@ -109,21 +193,24 @@ class smhs_web(resource.Resource):
         return "unknown url"
 
     def render_POST(self, request):
-        for x in request.args:
-            if (cgi.escape(request.args[x][0]) == "1"):
-                self.parent.settag(x, 1)
-            else:
-                self.parent.settag(x, 0)
-
-class monitor(resource.Resource):
-    isLeaf = True
-
-    def __init__(self, eventcache):
-        env = Environment(loader=PackageLoader('www', 'templates'))
-        self.eventcache = eventcache
-        self.monitor_template = env.get_template('monitor_template.html')
-        resource.Resource.__init__(self)
-
-    def render_GET(self, request):
-        return str(self.monitor_template.render(
-            title=u'Monitor', description='here', events=self.eventcache))
+        '''
+        set many tags in one batch
+        json body {"tags": {"plchandler_van4": 1, "plchandler_zal": 0}}
+        or form fields, where 1 is 1 and anything else is 0
+        answer {"ok": true, "results": {"plchandler_van4": "ok", ...}}
+        '''
+        request.setHeader("Content-Type", "application/json")
+        if (request.getHeader("Content-Type") or "").startswith(
+                "application/json"):
+            try:
+                tags = json.loads(request.content.read())["tags"]
+                checktags(tags)
+            except (ValueError, KeyError, TypeError) as e:
+                request.setResponseCode(400)
+                return json.dumps({"ok": False, "error": str(e)})
+        else:
+            tags = dict((x, 1 if request.args[x][0] == "1" else 0)
+                        for x in request.args)
+        results = self.parent.settags(tags)
+        return json.dumps({"ok": all(r == "ok" for r in results.values()),
+                           "results": results})
@@ -0,0 +1,221 @@
+'''
+Push of tag changes to web clients
+
+Server-Sent Events (text/event-stream) and long-poll
+over the same list of clients. Clients get changes of the tag store
+since the version they have, so every change of the store reach them,
+with event or without.
+'''
+import json
+import time
+from twisted.internet.interfaces import IPushProducer
+from twisted.web import resource, server
+from zope.interface import implementer
+from tagstore import text
+
+
+def changes_json(version, full, tags):
+    '''
+    changes as json, the same as getJson
+    '''
+    return json.dumps({"version": version, "full": full,
+                       "tags": dict((name, text(value))
+                                    for name, value in tags.items())})
+
+
+@implementer(IPushProducer)
+class pushclient(object):
+
+    '''
+    Client of push channel
+
+    cursor - version of the store client have got
+    push(changes) - send changes after cursor, see eventstream.changes
+    nothing is buffered, client that can't be written just stay
+    at its version and get all changes since it when resumed
+    '''
+
+    def __init__(self, stream, request, cursor):
+        self.stream = stream
+        self.request = request
+        self.cursor = cursor
+        self.paused = False
+        self.finished = False
+
+    def push(self, changes):
+        if self.paused or self.finished:
+            return
+        version, full, tags, body = changes(self.cursor)
+        if version == self.cursor and not full:
+            return
+        self.cursor = version
+        self.send(full, tags, body)
+
+    def send(self, full, tags, body):
+        pass
+
+    def heartbeat(self, now):
+        pass
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        self.push(self.stream.changes())
+
+    def stopProducing(self):
+        self.paused = True
+        self.finished = True
+
+
+class sseclient(pushclient):
+
+    '''
+    Client of text/event-stream, id of event is version of the store
+    '''
+
+    def __init__(self, stream, request, cursor, heartbeat):
+        pushclient.__init__(self, stream, request, cursor)
+        self.interval = heartbeat
+        self.lastwrite = time.time()
+
+    def write(self, data):
+        self.lastwrite = time.time()
+        self.request.write(data)
+
+    def start(self):
+        self.request.setHeader("Content-Type", "text/event-stream")
+        self.request.setHeader("Cache-Control", "no-cache")
+        self.request.registerProducer(self, True)
+        self.write("retry: 3000\n\n")
+
+    def send(self, full, tags, body):
+        self.write("id: %d\nevent: tags\ndata: %s\n\n" % (self.cursor, body))
+
+    def heartbeat(self, now):
+        if (not self.paused and not self.finished and
+                now - self.lastwrite >= self.interval):
+            self.write(":\n\n")
+
+
+class pollclient(pushclient):
+
+    '''
+    Client of long-poll, request is answered with first changes
+    or when timeout expire
+    '''
+
+    def __init__(self, stream, request, cursor, timeout):
+        pushclient.__init__(self, stream, request, cursor)
+        self.deadline = time.time() + timeout
+
+    def start(self):
+        self.request.setHeader("Content-Type", "application/json")
+        self.request.setHeader("Cache-Control", "no-cache")
+
+    def send(self, full, tags, body):
+        self.finish(body)
+
+    def heartbeat(self, now):
+        if now >= self.deadline:
+            self.finish(changes_json(self.cursor, False, {}))
+
+    def finish(self, body):
+        if self.finished:
+            return
+        self.finished = True
+        self.request.write(body)
+        self.request.finish()
+
+
+class eventstream(resource.Resource):
+
+    '''
+    Push channel resource
+
+    /events - Server-Sent Events, resume with Last-Event-ID,
+        all tags first without it
+    /events?mode=poll&after=N - long-poll, changes after version N,
+        all tags for 0
+    store - TagStore, update() have to be called when it can
+    be changed, heartbeat() every second, it send heartbeat to idle
+    event-stream and answer expired long-polls
+    '''
+
+    isLeaf = True
+
+    def __init__(self, store=None, polltimeout=25, heartbeat=15):
+        resource.Resource.__init__(self)
+        self.store = store
+        self.polltimeout = polltimeout
+        self.heartbeatinterval = heartbeat
+        self.clients = set()
+        self.version = None
+
+    def update(self):
+        '''
+        send changes of the store to clients that are behind
+        '''
+        if self.store is None:
+            return
+        version = self.store.version
+        if version == self.version:
+            return
+        self.version = version
+        self.pushall(self.changes())
+
+    def changes(self):
+        '''
+        return changes(since) - (version, full, tags, json) of changes
+        of the store, made once for clients with the same version
+        '''
+        cache = {}
+
+        def changes(since):
+            if self.store is None:
+                return since, False, {}, None
+            if since not in cache:
+                version, full, tags = self.store.changes(since)
+                cache[since] = (version, full, tags,
+                                changes_json(version, full, tags))
+            return cache[since]
+        return changes
+
+    def pushall(self, changes):
+        for client in list(self.clients):
+            client.push(changes)
+            if client.finished:
+                self.clients.discard(client)
+
+    def heartbeat(self):
+        now = time.time()
+        for client in list(self.clients):
+            client.heartbeat(now)
+            if client.finished:
+                self.clients.discard(client)
+
+    def render_GET(self, request):
+        after = request.getHeader("Last-Event-ID")
+        if after is None and "after" in request.args:
+            after = request.args["after"][0]
+        try:
+            cursor = int(after)
+        except (TypeError, ValueError):
+            cursor = 0
+        if request.args.get("mode", ["sse"])[0] == "poll":
+            client = pollclient(self, request, cursor, self.polltimeout)
+        else:
+            client = sseclient(self, request, cursor,
+                               self.heartbeatinterval)
+        client.start()
+        client.push(self.changes())
+        if client.finished:
+            return server.NOT_DONE_YET
+        self.clients.add(client)
+        request.notifyFinish().addBoth(self._finished, client)
+        return server.NOT_DONE_YET
+
+    def _finished(self, _, client):
+        client.finished = True
+        self.clients.discard(client)
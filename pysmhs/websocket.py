@@ -0,0 +1,301 @@
+'''
+WebSocket endpoint
+
+Minimal RFC 6455 server on the twisted.web site,
+one connection carry subscriptions, tag sets and acks
+'''
+import base64
+import hashlib
+import json
+import struct
+from fnmatch import fnmatchcase
+from twisted.internet.protocol import Protocol
+from twisted.web import resource, server
+from tagstore import text
+from webpush import pushclient
+
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+
+def checktags(tags):
+    '''
+    raise TypeError if tags is not object of tag values,
+    the same check for websocket and POST of /get
+    '''
+    if not isinstance(tags, dict) or not all(
+            isinstance(v, (int, long, float, basestring))
+            for v in tags.values()):
+        raise TypeError("tags have to be object of values")
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1(key + GUID).digest())
+
+
+def encode_frame(opcode, payload, mask=None):
+    '''
+    encode one final frame, mask is used by clients
+    '''
+    header = chr(0x80 | opcode)
+    maskbit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header += chr(maskbit | length)
+    elif length < 0x10000:
+        header += chr(maskbit | 126) + struct.pack("!H", length)
+    else:
+        header += chr(maskbit | 127) + struct.pack("!Q", length)
+    if mask:
+        header += mask
+        payload = apply_mask(payload, mask)
+    return header + payload
+
+
+def apply_mask(data, mask):
+    mask = [ord(c) for c in mask]
+    return "".join(chr(ord(c) ^ mask[i & 3]) for i, c in enumerate(data))
+
+
+class FrameParser(object):
+
+    '''
+    Incremental parser of websocket frames,
+    feed() return list of (opcode, payload) of complete messages
+    masked - frames without mask are error, every frame from client
+    have to be masked
+    '''
+
+    def __init__(self, maxsize=1 << 20, masked=True):
+        self.maxsize = maxsize
+        self.masked = masked
+        self.buffer = ""
+        self.fragments = []
+        self.fragmentop = None
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while True:
+            frame = self._frame()
+            if frame is None:
+                return messages
+            fin, opcode, payload = frame
+            if opcode >= OP_CLOSE:
+                messages.append((opcode, payload))
+            elif opcode == OP_CONTINUATION:
+                if self.fragmentop is None:
+                    raise ValueError("continuation without start")
+                self.fragments.append(payload)
+            else:
+                if self.fragmentop is not None:
+                    raise ValueError("new message inside fragmented one")
+                self.fragmentop = opcode
+                self.fragments = [payload]
+            if opcode < OP_CLOSE and fin:
+                messages.append((self.fragmentop, "".join(self.fragments)))
+                self.fragmentop = None
+                self.fragments = []
+            if sum(len(f) for f in self.fragments) > self.maxsize:
+                raise OverflowError("message too big")
+
+    def _frame(self):
+        buf = self.buffer
+        if len(buf) < 2:
+            return None
+        b1, b2 = ord(buf[0]), ord(buf[1])
+        length = b2 & 0x7F
+        pos = 2
+        if length == 126:
+            if len(buf) < 4:
+                return None
+            length = struct.unpack("!H", buf[2:4])[0]
+            pos = 4
+        elif length == 127:
+            if len(buf) < 10:
+                return None
+            length = struct.unpack("!Q", buf[2:10])[0]
+            pos = 10
+        if length > self.maxsize:
+            raise OverflowError("frame too big")
+        mask = None
+        if self.masked and not b2 & 0x80:
+            raise ValueError("frame is not masked")
+        if b2 & 0x80:
+            if len(buf) < pos + 4:
+                return None
+            mask = buf[pos:pos + 4]
+            pos += 4
+        if len(buf) < pos + length:
+            return None
+        payload = buf[pos:pos + length]
+        self.buffer = buf[pos + length:]
+        if mask:
+            payload = apply_mask(payload, mask)
+        return bool(b1 & 0x80), b1 & 0x0F, payload
+
+
+class wsclient(Protocol, pushclient):
+
+    '''
+    WebSocket connection of wall panel
+
+    messages from client (json):
+    {"op": "subscribe", "tags": ["plchandler_*"]} - get current values
+        and then changes of these tags, no tags for all
+    {"op": "get", "id": 1, "tags": ["plchandler_van4"]}
+    {"op": "set", "id": 2, "tags": {"plchandler_van4": 1}}
+    answers: {"op": "ack", "id": 2},
+    {"op": "tags", "version": 10, "full": false, "tags": {...}} - changes
+    of the store, all tags when full
+    '''
+
+    def __init__(self, parent, stream, logger=None):
+        # nothing is pushed before subscribe
+        pushclient.__init__(self, stream, None, None)
+        self.parent = parent
+        self.logger = logger
+        self.parser = FrameParser()
+        self.patterns = None
+
+    def connectionMade(self):
+        self.transport.registerProducer(self, True)
+        self.stream.clients.add(self)
+
+    def connectionLost(self, reason):
+        self.finished = True
+        self.stream.clients.discard(self)
+
+    def dataReceived(self, data):
+        try:
+            messages = self.parser.feed(data)
+        except OverflowError:
+            return self.close(CLOSE_TOO_BIG)
+        except ValueError:
+            return self.close(CLOSE_PROTOCOL_ERROR)
+        for opcode, payload in messages:
+            if opcode == OP_TEXT:
+                self.message(payload)
+            elif opcode == OP_PING:
+                self.transport.write(encode_frame(OP_PONG, payload))
+            elif opcode == OP_CLOSE:
+                self.close(CLOSE_NORMAL)
+            elif opcode == OP_BINARY:
+                self.close(CLOSE_PROTOCOL_ERROR)
+
+    def close(self, code):
+        if not self.finished:
+            self.finished = True
+            self.transport.write(
+                encode_frame(OP_CLOSE, struct.pack("!H", code)))
+            self.transport.loseConnection()
+
+    def write(self, data):
+        self.transport.write(encode_frame(OP_TEXT, json.dumps(data)))
+
+    def push(self, changes):
+        if self.cursor is not None:
+            pushclient.push(self, changes)
+
+    def send(self, full, tags, body):
+        tags = dict((name, text(value)) for name, value in tags.items()
+                    if self.match(name))
+        if tags or full:
+            self.write({"op": "tags", "version": self.cursor, "full": full,
+                        "tags": tags})
+
+    def match(self, name):
+        if self.patterns is None:
+            return True
+        for pattern in self.patterns:
+            if fnmatchcase(name, pattern):
+                return True
+        return False
+
+    def message(self, payload):
+        try:
+            data = json.loads(payload)
+            op = data["op"]
+        except (ValueError, KeyError, TypeError):
+            return self.write({"op": "error", "error": "bad message"})
+        if op in ("subscribe", "get"):
+            names = data.get("tags") or []
+            if not isinstance(names, list) or not all(
+                    isinstance(name, basestring) for name in names):
+                return self.write({"op": "error", "id": data.get("id"),
+                                   "error": "tags have to be list of names"})
+        if op == "subscribe":
+            self.patterns = names or None
+            tags = self.parent.tags
+            self.cursor = tags.version
+            self.send(True, tags, None)
+        elif op == "get":
+            tags = self.parent.tags
+            self.write({"op": "ack", "id": data.get("id"),
+                        "tags": dict((name, text(tags[name]))
+                                     for name in names if name in tags)})
+        elif op == "set":
+            tags = data.get("tags")
+            try:
+                checktags(tags)
+            except TypeError as e:
+                return self.write({"op": "error", "id": data.get("id"),
+                                   "error": str(e)})
+            self.write({"op": "ack", "id": data.get("id"),
+                        "results": self.parent.settags(tags)})
+        else:
+            self.write({"op": "error", "id": data.get("id"),
+                        "error": "unknown op %s" % op})
+
+
+class websocket(resource.Resource):
+
+    '''
+    WebSocket resource, take over the HTTP connection
+    after handshake
+    '''
+
+    isLeaf = True
+
+    def __init__(self, parent, stream, logger=None):
+        resource.Resource.__init__(self)
+        self.parent = parent
+        self.stream = stream
+        self.logger = logger
+
+    def render_GET(self, request):
+        key = request.getHeader("Sec-WebSocket-Key")
+        if ((request.getHeader("Upgrade") or "").lower() != "websocket" or
+                not key or
+                request.getHeader("Sec-WebSocket-Version") != "13"):
+            request.setResponseCode(400)
+            request.setHeader("Sec-WebSocket-Version", "13")
+            return "websocket handshake expected"
+        protocol = wsclient(self.parent, self.stream, self.logger)
+        transport = request.channel.transport
+        # connection is not HTTP any more, its timeout must not fire
+        request.channel.setTimeout(None)
+        request.channel.transport = None
+        try:
+            transport.unregisterProducer()
+        except RuntimeError:
+            pass
+        transport.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            "Sec-WebSocket-Accept: %s\r\n\r\n" % accept_key(key))
+        transport.protocol = protocol
+        protocol.makeConnection(transport)
+        return server.NOT_DONE_YET
@@ -0,0 +1,106 @@
+'''
+Write queue of PLC
+
+Coils and registers set by clients wait here for the next free
+frame on the serial line. Consecutive addresses are written by one
+request, time from set to ack of PLC is counted.
+'''
+import time
+from collections import deque
+
+# max count of one Write Multiple Coils/Registers request
+LIMITS = {"coils": 1968, "registers": 123}
+# latencies kept for percentile
+SAMPLES = 1000
+
+
+class writequeue(object):
+
+    '''
+    Coils and registers waiting for write
+
+    put(address, value, kind) - the last value of address is written,
+    wait is counted from the first put
+    take() - (kind, start, values, times) of run of consecutive
+    addresses, coils first; kinds in single are taken one by one
+    putback(kind, start, values, times) - take them again
+    done(times, ok) - write of run is answered by PLC
+    '''
+
+    def __init__(self, clock=time.time, limits=LIMITS):
+        self.clock = clock
+        self.limits = limits
+        self.single = set()
+        # (kind, address) -> (value, time of first put)
+        self.pending = {}
+        self.queued = 0
+        self.requests = 0
+        self.written = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = deque(maxlen=SAMPLES)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, address, value, kind="coils"):
+        self.queued += 1
+        key = (kind, address)
+        first = self.pending.get(key, (None, self.clock()))[1]
+        self.pending[key] = (value, first)
+
+    def take(self):
+        '''
+        remove the lowest address with consecutive ones after it
+        '''
+        kind, start = min(self.pending)
+        limit = 1 if kind in self.single else self.limits[kind]
+        values, times = [], []
+        key = (kind, start)
+        while key in self.pending and len(values) < limit:
+            value, first = self.pending.pop(key)
+            values.append(value)
+            times.append(first)
+            key = (kind, key[1] + 1)
+        return kind, start, values, times
+
+    def putback(self, kind, start, values, times):
+        '''
+        run is not written, values put again after it are newer
+        '''
+        self.requests += 1
+        for i, value in enumerate(values):
+            key = (kind, start + i)
+            if key in self.pending:
+                value = self.pending[key][0]
+            self.pending[key] = (value, times[i])
+
+    def done(self, times, ok=True):
+        self.requests += 1
+        if not ok:
+            self.failed += len(times)
+            return
+        now = self.clock()
+        self.written += len(times)
+        for first in times:
+            latency = now - first
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latencies.append(latency)
+
+    def stats(self):
+        '''
+        counters of writes, latency from set to ack in seconds
+        '''
+        latencies = sorted(self.latencies)
+        return {"pending": len(self.pending),
+                "queued": self.queued,
+                "requests": self.requests,
+                "written": self.written,
+                "failed": self.failed,
+                "latency_avg": (self.latency_total / self.written
+                                if self.written else 0.0),
+                "latency_max": self.latency_max,
+                "latency_p99": (latencies[int(len(latencies) * 0.99)]
+                                if latencies else 0.0)}
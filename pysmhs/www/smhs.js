@@ -1,16 +1,60 @@
 var baseUrlGet = "/get?action=";
 var actionGetJson = "getJson";
+var actionGetSvgIndex = "getSvgIndex";
 var getDataObj = new getData(baseUrlGet,receiveJson,"json","get",undefined,undefined);
-var tags = null;
-var inkscapeNS = "http://www.inkscape.org/namespaces/inkscape";
-var scripted = false;
-var sendData = [];
+var getIndexObj = new getData(baseUrlGet+actionGetSvgIndex,receiveIndex,"json","get",undefined,undefined);
+var baseUrlEvents = "/events";
+// wait before the next long-poll after error, ms
+var pollInterval = 1000;
+var sendData = {};
 var empty = true;
-var currMap = {};
+var eventSource = null;
+
+// values of tags, name -> value
+var tags = {};
+var tagsVersion = 0;
+
+// svg bindings from the server, tag -> binding numbers
+var svgIndex = null;
+var svgDoc = null;
+// elements of bindings by id, found once
+var svgElements = {};
+// tags changed since the last frame, drawn together
+var changedTags = {};
+var frameRequested = false;
 
 function receiveJson(json){
-	tags = eval ("(" + json + ")");
+	var data = JSON.parse(json);
+	// full json and changes are the same for drawing,
+	// only changed values are drawn
+	for (var name in data.tags){
+		updateTag(name, data.tags[name]);
+	}
+	tagsVersion = data.version;
 }
+
+// changes of tags since the last version, all tags first
+function receiveTags(e){
+	receiveJson(e.data);
+}
+
+function pollTags(){
+	getDataObj.url=baseUrlEvents+"?mode=poll&after="+tagsVersion;
+	getDataObj.getData();
+}
+
+// without EventSource changes are long-polled,
+// the next poll is asked when answer come
+function receivePoll(json){
+	var ok = false;
+	try {
+		receiveJson(json);
+		ok = true;
+	} finally {
+		setTimeout(pollTags, ok ? 0 : pollInterval);
+	}
+}
+
 function hello(){
 	alert("hello");
 }
@@ -30,17 +74,20 @@ function sendTags(){
 	}
 
 	xmlhttp.open("POST","/get",true);
-	xmlhttp.setRequestHeader("Content-type", "application/x-www-form-urlencoded");
-	xmlhttp.send(sendData.join("&"));
-	sendData = [];
+	xmlhttp.setRequestHeader("Content-type", "application/json");
+	xmlhttp.send(JSON.stringify({tags: sendData}));
+	sendData = {};
 	empty = true;
 }
 
+// tags set in one handler (like scene button) are sent in one batch
 function setTag(tagName,value){
+	if (empty){
+		setTimeout(sendTags, 0);
+	}
 	empty = false;
-//	eval('sendData.'+tagName+'="'+value+'"');
-	sendData.push(tagName+"="+value);
-	sendTags();
+	// switches of svg are 1 or 0
+	sendData[tagName] = (value == "1") ? 1 : 0;
 }
 
 function getStyleParam(style,paramName){
@@ -88,125 +135,140 @@ function changeStyleParam(currentStyle,paramName,value){
 }
 
 function getTag(name){
-	if (tags!=null){
-		return eval('tags.tags.'+name);
+	if (tags.hasOwnProperty(name)){
+		return tags[name];
 	}
 	return null;
 }
 
-function getMapValue(map,name){
-	if (map!=null){
-	
-		if (name.indexOf('%')==0){
-			name = name.slice(1);
-			return eval('map.'+name);
+// remember new value, elements of tag are drawn in the next frame
+function updateTag(name, value){
+	if (tags.hasOwnProperty(name) && tags[name]===value){
+		return;
+	}
+	tags[name] = value;
+	if (svgIndex!=null && svgIndex.tags.hasOwnProperty(name)){
+		changedTags[name] = true;
+		requestFrame();
+	}
+}
+
+function requestFrame(){
+	if (frameRequested || svgDoc==null){
+		return;
+	}
+	frameRequested = true;
+	if (window.requestAnimationFrame){
+		window.requestAnimationFrame(drawFrame);
+	}else{
+		setTimeout(drawFrame, 16);
+	}
+}
+
+function drawFrame(){
+	frameRequested = false;
+	var changed = changedTags;
+	changedTags = {};
+	for (var name in changed){
+		drawTag(name);
+	}
+}
+
+function drawTag(name){
+	var numbers = svgIndex.tags[name];
+	var value = tags[name];
+	if (value===undefined || value===null){
+		return;
+	}
+	for (var i=0;i<numbers.length;i++){
+		var binding = svgIndex.bindings[numbers[i]];
+		var element = getSvgElement(binding.id);
+		if (element!=null){
+			drawBinding(element, binding, value);
 		}
 	}
-	return name;
-}
-
-function  replacer(str){
-str = str.replace(/\'/g,"");
-return "\'"+getMapValue(currMap,str)+"\'";
-}
-
-function goThroughNodes(svg,map){
-	if (map==null) map = { };
-	var nodes = svg.childNodes;
-	var l = nodes.length;
-	var json = {};
-	for (var j=0;j<l;j++){
-		var element = nodes[j];
-		if (element.nodeType==1){
-			var label = element.getAttributeNS(inkscapeNS,"label");
-//			alert(label);
-			if (label!=null && label.length>0){
-				try {
-					json = eval ("{[" + label + "]}");
-					for (var p=0;p<json.length;p++){
-						if (json[p].attr=="color"){
-							var list = json[p].list;
-							for (var i=0;i<list.length;i++){
-								var tag = list[i].tag;
-								tag = getMapValue(map, tag);
-								var data = getTag(tag);
-								if (data!=null){
-									if(list[i].data==data){
-										var style = element.getAttribute("style");
-										element.setAttributeNS(null, "style",changeStyleParam(style,"fill",getNextColor(style, list[i].param)));
-									}
-								}
-							}
-						}else if (json[p].attr=="clone"){
-							for (var i=0;i<json[p].map.length;i++){
-								var mapSplit = json[p].map[0].split("=");
-								eval('map.'+mapSplit[0].slice(1)+'="'+mapSplit[1]+'"');
-							}
-						}else if (json[p].attr=="script" && !scripted) {
-							element.setAttributeNS(null,"cursor","pointer");
-							var list = json[p].list;
-							var reg = new RegExp("\'(%\\w+)\'", "g");
-							for (var i=0;i<list.length;i++){
-								if (reg.test(list[i].param)){
-									currMap = map;
-									//alert(list[i].param.replace(reg,replacer));
-									element.setAttributeNS(null,"on"+list[i].evt,list[i].param.replace(reg,replacer));
-								}else{
-									currMap = map;
-									element.setAttributeNS(null,"on"+list[i].evt,list[i].param);
-								}
-							}
-						}else if (json[p].attr=="get") {
-							element.childNodes[0].childNodes[0].nodeValue=getTag(getMapValue(map, json[p].tag));
-						}else if (json[p].attr=="set" && !scripted) {
-							element.setAttributeNS(null,"cursor","pointer");
-							if (json[p].type=="Variable")
-								element.setAttributeNS(null,"onclick","top.setTag('"+json[p].tag+"','"+getTag(json[p].src)+"')");
-							else
-								element.setAttributeNS(null,"onclick","top.setTag('"+json[p].tag+"','"+json[p].src+"')");
-						}else if (json[p].attr=="bar") {
-							if (!scripted)
-								element.setAttributeNS(inkscapeNS,"height",element.getAttribute("height"));
-							var data = getTag(getMapValue(map,json[p].tag));
-							if (data>=json[p].min){
-								var h = element.getAttributeNS(inkscapeNS,"height");
-								var proc = (100/(json[p].max-json[p].min))*(data-json[p].min);
-								element.setAttributeNS(null,"height",(h/100)*proc);
-							}else
-								element.setAttributeNS(null,"height",0);
-
-						}
-					}
-				}catch (e) {
-					// alert(e);
-				}
-				if (element.nodeName=="g"){
-					goThroughNodes(element,map);
-				}
+}
+
+function getSvgElement(id){
+	if (!svgElements.hasOwnProperty(id)){
+		svgElements[id] = svgDoc.getElementById(id);
+	}
+	return svgElements[id];
+}
+
+function drawBinding(element, binding, value){
+	if (binding.attr=="color"){
+		var rules = binding.rules;
+		for (var i=0;i<rules.length;i++){
+			if (rules[i][0]==value){
+				var style = element.getAttribute("style") || "";
+				element.setAttributeNS(null, "style",changeStyleParam(style,"fill",getNextColor(style, rules[i][1])));
 			}
 		}
+	}else if (binding.attr=="get"){
+		var node = element;
+		while (node.firstChild!=null && node.firstChild.nodeType==1){
+			node = node.firstChild;
+		}
+		if (node.firstChild!=null){
+			node.firstChild.nodeValue = value;
+		}else{
+			node.appendChild(svgDoc.createTextNode(value));
+		}
+	}else if (binding.attr=="bar"){
+		if (value>=binding.min){
+			var proc = (100/(binding.max-binding.min))*(value-binding.min);
+			element.setAttributeNS(null,"height",(binding.height/100)*proc);
+		}else
+			element.setAttributeNS(null,"height",0);
 	}
 }
 
-function init(){
-	thread();
+function receiveIndex(json){
+	svgIndex = JSON.parse(json);
+	attachSvg();
 }
 
-function thread(){
-	var svgHolder = document.getElementById('svgHolder');
-	getDataObj.url=baseUrlGet+actionGetJson;
-	getDataObj.getData();
-	if (tags!=null){
-		for (var i=0;i<svgHolder.childNodes.length;i++){
-			if(svgHolder.childNodes[i].nodeName=="EMBED"){
-				goThroughNodes(svgHolder.childNodes[i].getSVGDocument().childNodes[1],null);
-				scripted=true;
-			}
+// handlers of svg elements are set once, then all bound tags are drawn
+function attachSvg(){
+	if (svgIndex==null || svgDoc!=null){
+		return;
+	}
+	var embed = document.getElementById('svg');
+	var doc = null;
+	try {
+		doc = embed.getSVGDocument();
+	}catch (e) {
+	}
+	if (doc==null || doc.documentElement==null){
+		// svg is not loaded yet
+		setTimeout(attachSvg, 100);
+		return;
+	}
+	svgDoc = doc;
+	svgElements = {};
+	var events = svgIndex.events;
+	for (var i=0;i<events.length;i++){
+		var element = getSvgElement(events[i].id);
+		if (element!=null){
+			element.setAttributeNS(null,"cursor","pointer");
+			element.setAttributeNS(null,"on"+events[i].evt,events[i].code);
 		}
 	}
-	doTimer();
+	for (var name in svgIndex.tags){
+		changedTags[name] = true;
+	}
+	requestFrame();
 }
 
-function doTimer() {
-	setTimeout("thread()",100);
+function init(){
+	if (window.EventSource){
+		// Last-Event-ID of reconnect is the version of tags
+		eventSource = new EventSource(baseUrlEvents);
+		eventSource.addEventListener("tags", receiveTags, false);
+	}else{
+		getDataObj.callBackFunction = receivePoll;
+		pollTags();
+	}
+	getIndexObj.getData();
 }
@@ -0,0 +1,125 @@
+import threading
+import unittest
+from twisted.python import threadable
+from pysmhs.dispatchpool import DispatchPool, SerialExecutor, coalesce
+from pysmhs.event import Event
+
+
+class TestDispatchPool(unittest.TestCase):
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.done = threading.Event()
+        self.processed = []
+
+    def process(self, signal, events):
+        self.gate.wait(5)
+        self.processed.append(events)
+        if len(self.processed) == self.expected:
+            self.done.set()
+
+    def fill(self, policy):
+        self.pool = DispatchPool(
+            self.process, workers=1, queuesize=2, policy=policy)
+        self.pool.start()
+        # first batch is taken by the worker and waits for the gate
+        self.pool.submit("test", [Event("test", "a", 0)])
+        while self.pool.depth:
+            pass
+        self.pool.submit("test", [Event("test", "a", 1)])
+        self.pool.submit("test", [Event("test", "b", 1)])
+        self.pool.submit("test", [Event("test", "a", 2)])
+        self.gate.set()
+        self.assertTrue(self.done.wait(5))
+        self.pool.stop()
+
+    def testDropOldest(self):
+        self.expected = 3
+        self.fill("drop-oldest")
+        self.assertEqual(
+            [(e[0].tag, e[0].value) for e in self.processed],
+            [("a", "0"), ("b", "1"), ("a", "2")])
+        self.assertEqual(self.pool.stats()["dropped"], 1)
+
+    def testCoalesce(self):
+        self.expected = 3
+        self.fill("coalesce")
+        self.assertEqual([(e.tag, e.value) for e in self.processed[2]],
+                         [("b", "1"), ("a", "2")])
+        stats = self.pool.stats()
+        self.assertEqual(stats["coalesced"], 1)
+        self.assertEqual(stats["processed"], 3)
+        self.assertEqual(stats["maxdepth"], 2)
+
+    def testBlock(self):
+        self.expected = 4
+        self.gate.set()
+        self.pool = DispatchPool(
+            self.process, workers=2, queuesize=1, policy="block")
+        self.pool.start()
+        for i in range(4):
+            self.pool.submit("test", [Event("test", "a", i)])
+        self.assertTrue(self.done.wait(5))
+        self.pool.stop()
+        self.assertEqual(self.pool.stats()["dropped"], 0)
+
+    def testBlockReactor(self):
+        # submit from the reactor thread coalesce instead of wait
+        self.expected = 3
+        ioThread = threadable.ioThread
+        threadable.ioThread = threadable.getThreadID()
+        try:
+            self.fill("block")
+        finally:
+            threadable.ioThread = ioThread
+        self.assertEqual([(e.tag, e.value) for e in self.processed[2]],
+                         [("b", "1"), ("a", "2")])
+        self.assertEqual(self.pool.stats()["coalesced"], 1)
+
+    def testCoalesceFunction(self):
+        events = [Event("test", "a", 1), Event("test", "b", 1),
+                  Event("test", "a", 0)]
+        self.assertEqual(coalesce(events), events[1:])
+
+
+class TestSerialExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.processed = {}
+        self.count = 0
+
+    def process(self, signal, events):
+        with self.lock:
+            for event in events:
+                self.processed.setdefault(event.tag, []).append(
+                    int(event.value))
+                self.count += 1
+            if self.count == self.expected:
+                self.done.set()
+
+    def run_executor(self, executor):
+        self.expected = 300
+        executor.start()
+        for i in range(100):
+            executor.submit("test", [Event("test", "a", i),
+                                     Event("test", "b", i),
+                                     Event("test", "c", i)])
+        self.assertTrue(self.done.wait(5))
+        executor.stop()
+        for tag in "abc":
+            self.assertEqual(self.processed[tag], range(100))
+
+    def testHandlerOrder(self):
+        self.run_executor(SerialExecutor(self.process))
+
+    def testTagOrder(self):
+        executor = SerialExecutor(self.process, lanes=3, key=True)
+        self.run_executor(executor)
+        self.assertEqual(executor.stats()["processed"],
+                         sum(lane.processed for lane in executor.lanes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from twisted.internet.task import Clock
+from pysmhs.event import Event
+from pysmhs.eventbus import EventBus
+
+
+class FakeReactor(Clock):
+
+    def callFromThread(self, f, *args, **kwargs):
+        self.callLater(0, f, *args, **kwargs)
+
+
+class TestEventBus(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.bus = EventBus(reactor=self.reactor)
+        self.received = []
+
+    def process(self, signal, events):
+        self.received.append((signal, [event.name for event in events]))
+
+    def publish(self, name):
+        handler, tag = name.split("_")
+        self.bus.publish(handler, [Event(handler, tag, 1)])
+
+    def testDeliverOnReactor(self):
+        self.bus.subscribe(self.process)
+        self.publish("plchandler_van4")
+        self.assertEqual(self.received, [])
+        self.reactor.advance(0)
+        self.assertEqual(self.received, [("plchandler", ["plchandler_van4"])])
+
+    def testSignal(self):
+        self.bus.subscribe(self.process, "datehandler")
+        self.publish("plchandler_van4")
+        self.publish("datehandler_date")
+        self.reactor.advance(0)
+        self.assertEqual(self.received,
+                         [("datehandler", ["datehandler_date"])])
+
+    def testTags(self):
+        self.bus.subscribe(self.process, tags=["plchandler_van4",
+                                               "datehandler_*"])
+        self.bus.publish("plchandler", [Event("plchandler", "van2", 1),
+                                        Event("plchandler", "van4", 1)])
+        self.publish("datehandler_date")
+        self.publish("webhandler_x")
+        self.reactor.advance(0)
+        self.assertEqual(
+            self.received,
+            [("plchandler", ["plchandler_van4"]),
+             ("datehandler", ["datehandler_date"])])
+        self.assertEqual(len(self.bus.subscribers("plchandler_van2")), 0)
+
+    def testSender(self):
+        self.bus.subscribe(self.process, sender="actionhandler")
+        self.publish("actionhandler_Van4")
+        self.publish("plchandler_van4")
+        self.reactor.advance(0)
+        self.assertEqual(self.received, [("plchandler", ["plchandler_van4"])])
+
+    def testUnsubscribe(self):
+        self.bus.subscribe(self.process)
+        self.bus.unsubscribe(self.process)
+        self.publish("plchandler_van4")
+        self.reactor.advance(0)
+        self.assertEqual(self.received, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
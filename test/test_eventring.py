@@ -0,0 +1,46 @@
+import unittest
+from pysmhs.event import Event
+from pysmhs.eventring import EventRing
+
+
+class TestEventRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = EventRing(4)
+
+    def add(self, count):
+        return self.ring.extend(
+            [Event("plchandler", "van%d" % i, i) for i in range(count)])
+
+    def testEmpty(self):
+        self.assertEqual(len(self.ring), 0)
+        self.assertEqual(self.ring.after(0), [])
+        self.assertFalse(self.ring.lost(0))
+        self.assertTrue(self.ring.lost(1))
+
+    def testSeqOfRing(self):
+        events = self.add(3)
+        self.assertEqual([seq for seq, _ in events], [1, 2, 3])
+        self.assertEqual(self.ring.after(1), events[1:])
+        self.assertEqual(self.ring.after(0, limit=2), events[:2])
+
+    def testWrap(self):
+        events = self.add(10)
+        self.assertEqual(len(self.ring), 4)
+        self.assertEqual(self.ring.first, 7)
+        self.assertEqual(list(self.ring), events[6:])
+        self.assertEqual(self.ring.after(2), events[6:])
+        self.assertFalse(self.ring.lost(6))
+        self.assertTrue(self.ring.lost(5))
+        self.assertTrue(self.ring.lost(11))
+
+    def testEventNotChanged(self):
+        event = Event("plchandler", "van1", 1)
+        seq, kept = self.ring.append(event)
+        self.assertEqual(seq, 1)
+        self.assertIs(kept, event)
+        self.assertNotEqual(event.seq, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
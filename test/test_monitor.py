@@ -0,0 +1,41 @@
+import unittest
+from pysmhs.event import Event
+from pysmhs.eventring import EventRing
+from pysmhs.monitor import eventfilter, page
+
+
+class TestMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = EventRing(8)
+        for i in range(10):
+            self.ring.append(Event("plchandler" if i % 2 else "datehandler",
+                                   "van%d" % i, i))
+
+    def testFilter(self):
+        match = eventfilter(handlers=["plchandler"])
+        self.assertEqual([s for s, e in self.ring if match(e)],
+                         [4, 6, 8, 10])
+        match = eventfilter(tags=["plchandler_van3", "datehandler_van[48]"])
+        self.assertEqual([s for s, e in self.ring if match(e)], [4, 5, 9])
+        match = eventfilter(start=self.ring.after(5)[0][1].time)
+        self.assertTrue(all(s > 5 for s, e in self.ring if match(e)))
+
+    def testNewestPage(self):
+        events = page(self.ring.iterbefore(), eventfilter(), 3)
+        self.assertEqual([s for s, e in events], [10, 9, 8])
+        self.assertEqual((events.oldest, events.newest, events.more),
+                         (8, 10, True))
+        older = page(self.ring.iterbefore(events.oldest), eventfilter(), 10)
+        self.assertEqual([s for s, e in older], [7, 6, 5, 4, 3])
+        self.assertFalse(older.more)
+
+    def testNewerPage(self):
+        events = page(self.ring.iterafter(7),
+                      eventfilter(handlers=["datehandler"]), 5)
+        self.assertEqual([s for s, e in events], [9])
+        self.assertEqual(events.newest, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import logging
+import os
+import tempfile
+import unittest
+from twisted.python import threadable
+from twisted.test.proto_helpers import MemoryReactorClock, StringTransport
+from pymodbus.transaction import ModbusRtuFramer, ModbusSocketFramer
+from pysmhs import plchandler
+from pysmhs.pollscheduler import pollscheduler
+from pysmhs.tagregistry import TagRegistry
+from pysmhs.tagstore import TagStore
+from pysmhs.writequeue import writequeue
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "pysmhs", "config",
+                      "tags_config.txt")
+
+
+class reactorclock(MemoryReactorClock):
+
+    def __init__(self):
+        MemoryReactorClock.__init__(self)
+        self.fromthreads = []
+
+    def callFromThread(self, f, *args, **kwargs):
+        self.fromthreads.append((f, args, kwargs))
+
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor, plchandler.reactor = (
+            plchandler.reactor, reactorclock())
+        self.logfile = tempfile.mktemp(suffix=".log")
+        # test is the reactor thread
+        self.ioThread = threadable.ioThread
+        threadable.ioThread = threadable.getThreadID()
+
+    def tearDown(self):
+        plchandler.reactor = self.reactor
+        threadable.ioThread = self.ioThread
+        for name in os.listdir(os.path.dirname(self.logfile)):
+            if name.startswith(os.path.basename(self.logfile)):
+                os.remove(os.path.join(os.path.dirname(self.logfile), name))
+
+    def testFramer(self):
+        self.assertIsInstance(plchandler.make_framer("rtu"), ModbusRtuFramer)
+        self.assertIsInstance(plchandler.make_framer("tcp"),
+                              ModbusSocketFramer)
+
+    def testStationAddress(self):
+        proto = plchandler.SMHSProtocol(
+            plchandler.make_framer("ascii"), pollscheduler([]),
+            logging.getLogger("test"), None, writequeue(), unit=1)
+        transport = StringTransport()
+        proto.makeConnection(transport)
+        proto.read_coils(1296, 8)
+        self.assertTrue(transport.value().startswith(":010105100008"))
+
+    def testBadWrite(self):
+        pool = writequeue()
+        proto = plchandler.SMHSProtocol(
+            plchandler.make_framer("ascii"), pollscheduler([]),
+            logging.getLogger("test"), None, pool)
+        proto.makeConnection(StringTransport())
+        # value not checked by checkvalue can't be encoded
+        pool.put(4598, "on", "registers")
+        proto.next()
+        self.assertEqual(len(pool), 0)
+        # polling go on
+        self.assertTrue(proto.idle.active())
+        pool.put(1307, 1)
+        proto.wakeup()
+        self.assertEqual(len(pool), 0)
+        self.assertTrue(proto.transport.value())
+
+    def testTcp(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "tcp", "host": "10.0.0.5", "tcp_port": "5020",
+                     "station_address": "1"}})
+        handler.start()
+        try:
+            host, port, factory = plchandler.reactor.tcpClients[0][:3]
+            self.assertEqual((host, port, factory.mode), ("10.0.0.5", 5020,
+                                                          "tcp"))
+            proto = factory.buildProtocol(None)
+            self.assertEqual(proto.unit, 1)
+            self.assertIs(factory.client, proto)
+        finally:
+            handler.stop()
+
+    def testMemoryKinds(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250", "memory": ["1", "10"]},
+            "port": {"mode": "tcp", "host": "10.0.0.5"}})
+        handler.start()
+        try:
+            groups = plchandler.reactor.tcpClients[0][2].scheduler.groups
+            memory = sorted((g.kind, g.reads) for g in groups
+                            if g.name == "memory")
+            self.assertEqual(memory, [("coils", ((2057, 1),)),
+                                      ("registers", ((4598, 1),))])
+        finally:
+            handler.stop()
+
+    def testWriteKinds(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "tcp", "host": "10.0.0.5"}})
+        handler._settag("pollingTag", 1)
+        handler._settag("counter_threshold", 250)
+        handler._settag("zal", 1)
+        self.assertEqual(sorted(handler.writepool.pending), [
+            ("coils", 1307), ("coils", 2057), ("registers", 4598)])
+        self.assertRaises(ValueError, handler._settag, "vkcSpa2", 1)
+        # bad value fail at caller, not in poll loop
+        self.assertRaises(ValueError, handler._settag, "zal", "on")
+        self.assertEqual(len(handler.writepool), 3)
+
+    def testSetFromThread(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "tcp", "host": "10.0.0.5"}})
+        threadable.ioThread = None
+        handler._settag("zal", "1")
+        self.assertRaises(ValueError, handler._settag, "zal", "on")
+        # queue is touched only from the reactor
+        self.assertEqual(len(handler.writepool), 0)
+        threadable.ioThread = threadable.getThreadID()
+        for f, args, kwargs in plchandler.reactor.fromthreads:
+            f(*args, **kwargs)
+        self.assertEqual(handler.writepool.pending.keys(), [("coils", 1307)])
+
+    def testReadOnlyBatch(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "tcp", "host": "10.0.0.5"}})
+        handler.registry = TagRegistry()
+        handler.store = TagStore()
+        handler.registry.addhandler("plchandler", handler)
+        self.assertEqual(handler.settags(
+            {"plchandler_zal": 1, "plchandler_vkcSpa2": 1}), {
+            "plchandler_zal": "not set", "plchandler_vkcSpa2": "read only"})
+        self.assertEqual(len(handler.writepool), 0)
+
+    def testCheckValue(self):
+        handler = plchandler.plchandler(None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "tcp", "host": "10.0.0.5"}})
+        self.assertEqual(handler.checkvalue("zal", "1"), 1)
+        self.assertEqual(handler.checkvalue("zal", 5), 1)
+        self.assertEqual(handler.checkvalue("counter_threshold", 250), 250)
+        for tag, value in (("zal", "on"), ("zal", [1]),
+                           ("counter_threshold", 70000),
+                           ("counter_threshold", -1)):
+            self.assertRaises(ValueError, handler.checkvalue, tag, value)
+
+    def testUnknownMode(self):
+        self.assertRaises(ValueError, plchandler.plchandler, None, {
+            "configfile": CONFIG, "loglevel": "error",
+            "logfile": self.logfile,
+            "server": {"pollingTimeout": "0", "packetSize": "50",
+                       "counter_threshold": "250"},
+            "port": {"mode": "udp"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+import logging
+import unittest
+from twisted.internet import defer, task
+from pysmhs import plchandler
+from pysmhs.pollscheduler import pollgroup, pollscheduler
+from pysmhs.writequeue import writequeue
+
+
+class TestPollScheduler(unittest.TestCase):
+
+    def testAdapt(self):
+        group = pollgroup("output", "coils", ((0, 8),), 0.1, 1)
+        group.done(0, 10)
+        self.assertAlmostEqual(group.interval, 0.15)
+        for i in range(10):
+            group.done(0, 10)
+        self.assertEqual(group.interval, 1)
+        self.assertEqual(group.due, 11)
+        group.done(2, 20)
+        self.assertEqual((group.interval, group.due), (0.1, 20.1))
+
+    def testNext(self):
+        output = pollgroup("output", "coils", (), 0, 2)
+        inputc = pollgroup("inputc", "registers", (), 0, 0)
+        scheduler = pollscheduler([output, inputc])
+        # due at the same time, counters first
+        self.assertEqual(scheduler.next(0), (inputc, 0))
+        scheduler.done(inputc, 1, 5)
+        # output is due long ago
+        self.assertEqual(scheduler.next(5), (output, 0))
+        scheduler.done(output, 0, 5)
+        scheduler.done(inputc, 0, 5)
+        self.assertEqual(scheduler.next(5), (inputc, 0))
+        inputc.due = 6
+        self.assertEqual(scheduler.next(5)[0], None)
+        self.assertAlmostEqual(scheduler.next(5)[1], 0.05)
+
+    def testWritten(self):
+        output = pollgroup("output", "coils", ((1296, 8), (1310, 2)), 0.1, 2)
+        output.done(0, 0)
+        output.interval, output.due = 2, 2
+        scheduler = pollscheduler([output])
+        scheduler.written("registers", 1300, 1, 1)
+        scheduler.written("coils", 1304, 6, 1)
+        self.assertEqual((output.interval, output.due), (2, 2))
+        scheduler.written("coils", 1308, 3, 1)
+        self.assertEqual((output.interval, output.due), (0.1, 1))
+
+
+class response(object):
+
+    def __init__(self, values):
+        self.values = values
+
+    def getBit(self, i):
+        return self.values[i]
+
+    getRegister = getBit
+    function_code = 1
+
+
+class protocol(plchandler.SMHSProtocol):
+
+    '''
+    SMHSProtocol with transactions recorded instead of sent
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        self.pending_calls = []
+        plchandler.SMHSProtocol.__init__(self, None, *args, **kwargs)
+
+    def call(self, *args):
+        self.calls.append(args)
+        d = defer.Deferred()
+        self.pending_calls.append((d, args))
+        return d
+
+    def answer(self, function_code=1):
+        d, args = self.pending_calls.pop(0)
+        count = args[2] if args[0].startswith("read") else 1
+        answer = response([1] * count)
+        answer.function_code = function_code
+        d.callback(answer)
+
+    def read_coils(self, *args):
+        return self.call("read_coils", *args)
+
+    def read_holding_registers(self, *args):
+        return self.call("read_holding_registers", *args)
+
+    def write_coil(self, *args):
+        return self.call("write_coil", *args)
+
+    def write_coils(self, *args):
+        return self.call("write_coils", *args)
+
+    def write_registers(self, *args):
+        return self.call("write_registers", *args)
+
+    def write_register(self, *args):
+        return self.call("write_register", *args)
+
+
+class TestProtocol(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.reactor, plchandler.reactor = plchandler.reactor, self.clock
+        self.writepool = writequeue(self.clock.seconds)
+        self.changes = 0
+        self.output = pollgroup("output", "coils", ((1296, 8),), 0, 1)
+        self.inputc = pollgroup("inputc", "registers",
+                                ((3592, 4), (3600, 2)), 0, 0)
+        self.proto = protocol(
+            pollscheduler([self.output, self.inputc]),
+            logging.getLogger("test"), self.reader, self.writepool,
+            heartbeat=1)
+        self.clock.advance(3)
+
+    def tearDown(self):
+        plchandler.reactor = self.reactor
+
+    def reader(self, values, t):
+        return self.changes
+
+    def step(self):
+        self.proto.answer()
+        return self.proto.calls[-1]
+
+    def testCycle(self):
+        self.assertEqual(self.proto.calls, [("write_register", 4598, 250)])
+        self.assertEqual(self.step(), ("write_coil", 2057, 0xFF00))
+        self.assertEqual(self.step(),
+                         ("read_holding_registers", 3592, 4))
+        self.assertEqual(self.step(),
+                         ("read_holding_registers", 3600, 2))
+        # heartbeat is not due yet
+        self.assertEqual(self.step(), ("read_coils", 1296, 8))
+        self.assertEqual(self.step(),
+                         ("read_holding_registers", 3592, 4))
+
+    def testWritePreemptReads(self):
+        self.step()
+        self.step()
+        self.writepool.put(1300, "1")
+        self.assertEqual(self.step(), ("write_coil", 1300, 0xFF00))
+        self.assertEqual(self.step(),
+                         ("read_holding_registers", 3600, 2))
+
+    def testIdleWakeup(self):
+        self.inputc.mininterval = self.inputc.maxinterval = 10
+        for i in range(5):
+            self.step()
+        # both groups are read, no changes, wait for output
+        self.assertEqual(self.proto.pending_calls, [])
+        self.writepool.put(1300, 0)
+        self.proto.wakeup()
+        self.assertEqual(self.proto.calls[-1], ("write_coil", 1300, 0))
+        self.step()
+        self.clock.advance(0.05)
+        self.assertEqual(self.proto.calls[-1], ("read_coils", 1296, 8))
+
+    def testMergeWrites(self):
+        self.step()
+        for address, value in ((1300, 1), (1298, 0), (1299, "1")):
+            self.writepool.put(address, value)
+        self.clock.advance(0.01)
+        self.assertEqual(self.step(),
+                         ("write_coils", 1298, [False, True, True]))
+        self.clock.advance(0.02)
+        self.step()
+        stats = self.writepool.stats()
+        self.assertEqual((stats["requests"], stats["written"]), (1, 3))
+        self.assertAlmostEqual(stats["latency_max"], 0.03)
+
+    def testReadBack(self):
+        self.inputc.mininterval = self.inputc.maxinterval = 10
+        for i in range(5):
+            self.step()
+        # outputs don't change, they are read less often
+        self.output.interval = 1
+        self.output.due = self.clock.seconds() + 1
+        self.writepool.put(1300, 1)
+        self.proto.wakeup()
+        self.assertEqual(self.proto.calls[-1], ("write_coil", 1300, 0xFF00))
+        self.assertEqual(self.step(), ("read_coils", 1296, 8))
+        self.assertEqual(self.output.interval, 0)
+
+    def testMultipleRefused(self):
+        self.step()
+        self.writepool.put(10, 1, "registers")
+        self.writepool.put(11, 2, "registers")
+        self.assertEqual(self.step(), ("write_registers", 10, [1, 2]))
+        # illegal function
+        self.proto.answer(0x90)
+        self.assertEqual(self.proto.calls[-1], ("write_register", 10, 1))
+        self.assertEqual(self.step(), ("write_register", 11, 2))
+        self.step()
+        self.assertEqual(self.writepool.stats()["written"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from pysmhs.readplanner import plan, planbytes, readsize
+
+
+class TestReadPlanner(unittest.TestCase):
+
+    def testContiguous(self):
+        outputs = [str(a) for a in range(1296, 1314)]
+        self.assertEqual(plan(outputs, "coils"), ((1296, 18),))
+        self.assertEqual(plan(range(3592, 3604), "registers"),
+                         ((3592, 12),))
+        self.assertEqual(plan([], "coils"), ())
+
+    def testSparse(self):
+        self.assertEqual(plan([2057, 4598], "registers"),
+                         ((2057, 1), (4598, 1)))
+
+    def testGapCost(self):
+        # one more ascii read of registers cost as 7 unused registers
+        self.assertEqual(plan([10, 18], "registers"), ((10, 9),))
+        self.assertEqual(plan([10, 19], "registers"),
+                         ((10, 1), (19, 1)))
+        # rtu frame is shorter, so is the gap
+        self.assertEqual(plan([10, 17], "registers", framer="rtu"),
+                         ((10, 8),))
+        self.assertEqual(plan([10, 18], "registers", framer="rtu"),
+                         ((10, 1), (18, 1)))
+        # coils are bits, long gaps are cheap
+        self.assertEqual(plan([0, 100], "coils"), ((0, 101),))
+
+    def testMaxgap(self):
+        self.assertEqual(plan([1, 2, 4], "coils", maxgap=0),
+                         ((1, 2), (4, 1)))
+        self.assertEqual(plan([1, 2, 4], "coils", maxgap="1"), ((1, 4),))
+
+    def testLimits(self):
+        self.assertEqual(plan(range(200), "registers"),
+                         ((0, 125), (125, 75)))
+        self.assertEqual(plan(range(2001), "coils"),
+                         ((0, 2000), (2000, 1)))
+        self.assertEqual(plan(range(120), "coils", maxcount=50),
+                         ((0, 50), (50, 50), (100, 20)))
+
+    def testBytes(self):
+        # ascii request 17 bytes, response 11 + 4 per register
+        self.assertEqual(readsize("registers", 12), 17 + 11 + 48)
+        self.assertEqual(readsize("coils", 18, "rtu"), 8 + 5 + 3)
+        self.assertEqual(planbytes(((0, 12), (20, 12)), "registers"),
+                         2 * 76)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from twisted.internet.task import Clock
+from pysmhs import abstracthandler
+from pysmhs.abstracthandler import AbstractHandler, REACTOR
+
+
+class FakeReactor(Clock):
+
+    # test is the reactor thread
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+
+class lamps(AbstractHandler):
+
+    dispatch = REACTOR
+
+    def loadtags(self):
+        for tag in ("van4", "zal", "kor"):
+            self._tags[tag] = 0
+
+
+class TestSendEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeReactor()
+        self.reactor, abstracthandler.reactor = (
+            abstracthandler.reactor, self.clock)
+        self.published = []
+        self.publish = abstracthandler.bus.publish
+        abstracthandler.bus.publish = (
+            lambda signal, events: self.published.append(
+                [(e.tag, e.value) for e in events]))
+
+    def tearDown(self):
+        abstracthandler.reactor = self.reactor
+        abstracthandler.bus.publish = self.publish
+
+    def handler(self, **params):
+        params.setdefault("loglevel", "error")
+        return lamps(params=params)
+
+    def testNoCoalesce(self):
+        handler = self.handler()
+        handler._settag("van4", 1)
+        handler._settag("zal", 1)
+        self.assertEqual(self.published, [[("van4", "1")], [("zal", "1")]])
+
+    def testTick(self):
+        handler = self.handler(coalesce="tick")
+        handler._settag("van4", 1)
+        handler._settag("zal", 1)
+        handler._settag("van4", 0)
+        self.assertEqual(self.published, [])
+        self.clock.advance(0)
+        self.assertEqual(self.published,
+                         [[("van4", "1"), ("zal", "1"), ("van4", "0")]])
+        handler._settag("kor", 1)
+        self.clock.advance(0)
+        self.assertEqual(self.published[1:], [[("kor", "1")]])
+
+    def testWindow(self):
+        handler = self.handler(coalesce="50")
+        handler._settag("van4", 1)
+        self.clock.advance(0.03)
+        handler._settag("zal", 1)
+        self.clock.advance(0.01)
+        self.assertEqual(self.published, [])
+        self.clock.advance(0.011)
+        self.assertEqual(self.published, [[("van4", "1"), ("zal", "1")]])
+        # next event open new window
+        handler._settag("kor", 1)
+        self.clock.advance(0.049)
+        self.assertEqual(len(self.published), 1)
+        self.clock.advance(0.002)
+        self.assertEqual(self.published[1:], [[("kor", "1")]])
+
+    def testLastValue(self):
+        handler = self.handler(coalesce="50", lastvalue="1")
+        for tag, value in (("van4", 1), ("zal", 1), ("van4", 0),
+                           ("kor", 1), ("zal", 0)):
+            handler._settag(tag, value)
+        self.clock.advance(0.05)
+        # last value of every tag, in order of the last change
+        self.assertEqual(self.published,
+                         [[("van4", "0"), ("kor", "1"), ("zal", "0")]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import unittest
+from cStringIO import StringIO
+from twisted.web.test.requesthelper import DummyRequest
+from pysmhs import abstracthandler
+from pysmhs.abstracthandler import AbstractHandler, REACTOR
+from pysmhs.tagregistry import TagRegistry
+from pysmhs.tagstore import TagStore
+from pysmhs.webhandler import smhs_web
+
+
+class lamps(AbstractHandler):
+
+    dispatch = REACTOR
+
+    def loadtags(self):
+        for tag in ("van4", "zal", "kor"):
+            self._tags[tag] = 0
+
+    def checkvalue(self, tag, value):
+        if value not in (0, 1):
+            raise ValueError("lamp is 0 or 1")
+        return value
+
+
+class TestSetTags(unittest.TestCase):
+
+    def setUp(self):
+        self.published = []
+        self.publish = abstracthandler.bus.publish
+        abstracthandler.bus.publish = (
+            lambda signal, events: self.published.append((signal, events)))
+        self.handler = lamps()
+        self.handler.registry = TagRegistry()
+        self.handler.store = TagStore()
+        self.handler.registry.addhandler("lamps", self.handler)
+        self.handler.store.attach(self.handler._tags)
+
+    def tearDown(self):
+        abstracthandler.bus.publish = self.publish
+
+    def testOneBatch(self):
+        version = self.handler.store.version
+        results = self.handler.settags(
+            {"lamps_van4": 1, "lamps_zal": 1, "lamps_kor": 0})
+        self.assertEqual(set(results.values()), set(["ok"]))
+        self.assertEqual(self.handler.store.version, version + 1)
+        self.assertEqual(len(self.published), 1)
+        signal, events = self.published[0]
+        self.assertEqual(sorted(e.name for e in events),
+                         ["lamps_van4", "lamps_zal"])
+
+    def testUnknownTag(self):
+        results = self.handler.settags({"lamps_van4": 1, "lamps_bogus": 1})
+        self.assertEqual(results, {"lamps_van4": "not set",
+                                   "lamps_bogus": "unknown tag"})
+        self.assertEqual(self.handler._tags["van4"], 0)
+        self.assertEqual(self.published, [])
+
+    def testBadValue(self):
+        results = self.handler.settags({"lamps_van4": 1, "lamps_zal": "on"})
+        self.assertEqual(results, {"lamps_van4": "not set",
+                                   "lamps_zal": "bad value: lamp is 0 or 1"})
+        self.assertEqual(self.handler._tags["van4"], 0)
+        self.assertEqual(self.published, [])
+
+    def testBatchKeepEdges(self):
+        with abstracthandler.batch():
+            self.handler.settag("lamps_van4", 1)
+            self.handler.settag("lamps_van4", 0)
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual([e.value for e in self.published[0][1]], ["1", "0"])
+
+    def testBatchLastValue(self):
+        self.handler.lastvalue = True
+        with abstracthandler.batch():
+            self.handler.settag("lamps_van4", 1)
+            self.handler.settag("lamps_zal", 1)
+            self.handler.settag("lamps_van4", 0)
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(sorted((e.name, e.value)
+                                for e in self.published[0][1]),
+                         [("lamps_van4", "0"), ("lamps_zal", "1")])
+
+    def testNoRegistry(self):
+        handler = lamps()
+        results = handler.settags({"van4": 1, "bogus": 1})
+        self.assertEqual(results["van4"], "ok")
+        self.assertTrue(results["bogus"].startswith("error"))
+        self.assertEqual(handler._tags["van4"], 1)
+        self.assertEqual(len(self.published), 1)
+
+    def post(self, body):
+        request = DummyRequest([""])
+        request.method = "POST"
+        request.requestHeaders.setRawHeaders("content-type",
+                                             ["application/json"])
+        request.content = StringIO(body)
+        return request, smhs_web(self.handler).render_POST(request)
+
+    def testPostJson(self):
+        request, answer = self.post(json.dumps(
+            {"tags": {"lamps_van4": 1, "lamps_zal": 1}}))
+        self.assertEqual(json.loads(answer), {
+            "ok": True, "results": {"lamps_van4": "ok", "lamps_zal": "ok"}})
+        self.assertEqual(len(self.published), 1)
+        request, answer = self.post(json.dumps(
+            {"tags": {"lamps_van4": 0, "lamps_bogus": 1}}))
+        self.assertFalse(json.loads(answer)["ok"])
+        self.assertEqual(self.handler._tags["van4"], 1)
+
+    def testPostBadJson(self):
+        for body in ("{", json.dumps({"tags": [1]}),
+                     json.dumps({"tags": {"lamps_van4": [1]}})):
+            request, answer = self.post(body)
+            self.assertEqual(request.responseCode, 400)
+            self.assertFalse(json.loads(answer)["ok"])
+        self.assertEqual(self.published, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
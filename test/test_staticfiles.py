@@ -0,0 +1,81 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+from pysmhs.staticfiles import accepted, assetcache
+
+
+class TestStaticFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cachedir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, "js"))
+        self.write("js/app.js", "var x = 1;\n" * 200)
+        self.write("index.html",
+                   '<script src="js/app.js"></script>'
+                   '<a href="/get?action=listTags">tags</a>')
+        self.cache = assetcache(self.root, self.cachedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.cachedir)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), "wb") as f:
+            f.write(data)
+
+    def testAccepted(self):
+        self.assertEqual(accepted("gzip, deflate;q=0.5, br;q=0"),
+                         set(["gzip", "deflate"]))
+        self.assertEqual(accepted(None), set())
+
+    def testGzipVariant(self):
+        app = self.cache.get(os.path.join(self.root, "js/app.js"))
+        with open(app.variants["gzip"], "rb") as f:
+            data = gzip.GzipFile(fileobj=StringIO(f.read())).read()
+        self.assertEqual(data, "var x = 1;\n" * 200)
+        self.assertEqual(self.cache.url("js/app.js"),
+                         "/www/js/app.js?v=%s" % app.digest)
+
+    def testHtmlFingerprint(self):
+        page = self.cache.get(os.path.join(self.root, "index.html"))
+        app = self.cache.get(os.path.join(self.root, "js/app.js"))
+        with open(page.identity) as f:
+            html = f.read()
+        self.assertTrue('src="js/app.js?v=%s"' % app.digest in html)
+        self.assertTrue('href="/get?action=listTags"' in html)
+        self.write("js/app.js", "var y = 2;\n" * 200)
+        os.utime(os.path.join(self.root, "js/app.js"), (1, 1))
+        self.assertNotEqual(
+            self.cache.get(os.path.join(self.root, "index.html")).digest,
+            page.digest)
+
+
+    def testCacheDir(self):
+        cache = assetcache(self.root)
+        try:
+            mode = os.stat(cache.cachedir).st_mode & 0777
+            self.assertEqual(mode, 0700)
+            self.assertNotEqual(cache.cachedir, self.cachedir)
+        finally:
+            cache.close()
+        self.assertFalse(os.path.exists(cache.cachedir))
+        os.chmod(self.cachedir, 0777)
+        self.assertRaises(ValueError, assetcache, self.root, self.cachedir)
+
+    def testPlantedVariant(self):
+        app = self.cache.get(os.path.join(self.root, "js/app.js"))
+        with open(app.variants["gzip"], "wb") as f:
+            f.write("alert('planted');")
+        cache = assetcache(self.root, self.cachedir)
+        app = cache.get(os.path.join(self.root, "js/app.js"))
+        with open(app.variants["gzip"], "rb") as f:
+            data = gzip.GzipFile(fileobj=StringIO(f.read())).read()
+        self.assertEqual(data, "var x = 1;\n" * 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from pysmhs.svgindex import build, parse_label
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg"
+ xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape">
+ <g id="layer" inkscape:label="Layer 1">
+  <g id="lamp" inkscape:label='{"attr":"clone","map":["%THIS=plc_zal"]}'>
+   <path id="bulb" inkscape:label='{"attr":"color","list":[
+    {"data":"0","param":"#E5E5E5","tag":"%THIS"},
+    {"data":"1","param":"#FCE94F","tag":"%THIS"}]}'/>
+   <rect id="button" inkscape:label='{"attr":"script","list":[
+    {"evt":"mouseup","param":"top.setTag(&apos;%THIS&apos;,1)"}]}'/>
+  </g>
+  <text id="date" inkscape:label='{"attr":"get","tag":"date_date"}'>
+   <tspan id="datetext">-</tspan></text>
+  <rect id="level" height="50" inkscape:label='{"attr":"bar",
+   "tag":"plc_level","min":0,"max":10},{"attr":"set","tag":"plc_pump",
+   "src":"1"}'/>
+ </g>
+ <g id="nolabel"><rect id="hidden"
+   inkscape:label='{"attr":"get","tag":"plc_hidden"}'/></g>
+</svg>'''
+
+
+class TestSvgIndex(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".svg")
+        os.write(fd, SVG)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def testParseLabel(self):
+        self.assertEqual(parse_label("Button"), [])
+        self.assertEqual(parse_label('{"attr":"get"},{"attr":"set"}'),
+                         [{"attr": "get"}, {"attr": "set"}])
+
+    def testBuild(self):
+        index = build(self.path)
+        bindings = index["bindings"]
+        self.assertEqual(sorted(index["tags"]),
+                         ["date_date", "plc_level", "plc_zal"])
+        zal = bindings[index["tags"]["plc_zal"][0]]
+        self.assertEqual((zal["id"], zal["rules"]),
+                         ("bulb", [["0", "#E5E5E5"], ["1", "#FCE94F"]]))
+        self.assertEqual(bindings[index["tags"]["date_date"][0]]["id"],
+                         "datetext")
+        level = bindings[index["tags"]["plc_level"][0]]
+        self.assertEqual((level["height"], level["max"]), (50, 10))
+        self.assertEqual(index["events"], [
+            {"id": "button", "evt": "mouseup",
+             "code": "top.setTag('plc_zal',1)"},
+            {"id": "level", "evt": "click",
+             "code": "top.setTag('plc_pump','1')"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from pysmhs.tagregistry import TagRegistry
+
+
+class Handler(object):
+
+    def __init__(self, tags):
+        self._tags = tags
+        self.written = []
+
+    def hastag(self, tag):
+        return tag in self._tags
+
+    def _settag(self, tag, value):
+        self.written.append((tag, value))
+
+
+class TestTagRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.plc = Handler({"van4": 0})
+        self.other = Handler({"plc_lamp": 1})
+        self.registry = TagRegistry()
+        self.registry.addhandler("plc", self.plc)
+        self.registry.addhandler("plc_ext", self.other)
+
+    def testGetSet(self):
+        tagid = self.registry.id("plc_van4")
+        self.assertEqual(self.registry.name(tagid), "plc_van4")
+        self.assertEqual(self.registry.get(tagid), 0)
+        self.plc._tags["van4"] = 1
+        self.assertEqual(self.registry.get(tagid), 1)
+        self.registry.set(tagid, 0)
+        self.assertEqual(self.plc.written, [("van4", 0)])
+
+    def testUnderscore(self):
+        tagid = self.registry.id("plc_ext_plc_lamp")
+        self.assertEqual(self.registry.get(tagid), 1)
+
+    def testLazyRegister(self):
+        self.assertFalse("plc_van2" in self.registry)
+        self.plc._tags["van2"] = 0
+        tagid = self.registry.id("plc_van2")
+        self.assertEqual(self.registry.id("plc_van2"), tagid)
+        self.assertRaises(KeyError, self.registry.id, "unknown_van2")
+
+    def testUnknownTag(self):
+        self.assertRaises(KeyError, self.registry.id, "plc_van9")
+        self.assertFalse("plc_van9" in self.registry)
+        self.assertEqual(len(self.registry), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
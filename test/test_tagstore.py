@@ -0,0 +1,75 @@
+import unittest
+from pysmhs.tagstore import TagDict, TagStore
+
+
+class TestTagStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TagStore()
+        self.plc = TagDict("plchandler")
+        self.plc["van4"] = 0
+        self.store.attach(self.plc)
+
+    def testSnapshot(self):
+        snapshot = self.store.snapshot()
+        self.assertEqual(snapshot, {"plchandler_van4": 0})
+        self.assertTrue(self.store.snapshot() is snapshot)
+        self.assertRaises(TypeError, snapshot.__setitem__, "a", 1)
+
+    def testUpdateChanged(self):
+        version = self.store.version
+        self.plc["van4"] = 0
+        self.assertEqual(self.store.version, version)
+        self.plc["van4"] = 1
+        self.plc["van2"] = 1
+        snapshot = self.store.snapshot()
+        self.assertEqual(snapshot.version, version + 2)
+        self.assertEqual(
+            snapshot, {"plchandler_van4": 1, "plchandler_van2": 1})
+
+    def testChanges(self):
+        for tag in ("van2", "zal", "kor"):
+            self.plc[tag] = 0
+        version = self.store.version
+        self.plc["zal"] = 1
+        self.assertEqual(self.store.changes(version),
+                         (version + 1, False, {"plchandler_zal": 1}))
+        self.assertEqual(self.store.changes(version + 1),
+                         (version + 1, False, {}))
+        self.assertEqual(self.store.tagversion("plchandler_zal"),
+                         version + 1)
+
+    def testChangesFull(self):
+        self.plc["van2"] = 1
+        version, full, tags = self.store.changes(0)
+        self.assertTrue(full)
+        self.assertEqual(len(tags), 2)
+        self.store.detach(self.plc)
+        self.assertEqual(self.store.changes(version), (version + 1, True, {}))
+
+    def testLayout(self):
+        layout = self.store.snapshot().layout
+        self.plc["van4"] = 1
+        self.assertEqual(self.store.snapshot().layout, layout)
+        self.plc["kor"] = 1
+        self.assertEqual(self.store.snapshot().layout, layout + 1)
+
+    def testTransaction(self):
+        version = self.store.version
+        with self.store.transaction():
+            self.plc["van4"] = 1
+            self.plc["van2"] = 1
+        self.assertEqual(self.store.version, version + 1)
+        self.assertEqual(self.store.changes(version)[2],
+                         {"plchandler_van4": 1, "plchandler_van2": 1})
+        self.plc["van2"] = 0
+        self.assertEqual(self.store.version, version + 2)
+
+    def testDetach(self):
+        self.store.detach(self.plc)
+        self.plc["van4"] = 1
+        self.assertEqual(self.store.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
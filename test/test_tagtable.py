@@ -0,0 +1,72 @@
+import unittest
+from jinja2 import Template
+from pysmhs.tagregistry import TagRegistry
+from pysmhs.tagstore import TagDict, TagStore
+from pysmhs.tagtable import tagtable, group
+
+
+class handler(object):
+
+    _tags = {}
+
+
+class TestTagTable(unittest.TestCase):
+
+    def setUp(self):
+        self.store = TagStore()
+        self.plc = TagDict("plchandler")
+        self.plc["van4"] = 0
+        self.plc["temp_in"] = "<21>"
+        self.store.attach(self.plc)
+        self.table = tagtable(Template(
+            "{% for handler, rows in tags %}[{{ handler }}"
+            "{% for tag, name in rows %} {{ tag }}={{ slot }}"
+            "{% endfor %}]{% endfor %}"))
+
+    def testGroup(self):
+        self.assertEqual(
+            group(["plchandler_van4", "datehandler_day", "plchandler_a_b"]),
+            [("datehandler", [("day", "datehandler_day")]),
+             ("plchandler", [("a_b", "plchandler_a_b"),
+                             ("van4", "plchandler_van4")])])
+
+    def testGroupByRegistry(self):
+        registry = TagRegistry()
+        for name in ("plc", "plc_ext"):
+            registry.addhandler(name, handler(), setter=self.plc.__setitem__)
+        self.assertEqual(
+            group(["plc_ext_lamp", "plc_van4", "plc_zal", "other_day"],
+                  registry.split),
+            [("other", [("day", "other_day")]),
+             ("plc", [("van4", "plc_van4"), ("zal", "plc_zal")]),
+             ("plc_ext", [("lamp", "plc_ext_lamp")])])
+
+    def testRender(self):
+        self.assertEqual(
+            self.table.render(self.store.snapshot()),
+            '[plchandler temp_in=&lt;21&gt; van4=<div class="switch">'
+            '<input id="plchandler_van4" type="checkbox"></div>]')
+        self.plc["van4"] = 1
+        self.assertTrue('checked="checked"' in
+                        self.table.render(self.store.snapshot()))
+
+    def testLayout(self):
+        self.table.render(self.store.snapshot())
+        parts = self.table.parts
+        self.plc["van4"] = 1
+        self.table.render(self.store.snapshot())
+        self.assertTrue(self.table.parts is parts)
+        self.plc["van2"] = 5
+        self.assertTrue(" van2=5" in self.table.render(self.store.snapshot()))
+
+
+    def testUnicode(self):
+        self.plc["room"] = u"\u0437\u0430\u043b"
+        self.plc["name"] = u"\u0437\u0430\u043b".encode("utf-8")
+        body = self.table.render(self.store.snapshot())
+        self.assertTrue(" room=\xd0\xb7\xd0\xb0\xd0\xbb" in body)
+        self.assertTrue(" name=\xd0\xb7\xd0\xb0\xd0\xbb" in body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import json
+import unittest
+from twisted.web.test.requesthelper import DummyRequest
+from pysmhs.tagstore import TagDict, TagStore
+from pysmhs.webpush import eventstream
+
+
+class request(DummyRequest):
+
+    # DummyRequest pull from producer in loop, clients are push producers
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+
+def events(data):
+    '''
+    (id, event, data) of event-stream, comments and retry are skipped
+    '''
+    result = []
+    for block in data.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n")
+                      if line and not line.startswith((":", "retry")))
+        if fields:
+            result.append((int(fields["id"]), fields["event"],
+                           json.loads(fields["data"])))
+    return result
+
+
+class TestEventStream(unittest.TestCase):
+
+    def setUp(self):
+        self.plc = TagDict("plchandler")
+        self.plc["van4"] = 0
+        self.plc["zal"] = 1
+        self.store = TagStore()
+        self.store.attach(self.plc)
+        self.stream = eventstream(self.store, polltimeout=0, heartbeat=0)
+
+    def get(self, after=None, **args):
+        r = request([""])
+        r.args = dict((k, [v]) for k, v in args.items())
+        if after is not None:
+            r.requestHeaders.setRawHeaders("Last-Event-ID", [str(after)])
+        self.stream.render_GET(r)
+        return r
+
+    def received(self, r):
+        data = "".join(r.written)
+        del r.written[:]
+        return events(data)
+
+    def testFraming(self):
+        r = self.get()
+        self.assertEqual(r.responseHeaders.getRawHeaders("Content-Type"),
+                         ["text/event-stream"])
+        self.assertTrue(r.written[0].startswith("retry: "))
+        version = self.store.version
+        # all tags first
+        self.assertEqual(self.received(r), [(version, "tags", {
+            "version": version, "full": True,
+            "tags": {"plchandler_van4": "0", "plchandler_zal": "1"}})])
+        self.plc["van4"] = 1
+        self.stream.update()
+        self.assertEqual(self.received(r), [(version + 1, "tags", {
+            "version": version + 1, "full": False,
+            "tags": {"plchandler_van4": "1"}})])
+        # nothing changed, nothing sent
+        self.stream.update()
+        self.assertEqual(r.written, [])
+        self.stream.heartbeat()
+        self.assertEqual(r.written, [":\n\n"])
+
+    def testResume(self):
+        version = self.store.version
+        self.plc["zal"] = 0
+        self.plc["van4"] = 1
+        r = self.get(after=version + 1)
+        self.assertEqual(self.received(r), [(version + 2, "tags", {
+            "version": version + 2, "full": False,
+            "tags": {"plchandler_van4": "1"}})])
+        self.assertEqual(self.stream.clients, set([r.producer]))
+
+    def testReset(self):
+        # ahead of the store, like after restart of server
+        r = self.get(after=self.store.version + 100)
+        self.assertTrue(self.received(r)[0][2]["full"])
+        # behind removed tags
+        version = self.store.version
+        self.store.detach(self.plc)
+        r = self.get(after=version)
+        self.assertEqual(self.received(r), [(version + 1, "tags", {
+            "version": version + 1, "full": True, "tags": {}})])
+
+    def testPaused(self):
+        r = self.get()
+        self.received(r)
+        r.producer.pauseProducing()
+        self.plc["van4"] = 1
+        self.plc["zal"] = 0
+        self.stream.update()
+        self.assertEqual(r.written, [])
+        r.producer.resumeProducing()
+        self.assertEqual(self.received(r)[0][2]["tags"], {
+            "plchandler_van4": "1", "plchandler_zal": "0"})
+
+    def testSilentChange(self):
+        # tags set without event, like the date, reach clients too
+        r = self.get()
+        self.received(r)
+        self.store.update("datehandler_date", "18.10.2026")
+        self.stream.update()
+        self.assertEqual(self.received(r)[0][2]["tags"],
+                         {"datehandler_date": "18.10.2026"})
+
+    def testPoll(self):
+        version = self.store.version
+        r = self.get(mode="poll", after=str(version - 1))
+        self.assertEqual(r.finished, 1)
+        self.assertEqual(json.loads("".join(r.written)), {
+            "version": version, "full": True,
+            "tags": {"plchandler_van4": "0", "plchandler_zal": "1"}})
+        r = self.get(mode="poll", after=str(version))
+        self.assertEqual(r.finished, 0)
+        self.plc["van4"] = 1
+        self.stream.update()
+        self.assertEqual(r.finished, 1)
+        self.assertEqual(json.loads("".join(r.written)), {
+            "version": version + 1, "full": False,
+            "tags": {"plchandler_van4": "1"}})
+        self.assertEqual(self.stream.clients, set())
+
+    def testPollTimeout(self):
+        version = self.store.version
+        r = self.get(mode="poll", after=str(version))
+        self.assertEqual(r.finished, 0)
+        self.stream.heartbeat()
+        self.assertEqual(r.finished, 1)
+        self.assertEqual(json.loads("".join(r.written)), {
+            "version": version, "full": False, "tags": {}})
+        self.assertEqual(self.stream.clients, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import json
+import struct
+import unittest
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+from twisted.web import server
+from twisted.web.resource import Resource
+from pysmhs.tagstore import TagDict, TagStore
+from pysmhs.webpush import eventstream
+from pysmhs.websocket import (FrameParser, accept_key, encode_frame,
+                              websocket, OP_CLOSE, OP_CONTINUATION,
+                              OP_PING, OP_PONG, OP_TEXT)
+
+MASK = "abcd"
+HANDSHAKE = ("GET /ws HTTP/1.1\r\n"
+             "Host: localhost\r\n"
+             "Upgrade: websocket\r\n"
+             "Connection: Upgrade\r\n"
+             "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+             "Sec-WebSocket-Version: 13\r\n\r\n")
+
+
+class TestWebSocket(unittest.TestCase):
+
+    def testAcceptKey(self):
+        # example from RFC 6455
+        self.assertEqual(accept_key("dGhlIHNhbXBsZSBub25jZQ=="),
+                         "s3pPLMBiTxaQ9kYGzzhZRbK+xOo=")
+
+    def testMaskedFrames(self):
+        parser = FrameParser()
+        data = (encode_frame(OP_TEXT, "a" * 300, MASK) +
+                encode_frame(OP_PING, "p", "wxyz"))
+        messages = []
+        for c in data:
+            messages.extend(parser.feed(c))
+        self.assertEqual(messages, [(OP_TEXT, "a" * 300), (OP_PING, "p")])
+
+    def testUnmaskedFrame(self):
+        self.assertRaises(ValueError, FrameParser().feed,
+                          encode_frame(OP_TEXT, "hello"))
+        self.assertEqual(FrameParser(masked=False).feed(
+            encode_frame(OP_TEXT, "hello")), [(OP_TEXT, "hello")])
+
+    def testFragments(self):
+        parser = FrameParser()
+        first = chr(OP_TEXT) + encode_frame(OP_TEXT, "hel", MASK)[1:]
+        data = (first + encode_frame(OP_PING, "", MASK) +
+                encode_frame(OP_CONTINUATION, "lo", MASK))
+        self.assertEqual(parser.feed(data),
+                         [(OP_PING, ""), (OP_TEXT, "hello")])
+
+    def testTooBig(self):
+        parser = FrameParser(maxsize=10)
+        self.assertRaises(OverflowError, parser.feed,
+                          encode_frame(OP_TEXT, "x" * 11, MASK))
+
+
+class panel(object):
+
+    '''
+    parent of websocket, tags of one handler
+    '''
+
+    def __init__(self):
+        self.plc = TagDict("plchandler")
+        self.plc["van4"] = 0
+        self.plc["zal"] = 1
+        self.store = TagStore()
+        self.store.attach(self.plc)
+        self.set = []
+
+    @property
+    def tags(self):
+        return self.store.snapshot()
+
+    def settags(self, tags):
+        self.set.append(tags)
+        return dict((name, "ok") for name in tags)
+
+
+class TestConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = panel()
+        self.stream = eventstream(self.parent.store)
+        root = Resource()
+        root.putChild("ws", websocket(self.parent, self.stream))
+        self.clock = Clock()
+        self.channel = server.Site(root, timeout=5).buildProtocol(None)
+        self.channel.callLater = self.clock.callLater
+        self.transport = StringTransport()
+        self.channel.makeConnection(self.transport)
+        self.channel.dataReceived(HANDSHAKE)
+        self.client = self.transport.protocol
+        self.parser = FrameParser(masked=False)
+
+    def send(self, data):
+        self.client.dataReceived(
+            encode_frame(OP_TEXT, json.dumps(data), MASK))
+
+    def received(self):
+        data = self.transport.value()
+        self.transport.clear()
+        return self.parser.feed(data)
+
+    def messages(self):
+        return [json.loads(payload) for opcode, payload in self.received()]
+
+    def testHandshake(self):
+        answer = self.transport.value()
+        self.assertTrue(answer.startswith("HTTP/1.1 101 Switching"))
+        self.assertTrue("Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK"
+                        "+xOo=\r\n" in answer)
+        self.assertTrue(self.stream.clients == set([self.client]))
+        # timeout of HTTP channel don't fire on the websocket
+        self.clock.advance(10)
+        self.assertFalse(self.transport.disconnecting)
+
+    def testBadHandshake(self):
+        transport = StringTransport()
+        channel = self.channel.factory.buildProtocol(None)
+        channel.makeConnection(transport)
+        channel.dataReceived(HANDSHAKE.replace("Version: 13", "Version: 8"))
+        self.assertTrue(transport.value().startswith("HTTP/1.1 400"))
+
+    def testSubscribe(self):
+        self.transport.clear()
+        self.send({"op": "subscribe", "tags": ["plchandler_v*"]})
+        version = self.parent.store.version
+        self.assertEqual(self.messages(), [{
+            "op": "tags", "version": version, "full": True,
+            "tags": {"plchandler_van4": "0"}}])
+        self.parent.plc["zal"] = 0
+        self.stream.update()
+        # change of other tags is not sent
+        self.assertEqual(self.messages(), [])
+        self.parent.plc["van4"] = 1
+        self.stream.update()
+        self.assertEqual(self.messages(), [{
+            "op": "tags", "version": version + 2, "full": False,
+            "tags": {"plchandler_van4": "1"}}])
+
+    def testGetSet(self):
+        self.transport.clear()
+        self.send({"op": "get", "id": 1,
+                   "tags": ["plchandler_zal", "plchandler_bogus"]})
+        self.send({"op": "set", "id": 2, "tags": {"plchandler_van4": 1}})
+        self.send({"op": "set", "id": 3, "tags": ["plchandler_van4"]})
+        self.send({"op": "set", "id": 4, "tags": {"plchandler_van4": [1]}})
+        self.send({"op": "get", "id": 5, "tags": "plchandler_zal"})
+        self.send({"op": "subscribe", "id": 6, "tags": {"a": 1}})
+        self.assertEqual(self.messages(), [
+            {"op": "ack", "id": 1, "tags": {"plchandler_zal": "1"}},
+            {"op": "ack", "id": 2, "results": {"plchandler_van4": "ok"}},
+            {"op": "error", "id": 3,
+             "error": "tags have to be object of values"},
+            {"op": "error", "id": 4,
+             "error": "tags have to be object of values"},
+            {"op": "error", "id": 5,
+             "error": "tags have to be list of names"},
+            {"op": "error", "id": 6,
+             "error": "tags have to be list of names"}])
+        self.assertFalse(self.transport.disconnecting)
+        self.assertEqual(self.parent.set, [{"plchandler_van4": 1}])
+
+    def testPing(self):
+        self.transport.clear()
+        self.client.dataReceived(encode_frame(OP_PING, "hi", MASK))
+        self.assertEqual(self.received(), [(OP_PONG, "hi")])
+
+    def testClose(self):
+        self.transport.clear()
+        self.client.dataReceived(
+            encode_frame(OP_CLOSE, struct.pack("!H", 1000), MASK))
+        self.assertEqual(self.received(),
+                         [(OP_CLOSE, struct.pack("!H", 1000))])
+        self.assertTrue(self.transport.disconnecting)
+
+    def testUnmaskedClose(self):
+        self.transport.clear()
+        self.client.dataReceived(encode_frame(OP_TEXT, "{}"))
+        self.assertEqual(self.received(),
+                         [(OP_CLOSE, struct.pack("!H", 1002))])
+        self.assertTrue(self.transport.disconnecting)
+
+
+if __name__ == '__main__':
+    unittest.main()
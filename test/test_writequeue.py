@@ -0,0 +1,62 @@
+import unittest
+from pysmhs.writequeue import writequeue
+
+
+class TestWriteQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.queue = writequeue(lambda: self.now,
+                                {"coils": 3, "registers": 2})
+
+    def testRuns(self):
+        for address in (7, 1, 3, 2, 4, 5):
+            self.queue.put(address, address & 1)
+        self.queue.put(2, 250, "registers")
+        self.queue.put(3, 10, "registers")
+        self.assertEqual(self.queue.take()[:3], ("coils", 1, [1, 0, 1]))
+        self.assertEqual(self.queue.take()[:3], ("coils", 4, [0, 1]))
+        self.assertEqual(self.queue.take()[:3], ("coils", 7, [1]))
+        self.assertEqual(self.queue.take()[:3],
+                         ("registers", 2, [250, 10]))
+        self.assertEqual(len(self.queue), 0)
+
+    def testSingle(self):
+        self.queue.single.add("coils")
+        self.queue.put(1, 1)
+        self.queue.put(2, 1)
+        self.assertEqual(self.queue.take()[:3], ("coils", 1, [1]))
+
+    def testPutback(self):
+        self.queue.put(1, 1)
+        self.queue.put(2, 1)
+        run = self.queue.take()
+        self.now = 1
+        self.queue.put(2, 0)
+        self.queue.putback(*run)
+        self.assertEqual(self.queue.take(), ("coils", 1, [1, 0], [0, 0]))
+
+    def testLastValueFirstTime(self):
+        self.queue.put(1, 0)
+        self.now = 1
+        self.queue.put(1, 1)
+        self.assertEqual(self.queue.take(), ("coils", 1, [1], [0]))
+        self.assertEqual(self.queue.stats()["queued"], 2)
+
+    def testLatency(self):
+        self.queue.put(1, 1)
+        self.queue.put(2, 1)
+        times = self.queue.take()[3]
+        self.now = 0.5
+        self.queue.done(times)
+        self.queue.put(3, 1)
+        self.queue.done(self.queue.take()[3], ok=False)
+        stats = self.queue.stats()
+        self.assertEqual((stats["requests"], stats["written"],
+                          stats["failed"]), (2, 2, 1))
+        self.assertEqual((stats["latency_avg"], stats["latency_max"],
+                          stats["latency_p99"]), (0.5, 0.5, 0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()